@@ -1,18 +1,33 @@
 # 注册get_user为Jinja2模板全局函数
-from flask import Flask, render_template, request, redirect, url_for, jsonify, flash, session
+from flask import Flask, render_template, request, redirect, url_for, jsonify, flash, session, make_response, g
+from flask import before_render_template, template_rendered, has_request_context
 from functools import wraps
 import asset_analyze
+import fleet_snapshot
+import listing_index
+import metrics
+import server_timing
+import request_profiler
+import logging_setup
+import query_cache
+import generations
+import yaml_codec
 import os
 import json
 import yaml
 import logging
 import copy
-from datetime import datetime
+import hashlib
+import base64
+import time
+from datetime import datetime, timezone
+from werkzeug.http import is_resource_modified
 from werkzeug.utils import secure_filename
 from werkzeug.security import generate_password_hash, check_password_hash
 import tempfile
 import shutil
-from generate_cluster_yaml import generate_cluster_yaml
+from jinja2 import FileSystemBytecodeCache
+from config import config as config_profiles
 
 # 定义应用路径常量
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
@@ -23,25 +38,54 @@ SYSTEMS_DB = os.path.join(DB_DIR, 'systems.json')
 ACCESS_LOG_DB = os.path.join(DB_DIR, 'access_log.json')
 USERS_DB = os.path.join(DB_DIR, 'users.json')
 
-# 配置日志记录
-logging.basicConfig(
-    filename='dcam.log',
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-
 app = Flask(__name__)
-app.secret_key = 'dcam-secret-key-2025'  # 用于flash消息
-app.debug = True  # 开启调试模式，方便查看错误
+# 运行配置档由 DCAM_ENV（或 FLASK_ENV）选择：development（默认，调试模式）或 production
+app.config['ENV_NAME'] = os.environ.get('DCAM_ENV') or os.environ.get('FLASK_ENV') or 'default'
+app.config.from_object(config_profiles.get(app.config['ENV_NAME'], config_profiles['default']))
+
+# 生产配置档使用多个工作进程共享的Jinja字节码缓存，冷启动的进程不必重新编译模板
+# （须在首次访问 app.jinja_env 之前设置）
+if app.config['JINJA_BYTECODE_CACHE_DIR']:
+    os.makedirs(app.config['JINJA_BYTECODE_CACHE_DIR'], exist_ok=True)
+    app.jinja_options = dict(app.jinja_options,
+                             bytecode_cache=FileSystemBytecodeCache(app.config['JINJA_BYTECODE_CACHE_DIR']))
 
 # 配置应用URL设置，防止与其他应用混淆
 app.config['SERVER_NAME'] = None  # 不限制服务器名，允许通过IP访问
 app.config['APPLICATION_ROOT'] = '/'  # 应用根路径
 app.config['PREFERRED_URL_SCHEME'] = 'http'  # 默认URL方案
 
+# 配置日志记录：后台线程写入按大小轮转的日志文件，级别由配置档决定（development/production）
+app.config['LOG_FILE'] = os.environ.get('DCAM_LOG_FILE', 'dcam.log')
+app.config['LOG_PROFILE'] = os.environ.get('DCAM_LOG_PROFILE', app.config['LOG_PROFILE'])
+app.config['LOG_LEVEL'] = os.environ.get('DCAM_LOG_LEVEL', '')  # 为空时使用配置档的级别
+app.config['LOG_MAX_BYTES'] = int(os.environ.get('DCAM_LOG_MAX_BYTES', 10 * 1024 * 1024))
+app.config['LOG_BACKUP_COUNT'] = int(os.environ.get('DCAM_LOG_BACKUP_COUNT', 5))
+# 每请求日志的抽样比例，为空时使用配置档的比例
+app.config['LOG_REQUEST_SAMPLE'] = os.environ.get('DCAM_LOG_REQUEST_SAMPLE', '')
+logging_setup.configure(
+    app.config['LOG_FILE'],
+    profile=app.config['LOG_PROFILE'],
+    level=app.config['LOG_LEVEL'],
+    max_bytes=app.config['LOG_MAX_BYTES'],
+    backup_count=app.config['LOG_BACKUP_COUNT'],
+    request_sample=float(app.config['LOG_REQUEST_SAMPLE']) if app.config['LOG_REQUEST_SAMPLE'] else None
+)
+# 调试模式下Flask会把 app.logger 单独设为DEBUG，这里统一使用配置档的级别
+app.logger.setLevel(logging.getLogger().level)
+request_log = logging.getLogger(logging_setup.REQUEST_LOGGER)
+
+# 系统记录中的YAML文件、上传目录等都是相对应用目录的路径，导入时须切换工作目录
+# （Docker中已在应用目录下运行）；其余环境检查由 init_application_environment 在部署时执行一次
+if not os.path.exists('/.dockerenv') and os.getcwd() != BASE_DIR:
+    os.chdir(BASE_DIR)
+
 # 应用初始化函数
 def init_application_environment():
-    """初始化应用环境，确保工作目录和文件权限正确"""
+    """
+    初始化应用环境，确保工作目录和文件权限正确
+    只需在部署或升级时执行一次（flask --app app init，python app.py 启动时也会执行），导入应用时不再执行
+    """
     # 记录当前工作目录
     current_dir = os.getcwd()
     print(f"[系统初始化] 当前工作目录: {current_dir}")
@@ -134,14 +178,158 @@ def init_application_environment():
         except Exception as e:
             print(f"  无法读取挂载信息: {str(e)}")
 
-# 在应用启动时初始化环境
-init_application_environment()
+# 资产查询结果缓存（TTL秒数和条目上限可通过环境变量调整，设为0关闭缓存）
+app.config['QUERY_CACHE_TTL'] = int(os.environ.get('DCAM_QUERY_CACHE_TTL', 300))
+app.config['QUERY_CACHE_SIZE'] = int(os.environ.get('DCAM_QUERY_CACHE_SIZE', 256))
+query_results = query_cache.QueryCache(app.config['QUERY_CACHE_SIZE'], app.config['QUERY_CACHE_TTL'])
+# 全局查询分页时每页的默认行数和上限
+app.config['QUERY_PAGE_LIMIT'] = int(os.environ.get('DCAM_QUERY_PAGE_LIMIT', 200))
+app.config['QUERY_PAGE_MAX_LIMIT'] = int(os.environ.get('DCAM_QUERY_PAGE_MAX_LIMIT', 2000))
+# 客户/系统列表页每页显示的条数
+app.config['LIST_PAGE_SIZE'] = int(os.environ.get('DCAM_LIST_PAGE_SIZE', 50))
+# 全体系统快照文件（各工作进程只读映射，见 fleet_snapshot.py）
+app.config['FLEET_SNAPSHOT_FILE'] = os.environ.get('DCAM_FLEET_SNAPSHOT_FILE', os.path.join(DB_DIR, 'fleet_snapshot.bin'))
+
+# 运行指标：多个工作进程的快照写入同一目录，/metrics 合并输出；设置令牌后需携带 Bearer 令牌访问
+app.config['METRICS_DIR'] = os.environ.get('DCAM_METRICS_DIR', os.path.join(DATA_DIR, 'metrics'))
+app.config['METRICS_FLUSH_INTERVAL'] = float(os.environ.get('DCAM_METRICS_FLUSH_INTERVAL', 5))
+app.config['METRICS_TOKEN'] = os.environ.get('DCAM_METRICS_TOKEN', '')
+metrics.configure(app.config['METRICS_DIR'], app.config['METRICS_FLUSH_INTERVAL'])
+
+# 在响应头中输出各阶段耗时（Server-Timing），浏览器开发者工具中可直接查看
+app.config['SERVER_TIMING'] = os.environ.get('DCAM_SERVER_TIMING', '').lower() in ('1', 'true', 'yes', 'on')
+
+# 请求剖析：管理员按需剖析单个请求；超过阈值（毫秒，0为关闭）的慢请求自动保存调用栈采样
+app.config['PROFILE_DIR'] = os.environ.get('DCAM_PROFILE_DIR', os.path.join(DATA_DIR, 'profiles'))
+app.config['PROFILE_KEEP'] = int(os.environ.get('DCAM_PROFILE_KEEP', 200))
+app.config['SLOW_REQUEST_MS'] = float(os.environ.get('DCAM_SLOW_REQUEST_MS', 3000))
+app.config['SLOW_REQUEST_SAMPLE_MS'] = float(os.environ.get('DCAM_SLOW_REQUEST_SAMPLE_MS', 10))
+profile_store = request_profiler.ProfileStore(app.config['PROFILE_DIR'], app.config['PROFILE_KEEP'])
+slow_requests = None
+if app.config['SLOW_REQUEST_MS'] > 0:
+    slow_requests = request_profiler.SlowRequestSampler(
+        profile_store, app.config['SLOW_REQUEST_MS'] / 1000, app.config['SLOW_REQUEST_SAMPLE_MS'] / 1000)
+
+# (数据库版本, 系统ID -> YAML文件路径)
+_system_yaml_files = (None, {})
+
+def get_system_yaml_files():
+    """返回数据库版本和各系统的YAML文件路径；数据库未变化时只需stat，不重新解析"""
+    global _system_yaml_files
+    db_version = generations.files_version([SYSTEMS_DB, CUSTOMERS_DB])
+    cached_version, yaml_files = _system_yaml_files
+    if cached_version != db_version:
+        systems = load_json_db(SYSTEMS_DB) or {}
+        yaml_files = {sid: s['yaml_file'] for sid, s in systems.items() if s.get('yaml_file')}
+        _system_yaml_files = (db_version, yaml_files)
+    return db_version, yaml_files
+
+def get_data_version():
+    """
+    资产查询所依赖数据的版本：系统/客户数据库以及所有系统YAML文件的修改时间和大小
+    任一文件变化都会使查询缓存的键发生变化
+    """
+    db_version, yaml_files = get_system_yaml_files()
+    return db_version + generations.files_version(sorted(set(yaml_files.values())))
+
+def get_system_data_version(system_id):
+    """单个系统相关数据的版本：系统/客户数据库以及该系统的YAML文件"""
+    db_version, yaml_files = get_system_yaml_files()
+    return db_version + generations.files_version([yaml_files.get(system_id)])
+
+def get_db_version(*db_files):
+    return generations.files_version(db_files)
+
+def conditional_get(get_version):
+    """
+    只读JSON接口的条件请求装饰器
+    根据 get_version(**视图参数) 返回的数据文件版本生成强ETag和Last-Modified，
+    客户端的 If-None-Match / If-Modified-Since 仍然有效时直接返回304，不执行任何查询
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            version = get_version(**kwargs)
+            etag = hashlib.sha1(repr((request.full_path, version)).encode('utf-8')).hexdigest()
+            
+            # 最近一秒内修改过的数据不提供Last-Modified（HTTP日期只精确到秒）
+            last_modified = None
+            mtimes = [file_version[0] for _, file_version in version if file_version]
+            if mtimes and time.time() - max(mtimes) / 1e9 >= 1:
+                last_modified = datetime.fromtimestamp(max(mtimes) // 10**9, timezone.utc)
+            
+            if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+                response = app.response_class(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if last_modified:
+                response.last_modified = last_modified
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+        return decorated_function
+    return decorator
 
 # 确保使用统一的文件上传目录结构
 def get_system_uploads_dir(customer_name, system_name):
     """获取系统上传文件目录路径"""
     return f"data/customers/{customer_name}/{system_name}/uploads"
 
+def get_listing_index():
+    """客户/系统列表页的索引，数据未变化时复用"""
+    return listing_index.get_listing_index(get_data_version(), lambda: (get_systems(), get_customers()))
+
+def get_fleet_snapshot():
+    """
+    全体系统的只读快照（系统、集群、设备、主机和IP地址）
+    本应用写入数据的请求结束前重建（见 refresh_fleet_snapshot）；数据被其他进程（导入守护进程、
+    批量重新处理脚本、手工编辑）修改时，由第一个发现数据版本变化的请求重建
+    """
+    # 快照自行解析各系统的YAML，不需要 get_systems 统计设备数量
+    return fleet_snapshot.get_snapshot(app.config['FLEET_SNAPSHOT_FILE'], get_data_version(),
+                                       lambda: (get_systems(count_devices=False), get_customers()))
+
+# 不影响快照的数据库文件（写入时不重建）
+SNAPSHOT_IGNORED_FILES = {os.path.abspath(ACCESS_LOG_DB), os.path.abspath(USERS_DB)}
+
+def note_data_write(paths):
+    """generations 写入回调：标记本请求修改了快照依赖的数据"""
+    if has_request_context() and any(os.path.abspath(path) not in SNAPSHOT_IGNORED_FILES
+                                     for path in paths if path):
+        g.data_written = True
+
+generations.add_listener(note_data_write)
+
+def get_list_args(sort_keys):
+    """列表页的分页、排序和搜索参数"""
+    try:
+        page = int(request.args.get('page', 1))
+    except ValueError:
+        page = 1
+    try:
+        per_page = int(request.args.get('per_page', app.config['LIST_PAGE_SIZE']))
+    except ValueError:
+        per_page = app.config['LIST_PAGE_SIZE']
+    sort = request.args.get('sort', 'name')
+    return {
+        'page': page,
+        'per_page': max(1, min(per_page, 500)),
+        'sort': sort if sort in sort_keys else 'name',
+        'order': 'desc' if request.args.get('order') == 'desc' else 'asc',
+        'q': request.args.get('q', '').strip()
+    }
+
+def report_generation_diagnostics(diagnostics):
+    """把生成过程的警告写入日志，并在页面上提示自动获取失败的字段"""
+    for message in diagnostics.messages():
+        app.logger.warning(f"[YAML生成] {message.strip()}")
+    summary = diagnostics.missing_summary()
+    if summary:
+        flash(f'以下字段未能自动获取，请在资产信息中手工补充：{summary}', 'warning')
+
 # 添加错误处理器
 @app.errorhandler(500)
 def internal_server_error(e):
@@ -152,11 +340,24 @@ def internal_server_error(e):
 # 配置日志记录钩子
 @app.before_request
 def log_request_info():
-    # 记录每个请求的路径和参数，帮助排查问题
-    logging.info(f"请求路径: {request.path}, 参数: {request.args}")
+    # 记录请求开始时间和路由，供请求耗时等指标使用
+    g.request_started = time.perf_counter()
+    metrics.set_route(request.url_rule.rule if request.url_rule else 'unmatched')
+    if app.config['SERVER_TIMING']:
+        server_timing.start()
+    if slow_requests is not None:
+        g.slow_request = slow_requests.begin()
+    if request.headers.get('X-DCAM-Profile') == '1' or request.args.get('_profile') == '1':
+        user = get_user(session['username']) if 'username' in session else None
+        if user and user.get('role') == 'admin':
+            try:
+                g.request_profile = request_profiler.RequestProfile()
+            except ValueError as e:
+                # 同一时刻只能有一个剖析器（如另一个请求正在被剖析）
+                app.logger.warning(f"[请求剖析] 无法启动剖析: {str(e)}")
     
-    # 在控制台中也输出请求信息
-    print(f"DEBUG - 请求路径: {request.path}, 方法: {request.method}, 参数: {request.args}")
+    # 记录请求的路径和参数，帮助排查问题（按配置档的比例抽样，开发配置档同时输出到控制台）
+    request_log.info("请求路径: %s, 方法: %s, 参数: %s", request.path, request.method, request.args)
 
 # 配置响应安全头
 @app.after_request
@@ -179,27 +380,85 @@ def add_security_headers(response):
     
     return response
 
-# 配置允许的文件扩展名
-ALLOWED_EXTENSIONS = {'toml', 'conf', 'gz', 'tar.gz'}
+@app.after_request
+def record_request_metrics(response):
+    """记录按路由统计的请求数和耗时"""
+    started = g.get('request_started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe('dcam_http_request_duration_seconds', time.perf_counter() - started,
+                        route=route, method=request.method)
+        metrics.inc('dcam_http_requests_total', method=request.method, status=response.status_code)
+        metrics.maybe_flush()
+    return response
 
-# 数据存储文件 - 使用Docker友好的路径，确保数据持久化
-BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-DATA_DIR = os.path.join(BASE_DIR, 'data')
-DB_DIR = os.path.join(DATA_DIR, 'db')  # 数据库文件专用目录
-os.makedirs(DATA_DIR, exist_ok=True)  # 确保数据目录存在
-os.makedirs(DB_DIR, exist_ok=True)  # 确保数据库目录存在
+@app.after_request
+def add_server_timing_header(response):
+    """输出本请求各阶段耗时的 Server-Timing 响应头"""
+    timings = server_timing.stop()
+    started = g.get('request_started')
+    if timings is not None:
+        total = time.perf_counter() - started if started is not None else None
+        response.headers['Server-Timing'] = server_timing.header(timings, total)
+    return response
 
-# 数据库文件路径 - 存储在挂载的data/db目录下以确保Docker持久化
-CUSTOMERS_DB = os.path.join(DB_DIR, 'customers.json')
-SYSTEMS_DB = os.path.join(DB_DIR, 'systems.json')
-ACCESS_LOG_DB = os.path.join(DB_DIR, 'access_log.json')
-USERS_DB = os.path.join(DB_DIR, 'users.json')
+def _start_render_timing(sender, template, context, **extra):
+    timings = server_timing.current()
+    if timings is not None:
+        g.render_started = time.perf_counter()
+
+def _stop_render_timing(sender, template, context, **extra):
+    timings = server_timing.current()
+    started = g.pop('render_started', None)
+    if timings is not None and started is not None:
+        timings.add('render', time.perf_counter() - started)
+
+@app.after_request
+def save_request_profile(response):
+    """保存按需剖析和慢请求的采样结果"""
+    description = f"{request.method} {request.full_path} -> {response.status_code}"
+    profile = g.pop('request_profile', None)
+    if profile is not None:
+        try:
+            base = profile.save(profile_store, request.endpoint, description)
+            response.headers['X-DCAM-Profile'] = os.path.basename(base)
+            app.logger.info(f"[请求剖析] {description} 已保存到 {base}.pstats")
+        except Exception as e:
+            app.logger.error(f"[请求剖析] 保存剖析结果失败: {str(e)}")
+    
+    item = g.pop('slow_request', None)
+    if item is not None:
+        base = slow_requests.end(item, request.endpoint, description)
+        if base:
+            app.logger.warning(f"[慢请求] {description} 的调用栈采样已保存到 {base}.collapsed")
+    return response
 
-# 打印数据库文件路径，便于调试
-print(f"数据库文件位置:")
-print(f"CUSTOMERS_DB: {CUSTOMERS_DB}")
-print(f"SYSTEMS_DB: {SYSTEMS_DB}")
-print(f"当前工作目录: {os.getcwd()}")
+@app.after_request
+def refresh_fleet_snapshot(response):
+    """写入数据的请求在返回响应前重建快照，随后的列表、搜索等请求不必在请求中重建"""
+    if g.pop('data_written', False):
+        try:
+            get_fleet_snapshot()
+        except Exception as e:
+            app.logger.error(f"[快照] 重建全体系统快照失败: {str(e)}")
+    return response
+
+@app.teardown_request
+def stop_request_profile(exc):
+    """请求异常结束、未经过 after_request 时停止剖析和采样"""
+    profile = g.pop('request_profile', None)
+    if profile is not None:
+        profile.stop()
+    item = g.pop('slow_request', None)
+    if item is not None:
+        slow_requests.end(item, request.endpoint, f"{request.method} {request.full_path} -> 异常")
+
+# 模板渲染耗时通过Flask的模板信号记录
+before_render_template.connect(_start_render_timing, app)
+template_rendered.connect(_stop_render_timing, app)
+
+# 配置允许的文件扩展名
+ALLOWED_EXTENSIONS = {'toml', 'conf', 'gz', 'tar.gz'}
 
 # 注册自定义过滤器
 @app.template_filter('datetime')
@@ -229,13 +488,16 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+@server_timing.timed('db')
 def load_json_db(filename):
     """加载JSON数据库文件"""
     if os.path.exists(filename):
+        metrics.inc('dcam_json_db_loads_total', db=os.path.basename(filename))
         with open(filename, 'r', encoding='utf-8') as f:
             return json.load(f)
     return {}
 
+@server_timing.timed('save')
 def save_json_db(filename, data):
     """保存JSON数据库文件，返回操作是否成功"""
     print(f"\n[DB操作] 开始保存数据库文件: {filename}")
@@ -292,6 +554,9 @@ def save_json_db(filename, data):
             json.dump(data, f, ensure_ascii=False, indent=2)
             f.flush()  # 确保数据写入磁盘
             os.fsync(f.fileno())  # 在Linux上强制同步文件系统
+            metrics.inc('dcam_json_db_saves_total', db=os.path.basename(filename))
+            metrics.inc('dcam_json_db_bytes_written_total', os.fstat(f.fileno()).st_size,
+                        db=os.path.basename(filename))
         
         # 备份现有文件（如果存在）
         if os.path.exists(filename):
@@ -305,6 +570,8 @@ def save_json_db(filename, data):
         # 将临时文件重命名为正式文件
         print(f"[DB操作] 重命名临时文件为正式文件: {temp_filename} -> {filename}")
         os.rename(temp_filename, filename)
+        # 通知其他工作进程该文件已更新
+        generations.bump(filename)
         
         # 验证文件是否写入成功
         if os.path.exists(filename):
@@ -327,6 +594,7 @@ def save_json_db(filename, data):
             print(f"[DB操作] 尝试备用方法写入文件: {filename}")
             with open(filename, 'w', encoding='utf-8') as f:
                 json.dump(data, f, ensure_ascii=False, indent=2)
+            generations.bump(filename)
             
             if os.path.exists(filename):
                 print(f"[DB操作] 备用方法成功: 文件已写入 {filename}")
@@ -361,8 +629,8 @@ def get_customers():
         # 如果都失败了，返回空字典
         return {}
 
-def get_systems(customer_id=None):
-    """获取系统列表，可选择按客户过滤"""
+def get_systems(customer_id=None, count_devices=True):
+    """获取系统列表，可选择按客户过滤；count_devices 为False时不读取YAML统计SFA设备数量"""
     systems_data = {}
     
     # 尝试加载系统数据
@@ -391,22 +659,24 @@ def get_systems(customer_id=None):
         if 'archived' not in sys:
             sys['archived'] = False
         
+        if not count_devices:
+            continue
+        
         # 计算SFA设备数量
         sfa_device_count = 0
         yaml_file = sys.get('yaml_file')
         if yaml_file and os.path.exists(yaml_file):
             try:
-                with open(yaml_file, 'r', encoding='utf-8') as f:
-                    yaml_data = yaml.safe_load(f)
-                    # 如果YAML文件中有clusters数据，计算SFA设备总数
-                    if yaml_data and 'clusters' in yaml_data:
-                        for cluster in yaml_data['clusters']:
-                            if 'devices' in cluster:
-                                devices = cluster['devices']
-                                if isinstance(devices, list):
-                                    sfa_device_count += len(devices)
-                                elif isinstance(devices, dict):  # 处理可能的字典形式
-                                    sfa_device_count += 1
+                yaml_data = yaml_codec.load_file(yaml_file, sidecar=True)
+                # 如果YAML文件中有clusters数据，计算SFA设备总数
+                if yaml_data and 'clusters' in yaml_data:
+                    for cluster in yaml_data['clusters']:
+                        if 'devices' in cluster:
+                            devices = cluster['devices']
+                            if isinstance(devices, list):
+                                sfa_device_count += len(devices)
+                            elif isinstance(devices, dict):  # 处理可能的字典形式
+                                sfa_device_count += 1
             except Exception as e:
                 print(f"计算系统 {system_id} 的SFA设备数量出错: {str(e)}")
         
@@ -458,8 +728,7 @@ def sync_customer_name_to_yaml(system_id):
     
     try:
         # 读取YAML
-        with open(yaml_file, 'r', encoding='utf-8') as f:
-            yaml_data = yaml.safe_load(f)
+        yaml_data = yaml_codec.load_file(yaml_file, sidecar=True)
         
         if not yaml_data:
             return False
@@ -478,12 +747,16 @@ def sync_customer_name_to_yaml(system_id):
                 customer_name = customers[system['customer_id']].get('name')
         
         if customer_name:
+            # 已是最新时不写文件（写入会改变数据版本，使各缓存和全体系统快照失效）
+            if yaml_data.get('customer') == customer_name:
+                return True
+            
             # 更新YAML
             yaml_data['customer'] = customer_name
             
             # 保存YAML
-            with open(yaml_file, 'w', encoding='utf-8') as f:
-                yaml.dump(yaml_data, f, allow_unicode=True, default_flow_style=False)
+            yaml_codec.dump_file(yaml_data, yaml_file, sidecar=True,
+                                 allow_unicode=True, default_flow_style=False)
                 
             return True
         
@@ -492,11 +765,10 @@ def sync_customer_name_to_yaml(system_id):
         logging.error(f"同步客户名时出错: {str(e)}")
         return False
 
-def convert_conf_to_toml(conf_file_path, toml_file_path):
-    """将 exascaler.conf 格式转换为 exascaler.toml 格式"""
+def parse_conf_to_dict(conf_file_path):
+    """将 exascaler.conf 解析为与 exascaler.toml 结构相同的配置字典，失败时返回None"""
     try:
         import configparser
-        import toml
         
         # 创建configparser实例，允许重复的选项名
         config = configparser.ConfigParser(allow_no_value=True)
@@ -555,16 +827,18 @@ def convert_conf_to_toml(conf_file_path, toml_file_path):
             else:
                 processed_data[key] = value
         
-        # 写入TOML文件
-        with open(toml_file_path, 'w', encoding='utf-8') as f:
-            toml.dump(processed_data, f)
-        
-        app.logger.info(f"成功将 {conf_file_path} 转换为 {toml_file_path}")
-        return True
+        return processed_data
         
     except Exception as e:
-        app.logger.error(f"配置文件转换失败: {str(e)}")
-        return False
+        app.logger.error(f"配置文件解析失败: {str(e)}")
+        return None
+
+def write_toml_file(config_data, toml_file_path):
+    """将配置字典写入TOML文件"""
+    import toml
+    
+    with open(toml_file_path, 'w', encoding='utf-8') as f:
+        toml.dump(config_data, f)
 
 def get_recent_items(entity_type, limit=5):
     """获取最近访问的实体"""
@@ -711,7 +985,7 @@ def get_customer_yaml_mapping():
                     filepath = os.path.join(data_dir, filename)
                     try:
                         with open(filepath, 'r', encoding='utf-8') as f:
-                            data = yaml.safe_load(f)
+                            data = yaml_codec.safe_load(f)
                             if data and 'customer' in data:
                                 yaml_files[data['customer']] = filepath
                     except Exception as e:
@@ -722,7 +996,7 @@ def get_customer_yaml_mapping():
             if filename.endswith('.yaml') or filename.endswith('.yml'):
                 try:
                     with open(filename, 'r', encoding='utf-8') as f:
-                        data = yaml.safe_load(f)
+                        data = yaml_codec.safe_load(f)
                         if data and 'customer' in data:
                             yaml_files[data['customer']] = filename
                 except Exception as e:
@@ -833,6 +1107,7 @@ def delete_system(system_id):
         if system.get('yaml_file') and os.path.exists(system['yaml_file']):
             try:
                 os.remove(system['yaml_file'])
+                yaml_codec.remove_sidecar(system['yaml_file'])
             except Exception as e:
                 flash(f'删除系统 {system_name} 的资产文件失败：{str(e)}', 'warning')
                 print(f"删除YAML文件失败: {str(e)}")
@@ -898,6 +1173,19 @@ def get_customer_yaml_mapping():
     })
     return mapping
 
+# (客户数据库版本, 客户名 -> YAML文件路径)
+_customer_yaml_files = (None, {})
+
+def get_customer_yaml_version(customer_name):
+    """客户YAML相关数据的版本：客户数据库以及该客户映射到的YAML文件"""
+    global _customer_yaml_files
+    db_version = get_db_version(CUSTOMERS_DB)
+    cached_version, mapping = _customer_yaml_files
+    if cached_version != db_version:
+        mapping = get_customer_yaml_mapping()
+        _customer_yaml_files = (db_version, mapping)
+    return db_version + generations.files_version([mapping.get(customer_name)])
+
 # 查询类型映射
 QUERY_TYPES = {
     0: "所有查询",
@@ -1003,6 +1291,7 @@ def customer_page(customer_name):
                          asset_owners=asset_owners)
 
 @app.route('/api/cluster_names/<customer_name>')
+@conditional_get(get_customer_yaml_version)
 def get_cluster_names_api(customer_name):
     """API：根据客户和资产所有者获取集群名称列表"""
     customer_yaml_mapping = get_customer_yaml_mapping()
@@ -1065,35 +1354,7 @@ def search():
         flash('请输入搜索关键词', 'warning')
         return redirect(url_for('index'))
     
-    customers = get_customers()
-    systems = get_systems()
-    
-    # 搜索结果
-    customer_results = []
-    system_results = []
-    
-    # 搜索客户
-    for customer_id, customer in customers.items():
-        if query in customer.get('name', '').lower():
-            customer_results.append({
-                'id': customer_id,
-                'name': customer.get('name'),
-                'contact': customer.get('contact', ''),
-                'email': customer.get('email', ''),
-                'created_at': customer.get('created_at', '')
-            })
-    
-    # 搜索系统
-    for system_id, system in systems.items():
-        if query in system.get('name', '').lower() or query in system.get('customer_name', '').lower():
-            system_results.append({
-                'id': system_id,
-                'name': system.get('name'),
-                'customer_name': system.get('customer_name', ''),
-                'customer_id': system.get('customer_id', ''),
-                'status': system.get('status', ''),
-                'created_at': system.get('created_at', '')
-            })
+    customer_results, system_results = get_fleet_snapshot().search(query)
     
     return render_template('search_results.html', 
                           query=query,
@@ -1103,18 +1364,15 @@ def search():
 @app.route('/customers')
 @login_required
 def customers_list():
-    """客户管理页面"""
-    customers = get_customers()
-    systems = get_systems()
-    
-    # 计算每个客户下的系统数量
-    systems_count = {}
-    for system_id, system in systems.items():
-        customer_id = system.get('customer_id')
-        if customer_id:
-            systems_count[customer_id] = systems_count.get(customer_id, 0) + 1
+    """客户管理页面（服务端分页、排序和筛选）"""
+    args = get_list_args(listing_index.CUSTOMER_SORT_KEYS)
+    index = get_listing_index()
+    page = index.customer_page(args['page'], args['per_page'], args['sort'],
+                               args['order'] == 'desc', args['q'])
     
-    return render_template('customers.html', customers=customers, systems_count=systems_count)
+    return render_template('customers.html', page=page, list_args=args,
+                         sort_keys=listing_index.CUSTOMER_SORT_KEYS,
+                         systems_count=index.systems_count, devices_count=index.devices_count)
 
 @app.route('/customers/<customer_id>')
 @login_required
@@ -1292,6 +1550,7 @@ def delete_customer(customer_id):
             if yaml_file and os.path.exists(yaml_file):
                 try:
                     os.remove(yaml_file)
+                    yaml_codec.remove_sidecar(yaml_file)
                     print(f"已删除系统YAML文件: {yaml_file}")
                 except Exception as e:
                     flash(f'删除系统 {system_name} 的资产文件失败：{str(e)}', 'warning')
@@ -1379,19 +1638,27 @@ def delete_customer(customer_id):
 @app.route('/systems')
 @login_required
 def systems_list():
-    """系统管理页面"""
+    """系统管理页面（服务端分页、排序和筛选）"""
     # 获取可能的客户ID过滤参数
     customer_id = request.args.get('customer_id')
+    status = request.args.get('status')
+    if status not in listing_index.SYSTEM_STATUS_FILTERS:
+        status = None
     
     # 如果指定了客户ID，记录访问
     if customer_id:
         log_access('customer', customer_id)
     
-    # 获取系统和客户数据
-    systems = get_systems(customer_id)
-    customers = get_customers()
+    args = get_list_args(listing_index.SYSTEM_SORT_KEYS)
+    index = get_listing_index()
+    page = index.system_page(args['page'], args['per_page'], args['sort'],
+                             args['order'] == 'desc', args['q'], customer_id, status)
     
-    return render_template('systems.html', systems=systems, customers=customers, filter_customer_id=customer_id)
+    return render_template('systems.html', page=page, list_args=args,
+                         sort_keys=listing_index.SYSTEM_SORT_KEYS,
+                         status_filters=listing_index.SYSTEM_STATUS_FILTERS,
+                         customers=index.customers, filter_customer_id=customer_id,
+                         filter_status=status, has_systems=bool(index.systems))
 
 @app.route('/systems/new', methods=['GET', 'POST'])
 @login_required
@@ -1490,16 +1757,13 @@ def import_config(system_id):
             config_file.save(config_path)
             
             # 处理配置文件格式转换
+            config_data = None
             if config_filename.lower().endswith('.conf'):
-                # 如果是.conf文件，转换为.toml格式
-                toml_filename = config_filename.rsplit('.', 1)[0] + '.toml'
-                toml_path = os.path.join(temp_dir, toml_filename)
-                
-                if convert_conf_to_toml(config_path, toml_path):
+                # 如果是.conf文件，直接在内存中解析为配置字典，TOML只在归档时写入一次
+                config_data = parse_conf_to_dict(config_path)
+                if config_data is not None:
                     flash('检测到exascaler.conf文件，已自动转换为TOML格式', 'success')
-                    # 使用转换后的TOML文件
-                    config_path = toml_path
-                    config_filename = toml_filename
+                    config_filename = config_filename.rsplit('.', 1)[0] + '.toml'
                 else:
                     flash('exascaler.conf文件转换失败，请检查文件格式', 'error')
                     return render_template('import_config.html', system=system)
@@ -1507,9 +1771,10 @@ def import_config(system_id):
                 flash('不支持的配置文件格式，请上传.toml或.conf文件', 'error')
                 return render_template('import_config.html', system=system)
             
-            # 现在config_path指向有效的TOML文件
+            # 生成器的输入：.conf 为内存中的配置字典，.toml 为上传的文件路径
             toml_path = config_path
             toml_filename = config_filename
+            toml_source = config_data if config_data is not None else toml_path
             
             # 保存SFA文件
             sfa_paths = []
@@ -1542,37 +1807,50 @@ def import_config(system_id):
             
             output_path = os.path.join(os.path.dirname(__file__), output_filename)
             
-            # 执行生成
-            generate_cluster_yaml(toml_path, cluster_name, sfa_paths, output_path, customer_name)
+            # 执行生成（生成器依赖tarfile、toml等，只在导入时加载）
+            from generate_cluster_yaml import generate_cluster_yaml
+            diagnostics = generate_cluster_yaml(toml_source, cluster_name, sfa_paths, output_path, customer_name)
             
-            # 更新系统状态
+            # 归档上传的文件
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            
+            # YAML已经生成，归档失败时系统仍标记为已导入，只提示归档失败
+            try:
+                with diagnostics.stats.stage('archive_copy') as stage:
+                    # 归档 TOML 文件
+                    permanent_toml_filename = f"{timestamp}_{toml_filename}"
+                    permanent_toml_path = os.path.join(system_uploads_dir, permanent_toml_filename)
+                    if config_data is not None:
+                        write_toml_file(config_data, permanent_toml_path)
+                    else:
+                        shutil.copy2(toml_path, permanent_toml_path)
+                    app.logger.info(f"TOML文件已归档至 {permanent_toml_path}")
+                    
+                    # 归档 SFA 文件
+                    for i, sfa_path in enumerate(sfa_paths):
+                        sfa_filename = os.path.basename(sfa_path)
+                        permanent_sfa_filename = f"{timestamp}_{i+1}_{sfa_filename}"
+                        permanent_sfa_path = os.path.join(system_uploads_dir, permanent_sfa_filename)
+                        shutil.copy2(sfa_path, permanent_sfa_path)
+                        app.logger.info(f"SFA文件已归档至 {permanent_sfa_path}")
+                    stage['bytes'] = sum(os.path.getsize(path) for path in sfa_paths)
+            except Exception as e:
+                app.logger.error(f"归档上传文件失败: {str(e)}")
+                flash(f'上传文件归档失败，重新处理时将无法使用本次文件：{str(e)}', 'warning')
+            
+            # 更新系统状态，各阶段耗时合计随导入记录保存（明细见 import_stats 的 detail_file）
             systems[system_id]['status'] = 'imported'
             systems[system_id]['yaml_file'] = output_filename
             systems[system_id]['cluster_name'] = cluster_name
             systems[system_id]['imported_at'] = datetime.now().isoformat()
+            systems[system_id]['import_stats'] = diagnostics.stats.save(output_filename)
             save_json_db(SYSTEMS_DB, systems)
             
-            # 归档上传的文件
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            
-            # 归档 TOML 文件
-            permanent_toml_filename = f"{timestamp}_{toml_filename}"
-            permanent_toml_path = os.path.join(system_uploads_dir, permanent_toml_filename)
-            shutil.copy2(toml_path, permanent_toml_path)
-            app.logger.info(f"TOML文件已归档至 {permanent_toml_path}")
-            
-            # 归档 SFA 文件
-            for i, sfa_path in enumerate(sfa_paths):
-                sfa_filename = os.path.basename(sfa_path)
-                permanent_sfa_filename = f"{timestamp}_{i+1}_{sfa_filename}"
-                permanent_sfa_path = os.path.join(system_uploads_dir, permanent_sfa_filename)
-                shutil.copy2(sfa_path, permanent_sfa_path)
-                app.logger.info(f"SFA文件已归档至 {permanent_sfa_path}")
-            
             # 清理临时文件
             shutil.rmtree(temp_dir)
             
             flash(f'配置导入成功！生成的YAML文件：{output_filename}', 'success')
+            report_generation_diagnostics(diagnostics)
             return redirect(url_for('system_detail', system_id=system_id))
             
         except Exception as e:
@@ -1607,8 +1885,7 @@ def system_detail(system_id):
     assets_info = None
     if system.get('yaml_file') and os.path.exists(system['yaml_file']):
         try:
-            with open(system['yaml_file'], 'r', encoding='utf-8') as f:
-                assets_info = yaml.safe_load(f)
+            assets_info = yaml_codec.load_file(system['yaml_file'], sidecar=True)
         except Exception as e:
             flash(f'读取资产文件失败：{str(e)}', 'warning')
     
@@ -1649,8 +1926,8 @@ def update_yaml(system_id):
         shutil.copy2(yaml_file_path, backup_path)
         
         # 将编辑后的数据写入YAML文件
-        with open(yaml_file_path, 'w', encoding='utf-8') as f:
-            yaml.dump(edited_data, f, default_flow_style=False, allow_unicode=True)
+        yaml_codec.dump_file(edited_data, yaml_file_path, sidecar=True,
+                             default_flow_style=False, allow_unicode=True)
         
         # 更新系统记录
         system['updated_at'] = datetime.now().isoformat()
@@ -1713,16 +1990,12 @@ def update_system_config(system_id):
             config_file.save(config_path)
             
             # 处理配置文件格式转换
+            config_data = None
             if config_filename.lower().endswith('.conf'):
-                # 如果是.conf文件，转换为.toml格式
-                toml_filename = config_filename.rsplit('.', 1)[0] + '.toml'
-                toml_path = os.path.join(temp_dir, toml_filename)
-                
-                if convert_conf_to_toml(config_path, toml_path):
+                # 如果是.conf文件，直接在内存中解析为配置字典，无需写出临时TOML文件
+                config_data = parse_conf_to_dict(config_path)
+                if config_data is not None:
                     flash('检测到exascaler.conf文件，已自动转换为TOML格式', 'success')
-                    # 使用转换后的TOML文件
-                    config_path = toml_path
-                    config_filename = toml_filename
                 else:
                     flash('exascaler.conf文件转换失败，请检查文件格式', 'error')
                     return render_template('update_config.html', system=system, system_id=system_id)
@@ -1730,9 +2003,8 @@ def update_system_config(system_id):
                 flash('不支持的配置文件格式，请上传.toml或.conf文件', 'error')
                 return render_template('update_config.html', system=system, system_id=system_id)
             
-            # 现在config_path指向有效的TOML文件
-            toml_path = config_path
-            toml_filename = config_filename
+            # 生成器的输入：.conf 为内存中的配置字典，.toml 为上传的文件路径
+            toml_source = config_data if config_data is not None else config_path
             
             # 保存SFA文件
             sfa_paths = []
@@ -1771,7 +2043,7 @@ def update_system_config(system_id):
                 # 如果系统记录没有客户名，尝试从YAML文件中获取
                 if not customer_name and os.path.exists(output_filename):
                     with open(output_filename, 'r', encoding='utf-8') as f:
-                        old_yaml = yaml.safe_load(f)
+                        old_yaml = yaml_codec.safe_load(f)
                         if old_yaml and 'customer' in old_yaml:
                             customer_name = old_yaml['customer']
                             logging.info(f"从原始YAML文件中获取到客户名: {customer_name}")
@@ -1804,7 +2076,7 @@ def update_system_config(system_id):
             if not customer_name and os.path.exists(output_filename):
                 try:
                     with open(output_filename, 'r', encoding='utf-8') as f:
-                        yaml_data = yaml.safe_load(f)
+                        yaml_data = yaml_codec.safe_load(f)
                         if yaml_data and 'customer' in yaml_data:
                             customer_name = yaml_data['customer']
                             logging.info(f"从原始YAML文件获取到客户名: {customer_name}")
@@ -1813,7 +2085,8 @@ def update_system_config(system_id):
             
             # 调用生成函数，直接传递客户名参数
             try:
-                generate_cluster_yaml(toml_path, cluster_name, sfa_paths, output_filename, customer_name)
+                from generate_cluster_yaml import generate_cluster_yaml
+                diagnostics = generate_cluster_yaml(toml_source, cluster_name, sfa_paths, output_filename, customer_name)
                 
                 # 记录结果
                 if customer_name:
@@ -1822,9 +2095,11 @@ def update_system_config(system_id):
                     logging.warning("已完成系统配置更新，但未能保留客户名")
                 
                 flash('系统配置已成功更新', 'success')
+                report_generation_diagnostics(diagnostics)
                 
                 # 更新系统记录
                 system['updated_at'] = datetime.now().isoformat()
+                system['import_stats'] = diagnostics.stats.save(output_filename)
                 if 'update_count' not in system:
                     system['update_count'] = 1
                 else:
@@ -1853,76 +2128,56 @@ def update_system_config(system_id):
 # ==================== 集成旧版DCAM查询功能 ====================
 
 @app.route('/api/asset_owners/<system_id>')
+@conditional_get(get_system_data_version)
 def get_asset_owners_api(system_id):
     """获取系统资产所有者列表API"""
-    systems = get_systems()
-    if system_id not in systems:
-        return jsonify([])
-    
-    system = systems[system_id]
-    if not system.get('yaml_file') or not os.path.exists(system['yaml_file']):
-        return jsonify([])
-    
-    try:
-        asset_owners = asset_analyze.get_asset_owners(system['yaml_file'])
-        return jsonify(asset_owners)
-    except Exception as e:
-        app.logger.error(f"获取资产所有者失败: {str(e)}")
-        return jsonify([])
+    return jsonify(get_fleet_snapshot().asset_owners(system_id))
 
-@app.route('/api/cluster_names/<system_id>')
+@app.route('/api/system_cluster_names/<system_id>')
+@conditional_get(get_system_data_version)
 def get_system_cluster_names_api(system_id):
     """获取系统集群名称列表API"""
-    systems = get_systems()
-    if system_id not in systems:
-        return jsonify([])
-    
-    system = systems[system_id]
-    if not system.get('yaml_file') or not os.path.exists(system['yaml_file']):
-        return jsonify([])
-    
     asset_owner = request.args.get('asset_owner')
-    
-    try:
-        cluster_names = asset_analyze.get_cluster_names(system['yaml_file'], asset_owner)
-        return jsonify(cluster_names)
-    except Exception as e:
-        app.logger.error(f"获取集群名称失败: {str(e)}")
-        return jsonify([])
+    return jsonify(get_fleet_snapshot().cluster_names(system_id, asset_owner))
 
 @app.route('/api/system_asset_query/<system_id>')
 def system_asset_query_api(system_id):
     """执行系统资产查询API"""
-    systems = get_systems()
-    if system_id not in systems:
-        return jsonify({"error": "系统不存在"})
-    
-    system = systems[system_id]
-    if not system.get('yaml_file') or not os.path.exists(system['yaml_file']):
-        return jsonify({"error": "系统没有关联的YAML文件"})
-    
     try:
         # 获取查询参数
         query_type = int(request.args.get('query_type', 0))
         asset_owner = request.args.get('asset_owner', '').strip() or None
         cluster_name = request.args.get('cluster_name', '').strip() or None
         
-        # 执行查询
-        result = asset_analyze.query_customer_info(
-            yaml_path=system['yaml_file'],
-            query_type=query_type,
-            asset_owner=asset_owner,
-            cluster_name=cluster_name
-        )
-        
-        # 添加查询类型信息
-        result['query_type'] = query_type
-        
-        return jsonify(result)
+        key = ('system_asset_query', system_id, query_type, asset_owner, cluster_name, get_data_version())
+        return jsonify(query_results.get_or_compute(
+            key, lambda: run_system_asset_query(system_id, query_type, asset_owner, cluster_name)))
     except Exception as e:
         app.logger.error(f"执行资产查询失败: {str(e)}")
         return jsonify({"error": f"查询失败: {str(e)}"})
 
+def run_system_asset_query(system_id, query_type, asset_owner=None, cluster_name=None):
+    """执行单个系统的资产查询，返回结果数据"""
+    systems = get_systems()
+    if system_id not in systems:
+        return {"error": "系统不存在"}
+    
+    system = systems[system_id]
+    if not system.get('yaml_file') or not os.path.exists(system['yaml_file']):
+        return {"error": "系统没有关联的YAML文件"}
+    
+    # 执行查询
+    result = asset_analyze.query_customer_info(
+        yaml_path=system['yaml_file'],
+        query_type=query_type,
+        asset_owner=asset_owner,
+        cluster_name=cluster_name
+    )
+    
+    # 添加查询类型信息
+    result['query_type'] = query_type
+    return result
+
 # 查询类型定义
 QUERY_TYPES = {
     0: "所有查询",
@@ -1938,200 +2193,326 @@ QUERY_TYPES = {
 # 获取所有资产所有者列表的API
 @app.route('/api/global_query')
 @login_required
+@conditional_get(get_data_version)
 def global_query_api():
-    """执行全局资产查询API"""
+    """
+    执行全局资产查询API
+    默认返回合并后的完整结果；format=ndjson 时按系统逐行流式返回；
+    指定 limit/cursor 时按行分页返回单个查询类型的结果
+    """
     try:
         # 获取查询参数
         query_type = int(request.args.get('query_type', 0))
         asset_owner = request.args.get('asset_owner', '').strip() or None
         customer_id = request.args.get('customer_id', '').strip() or None
         system_id = request.args.get('system_id', '').strip() or None
+        response_format = request.args.get('format', '').strip().lower()
+        limit = request.args.get('limit', '').strip()
+        cursor = request.args.get('cursor', '').strip() or None
         
         if query_type not in QUERY_TYPES:
             return jsonify({"error": f"不支持的查询类型: {query_type}"})
         
-        # 对于"所有查询"类型，需要执行所有查询类型并合并结果
-        is_all_query = (query_type == 0)
+        if response_format == 'ndjson':
+            systems, error = select_query_systems(asset_owner, customer_id, system_id)
+            if error:
+                return jsonify({"error": error})
+            return app.response_class(stream_global_query(query_type, systems, asset_owner),
+                                      mimetype='application/x-ndjson')
         
-        # 如果指定了系统ID，调用系统查询API
-        if system_id:
-            systems = get_systems()
-            if system_id not in systems:
-                return jsonify({"error": "系统不存在"})
-            
-            system = systems[system_id]
-            if not system.get('yaml_file') or not os.path.exists(system['yaml_file']):
-                return jsonify({"error": "系统没有关联的YAML文件"})
+        if limit or cursor:
+            if query_type not in QUERY_ROW_KEYS:
+                return jsonify({"error": "分页查询需要指定单个查询类型"})
+            try:
+                limit = int(limit) if limit else app.config['QUERY_PAGE_LIMIT']
+            except ValueError:
+                return jsonify({"error": f"无效的limit参数: {limit}"})
+            limit = max(1, min(limit, app.config['QUERY_PAGE_MAX_LIMIT']))
             
-            # 处理"所有查询"选项
-            if is_all_query:
-                all_results = {"query_type": 0, "all_query_results": {}}
-                # 执行每种查询类型
-                for qt in range(1, 8):  # 1到7的所有查询类型
-                    try:
-                        result = asset_analyze.query_assets(system['yaml_file'], qt, asset_owner)
-                        result['query_type'] = qt
-                        all_results["all_query_results"][qt] = result
-                    except Exception as e:
-                        app.logger.error(f"执行查询类型 {qt} 失败: {str(e)}")
-                return jsonify(all_results)
+            systems, error = select_query_systems(asset_owner, customer_id, system_id)
+            if error:
+                return jsonify({"error": error})
+            data_tag = get_query_data_tag()
+            try:
+                start = decode_query_cursor(cursor, data_tag) if cursor else (0, 0)
+            except ValueError as e:
+                return jsonify({"error": str(e)})
+            return jsonify(run_paged_query(query_type, systems, asset_owner, limit, start, data_tag))
+        
+        # 结果只取决于查询参数和数据文件，相同的查询共享缓存结果
+        key = ('global_query', query_type, asset_owner, customer_id, system_id, get_data_version())
+        return jsonify(query_results.get_or_compute(
+            key, lambda: run_global_query(query_type, asset_owner, customer_id, system_id)))
+    except Exception as e:
+        import traceback
+        tb_str = traceback.format_exc()
+        app.logger.error(f"执行全局资产查询失败: {str(e)}")
+        app.logger.error(f"详细错误信息: {tb_str}")
+        return jsonify({"error": f"查询失败: {str(e)}"})
+
+# 各查询类型结果中的行列表（分页和流式查询按行输出）
+QUERY_ROW_KEYS = {
+    1: 'clusters',
+    2: 'devices',
+    3: 'clusters',
+    4: 'devices',
+    5: 'clusters',
+    6: 'devices',
+    7: 'devices'
+}
+
+def select_query_systems(asset_owner=None, customer_id=None, system_id=None):
+    """
+    按查询条件选出参与查询的系统，返回 ([(系统ID, 系统), ...], 错误信息)
+    顺序固定（数据库中的顺序），分页游标依赖这一顺序
+    """
+    systems = get_systems()
+    if system_id:
+        if system_id not in systems:
+            return [], "系统不存在"
+        system = systems[system_id]
+        if not system.get('yaml_file') or not os.path.exists(system['yaml_file']):
+            return [], "系统没有关联的YAML文件"
+        return [(system_id, system)], None
+    
+    filtered_systems = []
+    for sys_id, system in systems.items():
+        if system.get('yaml_file') and os.path.exists(system['yaml_file']):
+            # 优先使用客户ID过滤
+            if customer_id:
+                if system.get('customer_id') == customer_id:
+                    filtered_systems.append((sys_id, system))
+            # 如果没有客户ID，但有资产所有者，用资产所有者过滤
+            elif asset_owner:
+                owners = asset_analyze.get_asset_owners(system['yaml_file'])
+                if asset_owner in owners:
+                    filtered_systems.append((sys_id, system))
             else:
-                # 调用单个查询类型的逻辑
-                app.logger.info(f"执行单个查询: 类型={query_type}, 系统ID={system_id}, YAML文件={system['yaml_file']}")
-                result = asset_analyze.query_assets(system['yaml_file'], query_type, asset_owner)
-                app.logger.info(f"查询结果: {result}")
-                result['query_type'] = query_type
-                return jsonify(result)
-        
-        # 全局查询逻辑
+                filtered_systems.append((sys_id, system))
+    return filtered_systems, None
+
+def query_system_result(system, query_type, asset_owner=None):
+    """单个系统的查询结果，按YAML文件版本缓存（调用方不得修改返回值）"""
+    yaml_file = system['yaml_file']
+    key = ('system_query', yaml_file, query_type, asset_owner, generations.files_version([yaml_file]))
+    return query_results.get_or_compute(
+        key, lambda: asset_analyze.query_assets(yaml_file, query_type, asset_owner))
+
+def get_query_data_tag():
+    """当前数据版本的短标识，写入分页游标，数据变化后旧游标失效"""
+    return hashlib.sha1(repr(get_data_version()).encode('utf-8')).hexdigest()[:12]
+
+def encode_query_cursor(system_index, offset, data_tag):
+    """分页游标：(系统序号, 该系统结果中的行偏移, 数据版本) 的URL安全编码"""
+    raw = json.dumps([system_index, offset, data_tag], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_query_cursor(cursor, data_tag):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        system_index, offset, cursor_tag = json.loads(raw)
+        if not (isinstance(system_index, int) and isinstance(offset, int)) or system_index < 0 or offset < 0:
+            raise ValueError
+    except (ValueError, TypeError):
+        raise ValueError("无效的分页游标")
+    if cursor_tag != data_tag:
+        raise ValueError("数据已更新，请重新查询")
+    return system_index, offset
+
+def run_paged_query(query_type, systems, asset_owner, limit, start, data_tag):
+    """
+    从游标位置开始按行读取单个查询类型的结果，最多 limit 行
+    只计算本页涉及的系统；next_cursor 为 None 表示已到最后一页
+    """
+    rows_key = QUERY_ROW_KEYS[query_type]
+    system_index, offset = start
+    rows = []
+    while system_index < len(systems) and len(rows) < limit:
+        sys_id, system = systems[system_index]
+        try:
+            items = query_system_result(system, query_type, asset_owner).get(rows_key) or []
+        except Exception as e:
+            app.logger.error(f"处理系统 {sys_id} 查询失败: {str(e)}")
+            items = []
+        page_items = items[offset:offset + limit - len(rows)]
+        rows.extend(page_items)
+        offset += len(page_items)
+        if offset >= len(items):
+            system_index += 1
+            offset = 0
+    
+    next_cursor = None
+    if system_index < len(systems):
+        next_cursor = encode_query_cursor(system_index, offset, data_tag)
+    return {
+        "query_type": query_type,
+        rows_key: rows,
+        "limit": limit,
+        "next_cursor": next_cursor
+    }
+
+def stream_global_query(query_type, systems, asset_owner=None):
+    """
+    以NDJSON格式逐个系统输出查询结果，每行一个JSON对象：
+      {"type": "start", "query_type": ..., "systems": 系统数}
+      {"type": "result", "system_id": ..., "system_name": ..., "query_type": ..., "result": {...}}
+      {"type": "error", "system_id": ..., "query_type": ..., "error": ...}
+      {"type": "end", "systems": 系统数, "rows": 输出的总行数}
+    服务端同时只持有一个系统的结果，不做合并
+    """
+    encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+    query_types = list(QUERY_ROW_KEYS) if query_type == 0 else [query_type]
+    
+    yield encode({"type": "start", "query_type": query_type, "systems": len(systems)}) + '\n'
+    total_rows = 0
+    for sys_id, system in systems:
+        for qt in query_types:
+            try:
+                result = query_system_result(system, qt, asset_owner)
+            except Exception as e:
+                app.logger.error(f"处理系统 {sys_id} 查询类型 {qt} 失败: {str(e)}")
+                yield encode({"type": "error", "system_id": sys_id, "query_type": qt,
+                              "error": str(e)}) + '\n'
+                continue
+            total_rows += len(result.get(QUERY_ROW_KEYS[qt]) or [])
+            yield encode({"type": "result", "system_id": sys_id, "system_name": system.get('name'),
+                          "query_type": qt, "result": result}) + '\n'
+    yield encode({"type": "end", "systems": len(systems), "rows": total_rows}) + '\n'
+
+def run_global_query(query_type, asset_owner=None, customer_id=None, system_id=None):
+    """执行全局资产查询，返回结果数据"""
+    # 对于"所有查询"类型，需要执行所有查询类型并合并结果
+    is_all_query = (query_type == 0)
+    
+    # 如果指定了系统ID，调用系统查询API
+    if system_id:
         systems = get_systems()
-        combined_results = {}
-        
-        # 根据客户ID或资产所有者过滤系统
-        filtered_systems = []
-        for sys_id, system in systems.items():
-            if system.get('yaml_file') and os.path.exists(system['yaml_file']):
-                # 优先使用客户ID过滤
-                if customer_id:
-                    if system.get('customer_id') == customer_id:
-                        filtered_systems.append((sys_id, system))
-                # 如果没有客户ID，但有资产所有者，用资产所有者过滤
-                elif asset_owner:
-                    owners = asset_analyze.get_asset_owners(system['yaml_file'])
-                    if asset_owner in owners:
-                        filtered_systems.append((sys_id, system))
-                else:
-                    filtered_systems.append((sys_id, system))
+        if system_id not in systems:
+            return {"error": "系统不存在"}
+        
+        system = systems[system_id]
+        if not system.get('yaml_file') or not os.path.exists(system['yaml_file']):
+            return {"error": "系统没有关联的YAML文件"}
         
         # 处理"所有查询"选项
         if is_all_query:
             all_results = {"query_type": 0, "all_query_results": {}}
             # 执行每种查询类型
             for qt in range(1, 8):  # 1到7的所有查询类型
-                qt_results = {}
-                for sys_id, system in filtered_systems:
-                    try:
-                        result = asset_analyze.query_assets(system['yaml_file'], qt, asset_owner)
-                        # 将结果整合到该查询类型的结果中
-                        for key, value in result.items():
-                            # 跳过可能导致问题的特殊键
-                            if key in ['query_type', 'error']:
-                                continue
-                                
-                            if key not in qt_results:
-                                qt_results[key] = value
-                            elif isinstance(value, list) and isinstance(qt_results[key], list):
-                                # 安全地合并列表，确保数据类型兼容
-                                try:
-                                    qt_results[key].extend(value)
-                                except Exception as e:
-                                    app.logger.warning(f"列表合并失败，键: {key}, 错误: {str(e)}")
-                                    qt_results[key] = value
-                            elif isinstance(value, dict) and isinstance(qt_results[key], dict):
-                                # 安全地合并字典
-                                try:
-                                    qt_results[key].update(value)
-                                except Exception as e:
-                                    app.logger.warning(f"字典合并失败，键: {key}, 错误: {str(e)}")
-                                    qt_results[key] = value
-                            elif isinstance(value, (int, float)) and isinstance(qt_results[key], (int, float)):
-                                # 安全地合并数字
-                                try:
-                                    qt_results[key] = qt_results.get(key, 0) + value
-                                except Exception as e:
-                                    app.logger.warning(f"数字合并失败，键: {key}, 错误: {str(e)}")
-                                    qt_results[key] = value
-                            else:
-                                # 类型不匹配时，使用新值覆盖
-                                qt_results[key] = value
-                    except Exception as e:
-                        app.logger.error(f"处理系统 {sys_id} 查询类型 {qt} 失败: {str(e)}")
-                
-                qt_results['query_type'] = qt
-                all_results["all_query_results"][qt] = qt_results
-            
-            combined_results = all_results
+                try:
+                    result = asset_analyze.query_assets(system['yaml_file'], qt, asset_owner)
+                    result['query_type'] = qt
+                    all_results["all_query_results"][qt] = result
+                except Exception as e:
+                    app.logger.error(f"执行查询类型 {qt} 失败: {str(e)}")
+            return all_results
         else:
-            # 合并所有系统的查询结果
+            # 调用单个查询类型的逻辑
+            app.logger.info(f"执行单个查询: 类型={query_type}, 系统ID={system_id}, YAML文件={system['yaml_file']}")
+            result = asset_analyze.query_assets(system['yaml_file'], query_type, asset_owner)
+            app.logger.debug("查询结果: %s", result)
+            result['query_type'] = query_type
+            return result
+    
+    # 全局查询逻辑
+    filtered_systems, _ = select_query_systems(asset_owner, customer_id)
+    combined_results = {}
+    
+    # 处理"所有查询"选项
+    if is_all_query:
+        all_results = {"query_type": 0, "all_query_results": {}}
+        # 执行每种查询类型
+        for qt in range(1, 8):  # 1到7的所有查询类型
+            qt_results = {}
             for sys_id, system in filtered_systems:
                 try:
-                    result = asset_analyze.query_assets(system['yaml_file'], query_type, asset_owner)
-                    # 将结果整合到总结果中
+                    result = asset_analyze.query_assets(system['yaml_file'], qt, asset_owner)
+                    # 将结果整合到该查询类型的结果中
                     for key, value in result.items():
-                        if key not in combined_results:
-                            combined_results[key] = value
-                        elif isinstance(value, list):
-                            if key not in combined_results:
-                                combined_results[key] = []
-                            # 确保类型匹配再扩展
-                            if isinstance(combined_results[key], list):
-                                combined_results[key].extend(value)
-                            else:
-                                combined_results[key] = value
-                        elif isinstance(value, dict):
-                            if key not in combined_results:
-                                combined_results[key] = {}
-                            if isinstance(combined_results[key], dict):
-                                combined_results[key].update(value)
-                            else:
-                                combined_results[key] = value
-                        elif isinstance(value, (int, float)):
-                            if key in combined_results and isinstance(combined_results[key], (int, float)):
-                                combined_results[key] = combined_results.get(key, 0) + value
-                            else:
-                                combined_results[key] = value
+                        # 跳过可能导致问题的特殊键
+                        if key in ['query_type', 'error']:
+                            continue
+                            
+                        if key not in qt_results:
+                            qt_results[key] = value
+                        elif isinstance(value, list) and isinstance(qt_results[key], list):
+                            # 安全地合并列表，确保数据类型兼容
+                            try:
+                                qt_results[key].extend(value)
+                            except Exception as e:
+                                app.logger.warning(f"列表合并失败，键: {key}, 错误: {str(e)}")
+                                qt_results[key] = value
+                        elif isinstance(value, dict) and isinstance(qt_results[key], dict):
+                            # 安全地合并字典
+                            try:
+                                qt_results[key].update(value)
+                            except Exception as e:
+                                app.logger.warning(f"字典合并失败，键: {key}, 错误: {str(e)}")
+                                qt_results[key] = value
+                        elif isinstance(value, (int, float)) and isinstance(qt_results[key], (int, float)):
+                            # 安全地合并数字
+                            try:
+                                qt_results[key] = qt_results.get(key, 0) + value
+                            except Exception as e:
+                                app.logger.warning(f"数字合并失败，键: {key}, 错误: {str(e)}")
+                                qt_results[key] = value
+                        else:
+                            # 类型不匹配时，使用新值覆盖
+                            qt_results[key] = value
                 except Exception as e:
-                    app.logger.error(f"处理系统 {sys_id} 查询失败: {str(e)}")
+                    app.logger.error(f"处理系统 {sys_id} 查询类型 {qt} 失败: {str(e)}")
             
-            combined_results['query_type'] = query_type
-        return jsonify(combined_results)
-    except Exception as e:
-        import traceback
-        tb_str = traceback.format_exc()
-        app.logger.error(f"执行全局资产查询失败: {str(e)}")
-        app.logger.error(f"详细错误信息: {tb_str}")
-        return jsonify({"error": f"查询失败: {str(e)}"})
+            qt_results['query_type'] = qt
+            all_results["all_query_results"][qt] = qt_results
+        
+        combined_results = all_results
+    else:
+        # 合并所有系统的查询结果
+        for sys_id, system in filtered_systems:
+            try:
+                result = asset_analyze.query_assets(system['yaml_file'], query_type, asset_owner)
+                # 将结果整合到总结果中
+                for key, value in result.items():
+                    if key not in combined_results:
+                        combined_results[key] = value
+                    elif isinstance(value, list):
+                        if key not in combined_results:
+                            combined_results[key] = []
+                        # 确保类型匹配再扩展
+                        if isinstance(combined_results[key], list):
+                            combined_results[key].extend(value)
+                        else:
+                            combined_results[key] = value
+                    elif isinstance(value, dict):
+                        if key not in combined_results:
+                            combined_results[key] = {}
+                        if isinstance(combined_results[key], dict):
+                            combined_results[key].update(value)
+                        else:
+                            combined_results[key] = value
+                    elif isinstance(value, (int, float)):
+                        if key in combined_results and isinstance(combined_results[key], (int, float)):
+                            combined_results[key] = combined_results.get(key, 0) + value
+                        else:
+                            combined_results[key] = value
+            except Exception as e:
+                app.logger.error(f"处理系统 {sys_id} 查询失败: {str(e)}")
+        
+        combined_results['query_type'] = query_type
+    return combined_results
 
 @app.route('/api/asset_owners_list')
 def get_asset_owners_list_api():
     """API：获取所有系统中的资产所有者列表"""
-    all_asset_owners = set()
-    systems = get_systems()
-    
-    app.logger.info(f"获取资产所有者列表，系统数量: {len(systems)}")
-    
-    for system_id, system in systems.items():
-        app.logger.info(f"处理系统: {system_id}, 系统名称: {system.get('name')}")
-        if system.get('yaml_file') and os.path.exists(system['yaml_file']):
-            try:
-                app.logger.info(f"获取系统 {system_id} 的资产所有者，YAML文件: {system['yaml_file']}")
-                owners = asset_analyze.get_asset_owners(system['yaml_file'])
-                app.logger.info(f"系统 {system_id} 的资产所有者: {owners}")
-                all_asset_owners.update(owners)
-            except Exception as e:
-                app.logger.error(f"读取系统 {system_id} 的资产所有者失败: {str(e)}")
-    
-    result = list(all_asset_owners)
-    app.logger.info(f"返回所有资产所有者: {result}")
-    return jsonify(result)
+    return jsonify(get_fleet_snapshot().asset_owners())
 
 # 获取所有系统列表的API
 @app.route('/api/all_systems')
+@conditional_get(lambda: get_db_version(SYSTEMS_DB))
 def get_all_systems_api():
     """API：获取所有系统列表"""
-    systems = get_systems()
-    result = []
-    
-    for system_id, system in systems.items():
-        app.logger.info(f"系统 {system_id}: {system}")
-        result.append({
-            'id': system_id,
-            'name': system.get('name', 'Unknown System'),
-            'customer_id': system.get('customer_id', ''),
-            'customer_name': system.get('customer_name', '')
-        })
-    
-    app.logger.info(f"返回的系统列表: {result}")
+    result = get_fleet_snapshot().all_systems()
+    app.logger.debug("返回的系统列表: %s", result)
     return jsonify(result)
 
 # 根据资产所有者获取系统列表的API
@@ -2142,26 +2523,11 @@ def get_systems_by_owner_api():
     if not asset_owner:
         return get_all_systems_api()
     
-    systems = get_systems()
-    result = []
-    
-    for system_id, system in systems.items():
-        if system.get('yaml_file') and os.path.exists(system['yaml_file']):
-            try:
-                owners = asset_analyze.get_asset_owners(system['yaml_file'])
-                if asset_owner in owners:
-                    result.append({
-                        'id': system_id,
-                        'name': system.get('name', 'Unknown System'),
-                        'customer_id': system.get('customer_id', '')
-                    })
-            except Exception as e:
-                app.logger.error(f"读取系统 {system_id} 的资产所有者失败: {str(e)}")
-    
-    return jsonify(result)
+    return jsonify(get_fleet_snapshot().systems_by_owner(asset_owner))
 
 # 根据客户ID获取系统列表的API
 @app.route('/api/systems_by_customer')
+@conditional_get(lambda: get_db_version(SYSTEMS_DB))
 def get_systems_by_customer_api():
     """API：根据客户ID获取系统列表"""
     customer_id = request.args.get('customer_id')
@@ -2178,24 +2544,26 @@ def get_systems_by_customer_api():
         system_customer_id = str(system.get('customer_id', ''))
         request_customer_id = str(customer_id)
         
-        app.logger.info(f"比较客户ID: 系统的customer_id='{system_customer_id}' vs 请求的customer_id='{request_customer_id}'")
+        app.logger.debug("比较客户ID: 系统的customer_id='%s' vs 请求的customer_id='%s'",
+                         system_customer_id, request_customer_id)
         
         if system_customer_id == request_customer_id:
-            app.logger.info(f"匹配的系统 {system_id}: {system}")
+            app.logger.debug("匹配的系统 %s: %s", system_id, system)
             system_data = {
                 'id': system_id,
                 'name': system.get('name', 'Unknown System'),
                 'customer_id': system.get('customer_id', ''),
                 'customer_name': system.get('customer_name', '')
             }
-            app.logger.info(f"返回的系统数据: {system_data}")
+            app.logger.debug("返回的系统数据: %s", system_data)
             result.append(system_data)
     
-    app.logger.info(f"按客户过滤后的系统列表: {result}")
+    app.logger.debug("按客户过滤后的系统列表: %s", result)
     return jsonify(result)
 
 # 获取客户列表的API（用于下拉菜单）
 @app.route('/api/customers_list')
+@conditional_get(lambda: get_db_version(CUSTOMERS_DB))
 def get_customers_list_api():
     """API：获取所有客户列表"""
     customers = get_customers()
@@ -2210,6 +2578,86 @@ def get_customers_list_api():
     
     return jsonify(result)
 
+# 运行指标（Prometheus文本格式）
+@app.route('/metrics')
+def metrics_api():
+    """输出所有工作进程合并后的运行指标"""
+    token = app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f"Bearer {token}":
+        return app.response_class('unauthorized\n', status=401, mimetype='text/plain')
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+# 主页下拉菜单的初始化数据API
+@app.route('/api/bootstrap')
+@conditional_get(get_data_version)
+def bootstrap_api():
+    """
+    API：一次返回主页下拉菜单所需的客户、资产所有者和系统列表
+    系统中的 owners 为其资产所有者在 asset_owners 中的序号，页面据此在本地按客户或资产所有者筛选；
+    version 为数据版本标识，页面通过条件请求重新验证，数据未变化时返回304
+    """
+    key = ('bootstrap', get_data_version())
+    return jsonify(query_results.get_or_compute(key, build_bootstrap_data))
+
+def build_bootstrap_data():
+    index = get_listing_index()
+    
+    system_owners = {}
+    for system_id, system in index.systems.items():
+        owners = []
+        if system.get('yaml_file') and os.path.exists(system['yaml_file']):
+            try:
+                owners = asset_analyze.get_asset_owners(system['yaml_file'])
+            except Exception as e:
+                app.logger.error(f"读取系统 {system_id} 的资产所有者失败: {str(e)}")
+        system_owners[system_id] = owners
+    
+    asset_owners = sorted({owner for owners in system_owners.values() for owner in owners}, key=str)
+    owner_index = {owner: i for i, owner in enumerate(asset_owners)}
+    
+    return {
+        'version': get_query_data_tag(),
+        'customers': [
+            {
+                'id': customer_id,
+                'name': customer.get('name', 'Unknown Customer'),
+                'description': customer.get('description', '')
+            }
+            for customer_id, customer in index.customers.items()
+        ],
+        'asset_owners': asset_owners,
+        'systems': [
+            {
+                'id': system_id,
+                'name': system.get('name', 'Unknown System'),
+                'customer_id': system.get('customer_id', ''),
+                'customer_name': system.get('customer_name', ''),
+                'owners': [owner_index[owner] for owner in system_owners[system_id]]
+            }
+            for system_id, system in index.systems.items()
+        ]
+    }
+
+# 全局IP地址查询API
+@app.route('/api/ip_lookup')
+@login_required
+def ip_lookup_api():
+    """API：查询IP地址、LNet NID或CIDR网段所属的系统、设备和主机"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "请提供查询参数q，如 10.20.3.17@o2ib1 或 172.16.0.0/16"})
+    
+    try:
+        matches = get_fleet_snapshot().lookup(query)
+    except ValueError as e:
+        return jsonify({"error": f"无效的地址或网段: {str(e)}"})
+    
+    return jsonify({
+        "query": query,
+        "count": len(matches),
+        "matches": matches
+    })
+
 @app.route('/test_systems_query')
 def test_systems_query():
     """测试系统管理页面快速查询功能"""
@@ -2260,11 +2708,13 @@ def edit_yaml(system_id):
         else:
             try:
                 # 验证YAML格式
-                yaml_data = yaml.safe_load(new_yaml_content)
+                yaml_data = yaml_codec.safe_load(new_yaml_content)
                 
                 # 保存到文件
                 with open(system['yaml_file'], 'w', encoding='utf-8') as f:
                     f.write(new_yaml_content)
+                yaml_codec.write_sidecar(system['yaml_file'], yaml_data)
+                generations.bump(system['yaml_file'])
                 
                 flash('YAML文件已成功更新', 'success')
                 return redirect(url_for('system_detail', system_id=system_id))
@@ -2301,6 +2751,50 @@ def cleanup_old_upload_structure():
         except Exception as e:
             print(f"清理旧上传目录时出错: {str(e)}")
 
+def precompile_templates():
+    """编译 templates/ 下的全部页面模板（编译结果留在进程内缓存，并写入字节码缓存），返回模板数"""
+    count = 0
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        try:
+            app.jinja_env.get_template(name)
+            count += 1
+        except Exception as e:
+            app.logger.warning(f"[模板预编译] {name} 编译失败: {str(e)}")
+    return count
+
+def warm_caches():
+    """
+    预热只读缓存：列表索引、全体系统快照、主页初始化数据和全部页面模板
+    gunicorn 预加载模式下由主进程在fork工作进程之前调用（见 gunicorn.conf.py），工作进程通过写时复制共享
+    这些结构，第一个请求不必从零加载；之后各工作进程在数据版本变化时按需重建。
+    各项缓存都以数据版本为键，数据未变化时再次调用只需检查文件版本。返回各项耗时（秒）
+    """
+    steps = (
+        ('listing_index', get_listing_index),
+        ('fleet_snapshot', get_fleet_snapshot),
+        ('bootstrap', lambda: query_results.get_or_compute(('bootstrap', get_data_version()), build_bootstrap_data)),
+        ('templates', precompile_templates),
+    )
+    timings = {}
+    for name, warm in steps:
+        started = time.perf_counter()
+        try:
+            warm()
+        except Exception as e:
+            app.logger.warning(f"[缓存预热] {name} 失败: {str(e)}")
+        timings[name] = time.perf_counter() - started
+    return timings
+
+@app.cli.command('init')
+def init_command():
+    """初始化数据目录、数据库文件和默认管理员用户，迁移旧的上传目录（部署或升级时执行一次）"""
+    init_application_environment()
+    init_default_user()
+    cleanup_old_upload_structure()
+    # 生产配置档预先把全部模板编译进共享的字节码缓存，未预加载的工作进程也不必从源码编译
+    if app.config['PRECOMPILE_TEMPLATES']:
+        app.logger.info(f"[系统初始化] 已预编译 {precompile_templates()} 个模板")
+
 if __name__ == '__main__':
     # 设置应用根目录为工作目录，确保文件操作一致性
     script_dir = os.path.abspath(os.path.dirname(__file__))
@@ -2309,6 +2803,9 @@ if __name__ == '__main__':
     os.chdir(script_dir)
     print(f"切换工作目录后: {os.getcwd()}")
     
+    # 检查数据目录和数据库文件
+    init_application_environment()
+    
     # 初始化默认用户
     init_default_user()
     
@@ -2328,4 +2825,4 @@ if __name__ == '__main__':
         else:
             print(f"- {os.path.basename(db_file)}: 不存在")
     
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    app.run(debug=app.config['DEBUG'], host='0.0.0.0', port=5000)
@@ -1,4 +1,5 @@
-import yaml
+import server_timing
+import yaml_codec
 from collections import defaultdict
 from datetime import datetime, timedelta
 import os
@@ -9,56 +10,100 @@ def safe_format(value, default="null"):
         return default
     return str(value)
 
-def load_yaml_data(file_path):
-    """加载YAML文件数据并进行结构标准化"""
-    with open(file_path, 'r', encoding='utf-8') as file:
-        data = yaml.safe_load(file)
+def normalize_cluster(cluster):
+    """集群数据结构标准化：devices 和每个设备的 Hosts 统一为列表"""
+    # 统一devices结构为列表
+    if isinstance(cluster.get('devices'), dict):
+        cluster['devices'] = [cluster['devices']]
+    elif 'devices' not in cluster:
+        cluster['devices'] = []
+    
+    # 确保每个设备的Hosts是列表
+    for device in cluster.get('devices', []):
+        if 'Hosts' in device and not isinstance(device['Hosts'], list):
+            device['Hosts'] = [device['Hosts']]
+    return cluster
+
+class ClusterDirectory:
+    """
+    单个YAML文件的集群目录：每个集群的名称、资产所有者（预先转为小写的比较键）
+    有边车文件时只读取其头部，按条件筛选后只加载匹配集群的数据段；
+    否则解析YAML（并重建边车文件），目录直接指向已解析的集群
+    """
     
-    clusters = data.get('clusters', [])
+    def __init__(self, entries, loader):
+        self.entries = entries
+        self._loader = loader
     
-    for cluster in clusters:
-        # 统一devices结构为列表
-        if isinstance(cluster.get('devices'), dict):
-            cluster['devices'] = [cluster['devices']]
-        elif 'devices' not in cluster:
-            cluster['devices'] = []
+    @classmethod
+    def load(cls, file_path):
+        sidecar = yaml_codec.open_sidecar(file_path)
+        if sidecar is not None and sidecar.segments is not None:
+            return cls(sidecar.segments, sidecar.load_segments)
         
-        # 确保每个设备的Hosts是列表
-        for device in cluster.get('devices', []):
-            if 'Hosts' in device and not isinstance(device['Hosts'], list):
-                device['Hosts'] = [device['Hosts']]
+        data = yaml_codec.load_file(file_path, sidecar=True)
+        clusters = data.get('clusters', [])
+        entries = [yaml_codec.directory_entry(cluster) for cluster in clusters]
+        return cls(entries, lambda indexes: [clusters[i] for i in indexes])
+    
+    def values(self, field):
+        """目录中某字段的所有原始值"""
+        return [entry['fields'].get(field) for entry in self.entries]
+    
+    def match(self, asset_owner=None, cluster_name=None):
+        """返回满足条件的集群序号，条件为空表示不过滤（不区分大小写）"""
+        owner_key = yaml_codec.normalize_key(asset_owner) if asset_owner else None
+        name_key = yaml_codec.normalize_key(cluster_name) if cluster_name else None
+        indexes = []
+        for i, entry in enumerate(self.entries):
+            keys = entry['keys']
+            if owner_key is not None and keys.get('Asset_owner') != owner_key:
+                continue
+            if name_key is not None and keys.get('Cluster_name') != name_key:
+                continue
+            indexes.append(i)
+        return indexes
     
-    return clusters
+    def clusters(self, asset_owner=None, cluster_name=None):
+        """加载并标准化满足条件的集群"""
+        return [normalize_cluster(cluster)
+                for cluster in self._loader(self.match(asset_owner, cluster_name))]
+
+def load_yaml_data(file_path, asset_owner=None, cluster_name=None):
+    """
+    加载YAML文件数据并进行结构标准化
+    指定资产所有者或集群名称时只加载匹配的集群
+    """
+    try:
+        return ClusterDirectory.load(file_path).clusters(asset_owner, cluster_name)
+    except yaml_codec.SidecarError:
+        # 边车文件数据段损坏时删除并改为解析YAML
+        yaml_codec.remove_sidecar(file_path)
+        return ClusterDirectory.load(file_path).clusters(asset_owner, cluster_name)
 
 def filter_by_asset_owner(clusters, asset_owner):
     """根据资产所有者过滤集群数据"""
     if not asset_owner:
         return clusters
     
-    filtered_clusters = []
-    for cluster in clusters:
-        if cluster.get('Asset_owner', '').lower() == asset_owner.lower():
-            filtered_clusters.append(cluster)
-    
-    return filtered_clusters
+    owner_key = yaml_codec.normalize_key(asset_owner)
+    return [cluster for cluster in clusters
+            if yaml_codec.normalize_key(cluster.get('Asset_owner')) == owner_key]
 
 def filter_by_cluster_name(clusters, cluster_name):
     """根据集群名称过滤集群数据"""
     if not cluster_name:
         return clusters
     
-    filtered_clusters = []
-    for cluster in clusters:
-        if cluster.get('Cluster_name', '').lower() == cluster_name.lower():
-            filtered_clusters.append(cluster)
-    
-    return filtered_clusters
+    name_key = yaml_codec.normalize_key(cluster_name)
+    return [cluster for cluster in clusters
+            if yaml_codec.normalize_key(cluster.get('Cluster_name')) == name_key]
 
 def export_to_yaml(data, filename):
     """将数据导出为YAML文件"""
     try:
         with open(filename, 'w') as file:
-            yaml.dump(data, file, default_flow_style=False, allow_unicode=True)
+            yaml_codec.dump(data, file, default_flow_style=False, allow_unicode=True)
         print(f"Data successfully exported to {filename}")
     except Exception as e:
         print(f"Error exporting data: {str(e)}")
@@ -391,29 +436,28 @@ def option7_cluster_ips(clusters):
     return result_data
 
 
+@server_timing.timed('query')
 def get_asset_owners(yaml_path):
     """从YAML文件中获取所有可用的资产所有者"""
     if not os.path.exists(yaml_path):
         return []
-    clusters = load_yaml_data(yaml_path)
+    # 只需要目录，不加载集群数据
     asset_owners = set()
-    for cluster in clusters:
-        owner = cluster.get('Asset_owner')
+    for owner in ClusterDirectory.load(yaml_path).values('Asset_owner'):
         if owner:
             asset_owners.add(owner)
     return sorted(list(asset_owners))
 
+@server_timing.timed('query')
 def get_cluster_names(yaml_path, asset_owner=None):
     """从YAML文件中获取所有可用的集群名称，可选择按资产所有者过滤"""
     if not os.path.exists(yaml_path):
         return []
-    clusters = load_yaml_data(yaml_path)
-    if asset_owner:
-        clusters = filter_by_asset_owner(clusters, asset_owner)
+    directory = ClusterDirectory.load(yaml_path)
     
     cluster_names = set()
-    for cluster in clusters:
-        name = cluster.get('Cluster_name')
+    for i in directory.match(asset_owner):
+        name = directory.entries[i]['fields'].get('Cluster_name')
         if name:
             cluster_names.add(name)
     
@@ -423,6 +467,7 @@ def get_cluster_names(yaml_path, asset_owner=None):
     return result
 
 # 新增统一查询接口，便于 Web 调用
+@server_timing.timed('query')
 def query_customer_info(
     yaml_path,
     query_type=1,
@@ -438,11 +483,11 @@ def query_customer_info(
     """
     if not os.path.exists(yaml_path):
         return {"error": f"YAML file '{yaml_path}' not found."}
-    clusters = load_yaml_data(yaml_path)
-    clusters = filter_by_asset_owner(clusters, asset_owner)
     # 集群名称过滤应该应用于所有查询类型，但"所有集群"选项表示不过滤
-    if cluster_name and cluster_name != "所有集群":
-        clusters = filter_by_cluster_name(clusters, cluster_name)
+    if cluster_name == "所有集群":
+        cluster_name = None
+    # 过滤条件下推到集群目录，只加载匹配的集群
+    clusters = load_yaml_data(yaml_path, asset_owner, cluster_name)
     if not clusters:
         return {"error": "No matching clusters found."}
     if query_type == 1:
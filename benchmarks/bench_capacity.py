@@ -0,0 +1,124 @@
+"""
+容量解析基准测试：对比旧的两段式解析（Cap= 失败后再解析 Capacity=）与单次扫描的正则解析
+
+新实现用一个预编译正则（CAPACITY_TOKEN_RE）的一次扫描识别IDEA、AION和字节数三种格式，Python中只做
+单位换算。单条instance字符串很短，耗时主要是每条记录的Python函数调用和匹配对象的创建，正则扫描本身
+并不比旧实现的 split 更快：两者吞吐量基本相当（本机20万条语料上约0.9~1.1倍，随运行波动）。
+新实现的收益在于整数换算不受浮点舍入影响、无法解析的记录不再逐条打印警告（旧实现的打印在本测试中
+被重定向，不计入耗时），以及一种写法同时识别三种格式。本测试用于确认结果一致和没有明显的性能退化。
+
+用法: python benchmarks/bench_capacity.py [--count 200000] [--repeat 5]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from generate_cluster_yaml import parse_capacity_from_capacity_field
+
+
+def legacy_parse_capacity(instance_str, key):
+    """旧实现（split + 引号处理 + if/elif 单位判断），作为对照"""
+    marker = f'{key}='
+    if not instance_str or marker not in instance_str:
+        return 0
+    try:
+        part = instance_str.split(marker)[1].split(',')[0].strip()
+        if part.startswith("'") and part.endswith("'"):
+            part = part[1:-1]
+        elif part.startswith('"') and part.endswith('"'):
+            part = part[1:-1]
+        parts = part.split()
+        if len(parts) >= 2:
+            value = float(parts[0])
+            unit = parts[1].upper()
+            if unit == 'GIB':
+                return int(value * 1024**3)
+            elif unit == 'TIB':
+                return int(value * 1024**4)
+            elif unit == 'MIB':
+                return int(value * 1024**2)
+            elif unit == 'KIB':
+                return int(value * 1024)
+            elif unit == 'B':
+                return int(value)
+            else:
+                print(f"    警告: 未知单位 {unit}, 原始值: {part}")
+                return 0
+        else:
+            print(f"    警告: 无法解析容量格式: {part}")
+            return 0
+    except Exception as e:
+        print(f"    警告: 解析容量时出错: {e}, 原始字符串: {instance_str}")
+        return 0
+
+
+def legacy_parse_capacity_from_capacity_field(instance_str):
+    capacity = legacy_parse_capacity(instance_str, 'Cap')
+    if capacity > 0:
+        return capacity
+    return legacy_parse_capacity(instance_str, 'Capacity')
+
+
+def build_corpus(count, seed=42):
+    """生成模拟 SFAVirtualDisk.json 中 instance 字段的语料（IDEA 与 AION 混合）"""
+    rng = random.Random(seed)
+    units = ['GiB', 'TiB', 'MiB', 'TiB', 'TiB']
+    corpus = []
+    for i in range(count):
+        value = f"{rng.uniform(1, 900):.2f}"
+        unit = rng.choice(units)
+        kind = rng.random()
+        if kind < 0.45:
+            corpus.append(f"Index={i}, Name=ost{i:04d}, Cap={value} {unit}, RAID=6, State=OPTIMAL")
+        elif kind < 0.9:
+            corpus.append(f"Index={i}, Name='ost{i:04d}', Capacity='{value} {unit}', RAIDLevel=6, State='OK'")
+        elif kind < 0.95:
+            corpus.append(f"Index={i}, Name=ost{i:04d}, Cap={rng.randint(10**9, 10**14)} B, State=OPTIMAL")
+        elif kind < 0.98:
+            corpus.append(f"Index={i}, Name=ost{i:04d}, State=OPTIMAL")
+        else:
+            # 无法解析的容量，旧实现会为每条记录打印警告
+            corpus.append(f"Index={i}, Name=ost{i:04d}, Cap=N/A, State=FAILED")
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description="容量解析基准测试")
+    parser.add_argument("--count", type=int, default=200000, help="语料条数")
+    parser.add_argument("--repeat", type=int, default=5, help="重复次数（取最快一次）")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.count)
+
+    # 结果一致性校验（允许旧实现浮点换算与新实现整数换算之间1字节的差异）
+    with contextlib.redirect_stdout(io.StringIO()):
+        legacy = [legacy_parse_capacity_from_capacity_field(s) for s in corpus]
+    current = [parse_capacity_from_capacity_field(s) for s in corpus]
+    mismatches = sum(1 for a, b in zip(legacy, current) if abs(a - b) > 1)
+    print(f"语料条数: {len(corpus)}, 结果不一致: {mismatches}")
+
+    def run_legacy():
+        with contextlib.redirect_stdout(io.StringIO()):
+            for s in corpus:
+                legacy_parse_capacity_from_capacity_field(s)
+
+    def run_current():
+        for s in corpus:
+            parse_capacity_from_capacity_field(s)
+
+    legacy_time = min(timeit.repeat(run_legacy, number=1, repeat=args.repeat))
+    current_time = min(timeit.repeat(run_current, number=1, repeat=args.repeat))
+    print(f"旧实现:   {legacy_time:.3f}s ({legacy_time / len(corpus) * 1e6:.2f} us/条)")
+    print(f"单次扫描: {current_time:.3f}s ({current_time / len(corpus) * 1e6:.2f} us/条)")
+    print(f"加速比:   {legacy_time / current_time:.2f}x")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
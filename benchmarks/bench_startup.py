@@ -0,0 +1,90 @@
+"""
+应用启动基准测试：在新的Python进程中测量导入 app.py 的耗时和第一个请求完成的时间（冷启动的工作进程）
+
+每次在临时目录中的代码副本上运行（不读写实际数据目录），可用 --baseline 与某个git版本对比，如：
+    python benchmarks/bench_startup.py --repeat 10 --baseline HEAD~1
+
+用法: python benchmarks/bench_startup.py [--repeat 10] [--url /login] [--baseline <git版本>]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# 复制到临时目录的内容（不含数据目录）
+COPY_IGNORE = shutil.ignore_patterns('.git', 'data', 'backup_files', 'benchmarks', '__pycache__', '*.log')
+
+# 在子进程中执行：导入应用并完成第一个请求，输出两段耗时（秒）
+CHILD_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+response = app.app.test_client().get(sys.argv[1])
+finished = time.perf_counter()
+print(json.dumps({'import': imported - started, 'first_request': finished - started, 'status': response.status_code}))
+"""
+
+
+def prepare_tree(target, baseline=None):
+    """在 target 下准备代码副本；baseline 为git版本时从该版本导出"""
+    if baseline:
+        os.makedirs(target)
+        archive = subprocess.run(['git', '-C', REPO_DIR, 'archive', baseline], check=True, capture_output=True).stdout
+        subprocess.run(['tar', '-x', '-C', target], input=archive, check=True)
+    else:
+        shutil.copytree(REPO_DIR, target, ignore=COPY_IGNORE)
+
+
+def measure(tree, url, repeat):
+    """多次在新进程中启动，返回 (导入耗时列表, 首个请求完成耗时列表)"""
+    imports, firsts = [], []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, '-c', CHILD_SCRIPT, url], cwd=tree, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"启动失败: {result.stderr[-2000:]}")
+        data = json.loads(result.stdout.strip().splitlines()[-1])
+        imports.append(data['import'])
+        firsts.append(data['first_request'])
+    return imports, firsts
+
+
+def report(label, imports, firsts):
+    print(f"{label}: 导入 中位数 {statistics.median(imports) * 1000:.1f} ms (最小 {min(imports) * 1000:.1f} ms), "
+          f"首个请求完成 中位数 {statistics.median(firsts) * 1000:.1f} ms (最小 {min(firsts) * 1000:.1f} ms)")
+    return statistics.median(firsts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="应用冷启动耗时基准测试")
+    parser.add_argument("--repeat", type=int, default=10, help="每个版本启动的次数")
+    parser.add_argument("--url", default="/login", help="第一个请求的路径")
+    parser.add_argument("--baseline", help="对比的git版本（如 HEAD~1）")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='dcam-bench-startup-')
+    try:
+        current_tree = os.path.join(work_dir, 'current')
+        prepare_tree(current_tree)
+        # 第一次运行写入字节码缓存，不计入结果
+        measure(current_tree, args.url, 1)
+        current = report("当前代码", *measure(current_tree, args.url, args.repeat))
+
+        if args.baseline:
+            baseline_tree = os.path.join(work_dir, 'baseline')
+            prepare_tree(baseline_tree, args.baseline)
+            measure(baseline_tree, args.url, 1)
+            baseline = report(f"基准版本 {args.baseline}", *measure(baseline_tree, args.url, args.repeat))
+            print(f"首个请求完成时间缩短 {(baseline - current) * 1000:.1f} ms ({(1 - current / baseline) * 100:.1f}%)")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
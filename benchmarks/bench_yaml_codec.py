@@ -0,0 +1,124 @@
+"""
+YAML读写基准测试：对比纯Python的 PyYAML 与 yaml_codec（libyaml加速、JSON边车文件）在大型集群文件上的耗时
+（输出格式兼容与读写往返见 tests/test_yaml_codec.py）
+
+用法: python benchmarks/bench_yaml_codec.py [--devices 300] [--hosts 16] [--repeat 3]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import timeit
+
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import yaml_codec
+
+
+class LegacyIndentedDumper(yaml.Dumper):
+    """generate_cluster_yaml 原先使用的Dumper，作为输出格式基准"""
+
+    def increase_indent(self, flow=False, indentless=False):
+        return super(LegacyIndentedDumper, self).increase_indent(flow, False)
+
+
+# generate_cluster_yaml 写文件时的参数
+GENERATOR_KWDS = dict(sort_keys=False, default_flow_style=False, allow_unicode=True, indent=2, width=1000)
+# app.py 中其他写YAML处的参数
+DEFAULT_KWDS = dict(default_flow_style=False, allow_unicode=True)
+
+
+def build_clusters(devices, hosts, seed=7):
+    """生成与 generate_cluster_yaml 输出结构相同的大型集群数据"""
+    rng = random.Random(seed)
+    device_list = []
+    for d in range(devices):
+        host_list = []
+        for h in range(hosts):
+            lnets = [f"172.{16 + n}.{d % 250}.{h + 1}@o2ib{n}" for n in range(rng.choice([1, 2, 2, 3]))]
+            ip_config = {
+                'management': f"10.{d // 250}.{d % 250}.{h + 10}",
+                'lnet1_network': lnets[0] if len(lnets) > 0 else None,
+                'lnet2_network': lnets[1] if len(lnets) > 1 else None,
+            }
+            for i, nid in enumerate(lnets[2:], start=3):
+                ip_config[f"lnet{i}_network"] = nid
+            host_list.append({'hostname': f"oss{d:03d}{h:02d}", 'role': 'MDS/OSS', 'ip': ip_config})
+        device_list.append({
+            'Device_name': f"sfa{d}",
+            'type': rng.choice(['ES400NVX2', 'ES7990X', '自动获取失败']),
+            'SFA version': '12.4.0',
+            'Capacity': f"{rng.uniform(100, 900):.2f} TiB",
+            'Controller_c0_ip': f"10.200.{d // 250}.{d % 250}",
+            'Controller_c1_ip': f"10.201.{d // 250}.{d % 250}",
+            'Controller_c0_serial_number': f"C0SN{d:05d}",
+            'Controller_c1_serial_number': f"C1SN{d:05d}",
+            'BBU1_Expired_Date': '2026-08-11',
+            'BBU2_Expired_Date': '2027-01-31',
+            'Hosts': host_list,
+        })
+    return {
+        'clusters': [{
+            'Cluster_name': 'bench',
+            'EXA version': '6.3.0',
+            'Capacity': '9.87 PiB',
+            'Network_Description': 'Mellanox ConnectX-6; Mellanox ConnectX-7',
+            'Network_port_type': 'InfiniBand, Ethernet',
+            'EMF_IP': '10.0.0.5',
+            'Support_status': '待填入',
+            'Asset_owner': '测试客户',
+            'devices': device_list,
+        }],
+        'customer': '测试客户',
+    }
+
+
+def best(func, repeat):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="YAML读写基准测试")
+    parser.add_argument("--devices", type=int, default=300, help="设备数")
+    parser.add_argument("--hosts", type=int, default=16, help="每台设备的主机数")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数（取最快一次）")
+    args = parser.parse_args()
+
+    data = build_clusters(args.devices, args.hosts)
+    legacy_indented = yaml.dump(data, Dumper=LegacyIndentedDumper, **GENERATOR_KWDS)
+    print(f"libyaml: {'可用' if yaml_codec.LIBYAML else '不可用（使用纯Python实现）'}")
+    print(f"文件大小: {len(legacy_indented.encode('utf-8')) / 1024 / 1024:.1f} MiB "
+          f"({args.devices} 台设备, {args.devices * args.hosts} 台主机)")
+
+    temp_dir = tempfile.mkdtemp()
+    yaml_path = os.path.join(temp_dir, 'bench_clusters.yaml')
+    yaml_codec.dump_file(data, yaml_path, indented=True, sidecar=True, **GENERATOR_KWDS)
+
+    rows = [
+        ('读取',
+         lambda: yaml.safe_load(legacy_indented),
+         lambda: yaml_codec.safe_load(legacy_indented)),
+        ('写入(缩进格式)',
+         lambda: yaml.dump(data, Dumper=LegacyIndentedDumper, **GENERATOR_KWDS),
+         lambda: yaml_codec.dump(data, indented=True, **GENERATOR_KWDS)),
+        ('写入(默认格式)',
+         lambda: yaml.dump(data, **DEFAULT_KWDS),
+         lambda: yaml_codec.dump(data, **DEFAULT_KWDS)),
+        ('读取(边车文件)',
+         lambda: yaml.safe_load(legacy_indented),
+         lambda: yaml_codec.load_file(yaml_path, sidecar=True)),
+    ]
+    print(f"\n{'操作':<14} {'PyYAML':>10} {'yaml_codec':>12} {'加速比':>8}")
+    for name, legacy, current in rows:
+        legacy_time = best(legacy, args.repeat)
+        current_time = best(current, args.repeat)
+        print(f"{name:<14} {legacy_time:>9.3f}s {current_time:>11.3f}s {legacy_time / current_time:>7.2f}x")
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
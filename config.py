@@ -1,16 +1,33 @@
 import os
 
+# 应用目录，缓存等相对路径以此为基准
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+
 class Config:
-    SECRET_KEY = os.environ.get('SECRET_KEY') or 'dcam-production-secret-key-2025'
-    
+    SECRET_KEY = os.environ.get('SECRET_KEY') or 'dcam-secret-key-2025'
+    DEBUG = False
+    # 为None时跟随DEBUG：调试时每次渲染都检查模板文件是否修改
+    TEMPLATES_AUTO_RELOAD = None
+    # Jinja字节码缓存目录（多个工作进程共享），为空时不使用
+    JINJA_BYTECODE_CACHE_DIR = None
+    # init 命令预编译 templates/ 下的全部页面模板，写入字节码缓存（gunicorn 预加载时由缓存预热编译）
+    PRECOMPILE_TEMPLATES = False
+    # 日志配置档（见 logging_setup.PROFILES），可用 DCAM_LOG_PROFILE 覆盖
+    LOG_PROFILE = 'development'
+
 class DevelopmentConfig(Config):
     DEBUG = True
-    
+
 class ProductionConfig(Config):
     DEBUG = False
+    TEMPLATES_AUTO_RELOAD = False
+    JINJA_BYTECODE_CACHE_DIR = os.environ.get('DCAM_JINJA_CACHE_DIR') or \
+        os.path.join(BASE_DIR, 'data', 'jinja_cache')
+    PRECOMPILE_TEMPLATES = True
+    LOG_PROFILE = 'production'
 
 config = {
     'development': DevelopmentConfig,
     'production': ProductionConfig,
     'default': DevelopmentConfig
-}
\ No newline at end of file
+}
@@ -0,0 +1,246 @@
+"""
+生成过程的诊断信息收集器
+
+generate_cluster_yaml 及其辅助函数不再直接 print，而是把信息记录到 Diagnostics 中：
+  - 低于设定级别的信息直接丢弃，不做字符串格式化（格式化参数按 %-风格延迟处理）
+  - 自动获取失败的字段单独记录，与级别无关，供页面展示摘要
+  - 命令行通过 echo=True 逐条输出，保持原来的详细输出
+  - 各阶段（TOML读取、解压、JSON解析、容量解析等）的耗时和字节数记录在 stats 中，
+    按设备和压缩包内的文件分别统计，便于对比不同大小和固件格式的导入开销；系统记录中只保存各阶段合计，
+    逐设备、逐文件的明细写入YAML文件旁的 <名称>_import_stats.json
+"""
+import contextlib
+import json
+import os
+import sys
+import time
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+SILENT = 100
+
+LEVEL_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARNING', ERROR: 'ERROR'}
+
+# 空缺字段分组及其说明（顺序即输出顺序）
+MISSING_SCOPES = (
+    ('cluster_level', '集群级字段'),
+    ('device_level', '设备级字段'),
+    ('controller_level', '控制器级字段'),
+)
+
+
+# 导入阶段及其说明（顺序即输出顺序）
+IMPORT_STAGES = (
+    ('toml_load', 'TOML读取'),
+    ('decompress', '解压'),
+    ('json_decode', 'JSON解析'),
+    ('capacity_parse', '容量解析'),
+    ('network_extract', '网络信息提取'),
+    ('host_assembly', '主机/网卡组装'),
+    ('yaml_dump', 'YAML写入'),
+    ('archive_copy', '归档复制'),
+)
+
+
+class ImportStats:
+    """导入各阶段的耗时（秒）和字节数，可按设备和压缩包内的文件细分"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.elapsed = None
+        self.stages = {}
+        self.devices = {}
+
+    def _device(self, device):
+        entry = self.devices.get(device)
+        if entry is None:
+            entry = self.devices[device] = {'stages': {}, 'members': {}}
+        return entry
+
+    def add(self, stage, seconds, nbytes=None, device=None, member=None):
+        """累计一次阶段耗时；member 为压缩包内的文件名"""
+        total = self.stages.setdefault(stage, {'seconds': 0.0, 'count': 0, 'bytes': 0})
+        total['seconds'] += seconds
+        total['count'] += 1
+        if nbytes:
+            total['bytes'] += nbytes
+        if device is None:
+            return
+        entry = self._device(device)
+        entry['stages'][stage] = entry['stages'].get(stage, 0.0) + seconds
+        if member is not None:
+            record = entry['members'].setdefault(member, {'bytes': 0, 'read_seconds': 0.0, 'decode_seconds': 0.0})
+            record['decode_seconds' if stage == 'json_decode' else 'read_seconds'] += seconds
+            if nbytes and stage == 'json_decode':
+                record['bytes'] += nbytes
+
+    def add_bytes(self, stage, nbytes, device=None):
+        """只累计字节数（如压缩包关闭时才知道的解压字节数），设备上记录为 {阶段}_bytes"""
+        total = self.stages.setdefault(stage, {'seconds': 0.0, 'count': 0, 'bytes': 0})
+        total['bytes'] += nbytes
+        if device is not None:
+            entry = self._device(device)
+            entry[f'{stage}_bytes'] = entry.get(f'{stage}_bytes', 0) + nbytes
+
+    @contextlib.contextmanager
+    def stage(self, stage, device=None, member=None):
+        """记录代码块的耗时；可在块内设置 yield 出的字典的 'bytes' 记录字节数"""
+        result = {'bytes': None}
+        started = time.perf_counter()
+        try:
+            yield result
+        finally:
+            self.add(stage, time.perf_counter() - started, result['bytes'], device, member)
+
+    def set_device_info(self, device, **info):
+        """记录设备的压缩包大小、固件版本等属性"""
+        self._device(device).update(info)
+
+    def finish(self):
+        """生成结束时调用，记录生成总耗时"""
+        self.elapsed = time.perf_counter() - self.started
+
+    def to_dict(self):
+        """转换为可保存到数据库的字典（耗时保留到毫秒以下3位）"""
+        def seconds(value):
+            return round(value, 6)
+
+        order = [name for name, _ in IMPORT_STAGES]
+        names = [name for name in order if name in self.stages]
+        names += sorted(name for name in self.stages if name not in order)
+        devices = {}
+        for device, entry in self.devices.items():
+            info = {key: value for key, value in entry.items() if key not in ('stages', 'members')}
+            info['stages'] = {name: seconds(value) for name, value in entry['stages'].items()}
+            info['members'] = {
+                member: {key: seconds(value) if isinstance(value, float) else value
+                         for key, value in record.items()}
+                for member, record in entry['members'].items()
+            }
+            devices[device] = info
+        return {
+            'generate_seconds': seconds(self.elapsed) if self.elapsed is not None else None,
+            'bundle_bytes': sum(entry.get('bundle_bytes', 0) for entry in self.devices.values()),
+            'stages': {
+                name: {'seconds': seconds(self.stages[name]['seconds']),
+                       'count': self.stages[name]['count'],
+                       'bytes': self.stages[name]['bytes']}
+                for name in names
+            },
+            'devices': devices
+        }
+
+    def summary(self, detail_file=None):
+        """保存到系统记录的摘要：总耗时、压缩包字节数和各阶段合计（不含逐设备、逐文件的明细）"""
+        data = self.to_dict()
+        del data['devices']
+        data['detail_file'] = detail_file
+        return data
+
+    def save(self, yaml_file):
+        """把完整统计写入YAML文件旁的 <名称>_import_stats.json，返回系统记录中保存的摘要"""
+        path = f"{os.path.splitext(yaml_file)[0]}_import_stats.json"
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        except OSError:
+            path = None
+        return self.summary(path)
+
+    def render(self):
+        """命令行格式的阶段耗时表"""
+        labels = dict(IMPORT_STAGES)
+        data = self.to_dict()
+        lines = ["各阶段耗时:"]
+        for name, entry in data['stages'].items():
+            size = f", {entry['bytes']} 字节" if entry['bytes'] else ''
+            lines.append(f"  {labels.get(name, name)}: {entry['seconds'] * 1000:.1f} ms ({entry['count']} 次{size})")
+        for device, entry in data['devices'].items():
+            lines.append(f"  设备 {device}: 压缩包 {entry.get('bundle_bytes', 0)} 字节, "
+                         f"解压 {entry.get('decompress_bytes', 0)} 字节, 固件 {entry.get('sfa_version')}, "
+                         f"容量格式 {entry.get('capacity_format')}")
+            for member, record in sorted(entry['members'].items()):
+                lines.append(f"    {member}: {record['bytes']} 字节, 读取 {record['read_seconds'] * 1000:.1f} ms, "
+                             f"解析 {record['decode_seconds'] * 1000:.1f} ms")
+        if data['generate_seconds'] is not None:
+            lines.append(f"  生成总耗时: {data['generate_seconds'] * 1000:.1f} ms")
+        return '\n'.join(lines)
+
+
+class Diagnostics:
+    """按级别过滤的诊断信息收集器"""
+
+    def __init__(self, level=WARNING, echo=False, stream=None):
+        self.level = level
+        self.echo = echo
+        self.stream = stream
+        self.records = []
+        self.missing_fields = {scope: [] for scope, _ in MISSING_SCOPES}
+        self.stats = ImportStats()
+
+    def enabled_for(self, level):
+        """判断某级别是否会被记录；调用方可据此跳过代价较高的参数计算"""
+        return level >= self.level
+
+    def log(self, level, message, *args):
+        if level < self.level:
+            return
+        if args:
+            message = message % args
+        self.records.append((level, message))
+        if self.echo:
+            print(message, file=self.stream or sys.stdout)
+
+    def debug(self, message, *args):
+        self.log(DEBUG, message, *args)
+
+    def info(self, message, *args):
+        self.log(INFO, message, *args)
+
+    def warning(self, message, *args):
+        self.log(WARNING, message, *args)
+
+    def error(self, message, *args):
+        self.log(ERROR, message, *args)
+
+    def missing(self, scope, field):
+        """记录一个自动获取失败、需要手工补充的字段"""
+        self.missing_fields[scope].append(field)
+
+    @property
+    def has_missing(self):
+        return any(self.missing_fields.values())
+
+    def messages(self, min_level=WARNING):
+        """返回不低于指定级别的已记录信息"""
+        return [message for level, message in self.records if level >= min_level]
+
+    def missing_summary(self, limit=10):
+        """
+        空缺字段的简短摘要，用于页面提示，如
+        "集群级字段: EMF_IP; 设备级字段: sfa0:type 等3项"
+        没有空缺字段时返回空字符串
+        """
+        parts = []
+        for scope, label in MISSING_SCOPES:
+            fields = self.missing_fields[scope]
+            if not fields:
+                continue
+            shown = ', '.join(fields[:limit])
+            if len(fields) > limit:
+                shown += f" 等{len(fields)}项"
+            parts.append(f"{label}: {shown}")
+        return '; '.join(parts)
+
+    def render_missing(self):
+        """命令行格式的空缺字段说明"""
+        lines = ["以下字段未能自动获取，需后续手工补充："]
+        for number, (scope, label) in enumerate(MISSING_SCOPES, start=1):
+            fields = self.missing_fields[scope]
+            if fields:
+                lines.append(f"{number}. {label}: {', '.join(fields)}")
+        if len(lines) == 1:
+            lines.append("无")
+        return '\n'.join(lines)
@@ -0,0 +1,48 @@
+import argparse
+import ipaddress
+
+# IP类型
+KIND_MANAGEMENT = 'management'
+KIND_CONTROLLER = 'controller'
+KIND_EMF = 'emf'
+KIND_LNET = 'lnet'
+
+
+def parse_nid(value):
+    """
+    解析LNet NID，如 '10.20.3.17@o2ib1' -> (IPv4Address, 'o2ib1')
+    不带编号的网络名按Lustre约定补0（o2ib -> o2ib0）
+    """
+    address, _, lnet = str(value).strip().partition('@')
+    address = ipaddress.ip_address(address.strip())
+    lnet = lnet.strip() or None
+    if lnet and not lnet[-1].isdigit():
+        lnet = f"{lnet}0"
+    return address, lnet
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="查询IP地址、LNet NID或网段所属的系统和主机")
+    parser.add_argument("queries", nargs="+", help="如 10.20.3.17、10.20.3.17@o2ib1、172.16.0.0/16")
+    args = parser.parse_args()
+
+    # 与 /api/ip_lookup 使用同一份全体系统快照
+    from app import get_fleet_snapshot
+
+    snapshot = get_fleet_snapshot()
+    print(f"索引地址数: {len(snapshot.ips)}")
+    for query in args.queries:
+        print(f"\n查询: {query}")
+        try:
+            matches = snapshot.lookup(query)
+        except ValueError as e:
+            print(f"  无效的查询: {str(e)}")
+            continue
+        for entry in matches:
+            owner = entry['hostname'] or entry['device_name'] or entry['cluster_name']
+            print("  {:<24} {:<11} {:<16} {:<20} {}/{}".format(
+                entry['nid'] or entry['address'], entry['kind'], entry['field'],
+                str(owner), entry['customer_name'], entry['system_name']
+            ))
+        if not matches:
+            print("  未找到")
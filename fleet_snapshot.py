@@ -0,0 +1,532 @@
+"""
+多进程共享的只读全体系统快照
+
+多个 gunicorn 工作进程各自持有全部系统、集群和地址的Python对象，内存随工作进程数线性增长。
+本模块把列表/查询接口需要的数据写成一个紧凑、不可变的二进制快照文件，各进程以只读方式内存映射，
+同一文件的页面由操作系统在进程间共享：
+  - 文件头：魔数、格式版本、数据版本摘要，之后是各段的 (偏移, 记录数) 表
+  - 字符串段：去重后的UTF-8字符串依次存放，另有 (偏移, 长度) 表，记录中只保存字符串序号
+  - 客户、系统、集群、设备、主机、IP地址段：定长记录，按序号互相引用（系统 -> 集群 -> 设备 -> 主机）
+  - 系统ID索引按ID排序，IP地址段按 (IP版本, 地址) 排序，查询时在映射上二分查找
+读取时直接在映射上解包所需的记录和字符串，不在进程中建立整份数据的对象。
+
+快照以数据版本（见 app.get_data_version）的摘要标识。应用中写入数据的请求在返回响应前重建快照；
+数据被应用之外的进程修改时，由第一个发现数据版本变化的进程重建。重建在文件锁保护下进行，写入临时文件后
+原子替换；其他进程看到磁盘上已是新版本时直接重新映射。
+"""
+import argparse
+import bisect
+import fcntl
+import hashlib
+import ipaddress
+import mmap
+import os
+import struct
+import threading
+
+import asset_analyze
+import fleet_index
+import yaml_codec
+
+MAGIC = b'DCAMSNP1'
+FORMAT_VERSION = 1
+
+# 字符串为空（None）时的序号，也用于不存在的设备/主机引用
+NONE = 0xFFFFFFFF
+
+SECTIONS = ('blob', 'strings', 'customers', 'systems', 'system_index', 'clusters', 'devices', 'hosts', 'ips')
+
+_HEADER = struct.Struct('<8sII16s')
+_SECTION = struct.Struct('<QQ')
+_STRING = struct.Struct('<II')
+# 客户：ID、名称、联系人、邮箱、创建时间
+_CUSTOMER = struct.Struct('<5I')
+# 系统：ID、名称、客户ID、客户名称、状态、创建时间、YAML文件、标志位、第一个集群、集群数
+_SYSTEM = struct.Struct('<10I')
+_SYSTEM_INDEX = struct.Struct('<I')
+# 集群：所属系统、名称、资产所有者、EMF地址、第一个设备、设备数
+_CLUSTER = struct.Struct('<6I')
+# 设备：所属集群、名称、第一个主机、主机数
+_DEVICE = struct.Struct('<4I')
+# 主机：所属设备、主机名
+_HOST = struct.Struct('<2I')
+# IP地址：IP版本、16字节地址（大端）、类型、字段名、LNet网络、系统、集群、设备、主机
+_IP = struct.Struct('<B16sB6I')
+
+FLAG_ARCHIVED = 1
+FLAG_HAS_YAML = 2
+
+KINDS = (fleet_index.KIND_MANAGEMENT, fleet_index.KIND_CONTROLLER, fleet_index.KIND_EMF, fleet_index.KIND_LNET)
+
+# "所有集群"选项，与 asset_analyze.get_cluster_names 一致
+ALL_CLUSTERS = "所有集群"
+
+
+def version_digest(version):
+    """数据版本的摘要，写入快照文件头"""
+    return hashlib.sha1(repr(version).encode('utf-8')).digest()[:16]
+
+
+class SnapshotError(ValueError):
+    """快照文件格式不匹配或已损坏"""
+
+
+class _Builder:
+    """收集记录并序列化为快照"""
+
+    def __init__(self):
+        self._string_ids = {}
+        self._strings = []
+        self.records = {name: [] for name in SECTIONS if name not in ('blob', 'strings')}
+
+    def string(self, value):
+        if value is None:
+            return NONE
+        value = value if isinstance(value, str) else str(value)
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            string_id = self._string_ids[value] = len(self._strings)
+            self._strings.append(value)
+        return string_id
+
+    def add_ip(self, value, kind, field, system, cluster, device=NONE, host=NONE):
+        """添加一个地址；值无效（为空或"自动获取失败"等）时忽略"""
+        if not value:
+            return
+        try:
+            address, lnet = fleet_index.parse_nid(value)
+        except ValueError:
+            return
+        self.records['ips'].append((
+            address.version, int(address).to_bytes(16, 'big'), KINDS.index(kind),
+            self.string(field), self.string(lnet if kind == fleet_index.KIND_LNET else None),
+            system, cluster, device, host
+        ))
+
+    def add_system(self, system_id, system):
+        clusters = []
+        yaml_file = system.get('yaml_file')
+        has_yaml = bool(yaml_file) and os.path.exists(yaml_file)
+        if has_yaml:
+            try:
+                clusters = asset_analyze.load_yaml_data(yaml_file)
+            except Exception as e:
+                print(f"[快照] 读取系统 {system_id} 的YAML失败: {str(e)}")
+
+        system_no = len(self.records['systems'])
+        first_cluster = len(self.records['clusters'])
+        flags = (FLAG_ARCHIVED if system.get('archived') else 0) | (FLAG_HAS_YAML if has_yaml else 0)
+        self.records['systems'].append((
+            self.string(system_id), self.string(system.get('name')), self.string(system.get('customer_id')),
+            self.string(system.get('customer_name')), self.string(system.get('status')),
+            self.string(system.get('created_at')), self.string(yaml_file), flags, first_cluster, len(clusters)
+        ))
+
+        for cluster in clusters:
+            cluster_no = len(self.records['clusters'])
+            devices = cluster.get('devices', [])
+            self.records['clusters'].append((
+                system_no, self.string(cluster.get('Cluster_name')), self.string(cluster.get('Asset_owner')),
+                self.string(cluster.get('EMF_IP')), len(self.records['devices']), len(devices)
+            ))
+            self.add_ip(cluster.get('EMF_IP'), fleet_index.KIND_EMF, 'EMF_IP', system_no, cluster_no)
+
+            for device in devices:
+                device_no = len(self.records['devices'])
+                hosts = device.get('Hosts') or []
+                self.records['devices'].append((
+                    cluster_no, self.string(device.get('Device_name')), len(self.records['hosts']), len(hosts)
+                ))
+                for field in ('Controller_c0_ip', 'Controller_c1_ip'):
+                    self.add_ip(device.get(field), fleet_index.KIND_CONTROLLER, field,
+                                system_no, cluster_no, device_no)
+
+                for host in hosts:
+                    host_no = len(self.records['hosts'])
+                    self.records['hosts'].append((device_no, self.string(host.get('hostname'))))
+                    for field, value in (host.get('ip') or {}).items():
+                        if field == 'management':
+                            kind = fleet_index.KIND_MANAGEMENT
+                        elif field.startswith('lnet'):
+                            kind = fleet_index.KIND_LNET
+                        else:
+                            continue
+                        self.add_ip(value, kind, field, system_no, cluster_no, device_no, host_no)
+
+    def serialize(self, digest):
+        system_ids = [record[0] for record in self.records['systems']]
+        self.records['system_index'] = [
+            (i,) for i in sorted(range(len(system_ids)), key=lambda i: self._strings[system_ids[i]])
+        ]
+        # 排序稳定，地址相同的记录保持添加顺序
+        self.records['ips'].sort(key=lambda record: (record[0], record[1]))
+
+        encoded = [value.encode('utf-8') for value in self._strings]
+        string_table = []
+        offset = 0
+        for data in encoded:
+            string_table.append((offset, len(data)))
+            offset += len(data)
+
+        bodies = {
+            'blob': b''.join(encoded),
+            'strings': b''.join(_STRING.pack(*item) for item in string_table),
+        }
+        for name, record_struct in _RECORD_STRUCTS.items():
+            bodies[name] = b''.join(record_struct.pack(*record) for record in self.records[name])
+
+        counts = {'blob': len(bodies['blob']), 'strings': len(string_table)}
+        counts.update({name: len(self.records[name]) for name in _RECORD_STRUCTS})
+
+        parts = [_HEADER.pack(MAGIC, FORMAT_VERSION, len(SECTIONS), digest)]
+        offset = _HEADER.size + _SECTION.size * len(SECTIONS)
+        table = []
+        for name in SECTIONS:
+            # 各段按8字节对齐
+            padding = -offset % 8
+            table.append(_SECTION.pack(offset + padding, counts[name]))
+            bodies[name] = b'\0' * padding + bodies[name]
+            offset += len(bodies[name])
+        parts.extend(table)
+        parts.extend(bodies[name] for name in SECTIONS)
+        return b''.join(parts)
+
+
+_RECORD_STRUCTS = {
+    'customers': _CUSTOMER,
+    'systems': _SYSTEM,
+    'system_index': _SYSTEM_INDEX,
+    'clusters': _CLUSTER,
+    'devices': _DEVICE,
+    'hosts': _HOST,
+    'ips': _IP,
+}
+
+
+def build(systems, customers, digest=b'\0' * 16):
+    """由系统和客户数据生成快照内容（bytes）"""
+    builder = _Builder()
+    for customer_id, customer in customers.items():
+        builder.records['customers'].append(tuple(builder.string(value) for value in (
+            customer_id, customer.get('name'), customer.get('contact'),
+            customer.get('email'), customer.get('created_at')
+        )))
+    for system_id, system in systems.items():
+        builder.add_system(system_id, system)
+    return builder.serialize(digest)
+
+
+class _Records:
+    """映射中某一段的定长记录，按需解包"""
+
+    def __init__(self, buffer, offset, count, record_struct):
+        self._buffer = buffer
+        self._offset = offset
+        self._count = count
+        self._struct = record_struct
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        if not 0 <= i < self._count:
+            raise IndexError(i)
+        return self._struct.unpack_from(self._buffer, self._offset + i * self._struct.size)
+
+    def __iter__(self):
+        view = memoryview(self._buffer)[self._offset:self._offset + self._count * self._struct.size]
+        return self._struct.iter_unpack(view)
+
+
+class FleetSnapshot:
+    """只读快照，buffer 为内存映射（或bytes）"""
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        if len(buffer) < _HEADER.size:
+            raise SnapshotError("快照文件不完整")
+        magic, format_version, section_count, self.digest = _HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or format_version != FORMAT_VERSION or section_count != len(SECTIONS):
+            raise SnapshotError("快照文件格式不匹配")
+        sections = {
+            name: _SECTION.unpack_from(buffer, _HEADER.size + i * _SECTION.size)
+            for i, name in enumerate(SECTIONS)
+        }
+        self._blob_offset = sections['blob'][0]
+        self._strings = _Records(buffer, *sections['strings'], _STRING)
+        for name, record_struct in _RECORD_STRUCTS.items():
+            setattr(self, name, _Records(buffer, *sections[name], record_struct))
+
+    def string(self, string_id):
+        if string_id == NONE:
+            return None
+        offset, length = self._strings[string_id]
+        start = self._blob_offset + offset
+        return str(self._buffer[start:start + length], 'utf-8')
+
+    def find_system(self, system_id):
+        """按系统ID二分查找，返回系统序号，不存在时返回None"""
+        ids = _KeyView(self.system_index, lambda record: self.string(self.systems[record[0]][0]))
+        i = bisect.bisect_left(ids, system_id)
+        if i < len(ids) and ids[i] == system_id:
+            return self.system_index[i][0]
+        return None
+
+    def _system_clusters(self, system):
+        first, count = system[8], system[9]
+        return (self.clusters[i] for i in range(first, first + count))
+
+    # ---- 列表和搜索 ----
+
+    def all_systems(self):
+        """全部系统的ID、名称和所属客户（数据库中的顺序）"""
+        return [{
+            'id': self.string(system[0]),
+            'name': self.string(system[1]) or 'Unknown System',
+            'customer_id': self.string(system[2]) or '',
+            'customer_name': self.string(system[3]) or ''
+        } for system in self.systems]
+
+    def search(self, query):
+        """按名称搜索客户和系统（query 为小写），返回 (客户结果, 系统结果)"""
+        customer_results = []
+        for customer in self.customers:
+            name = self.string(customer[1]) or ''
+            if query in name.lower():
+                customer_results.append({
+                    'id': self.string(customer[0]),
+                    'name': name,
+                    'contact': self.string(customer[2]) or '',
+                    'email': self.string(customer[3]) or '',
+                    'created_at': self.string(customer[4]) or ''
+                })
+
+        system_results = []
+        for system in self.systems:
+            name = self.string(system[1]) or ''
+            customer_name = self.string(system[3]) or ''
+            if query in name.lower() or query in customer_name.lower():
+                system_results.append({
+                    'id': self.string(system[0]),
+                    'name': name,
+                    'customer_name': customer_name,
+                    'customer_id': self.string(system[2]) or '',
+                    'status': self.string(system[4]) or '',
+                    'created_at': self.string(system[5]) or ''
+                })
+        return customer_results, system_results
+
+    # ---- 资产查询的选项 ----
+
+    def system_asset_owners(self, system_no):
+        owners = {self.string(cluster[2]) for cluster in self._system_clusters(self.systems[system_no])}
+        owners.discard(None)
+        owners.discard('')
+        return sorted(owners)
+
+    def asset_owners(self, system_id=None):
+        """某个系统（为空时全部系统）的资产所有者，按名称排序"""
+        if system_id is not None:
+            system_no = self.find_system(system_id)
+            return self.system_asset_owners(system_no) if system_no is not None else []
+        owners = {self.string(cluster[2]) for cluster in self.clusters}
+        owners.discard(None)
+        owners.discard('')
+        return sorted(owners)
+
+    def systems_by_owner(self, asset_owner):
+        """包含指定资产所有者的系统"""
+        result = []
+        for system in self.systems:
+            if any(self.string(cluster[2]) == asset_owner for cluster in self._system_clusters(system)):
+                result.append({
+                    'id': self.string(system[0]),
+                    'name': self.string(system[1]) or 'Unknown System',
+                    'customer_id': self.string(system[2]) or ''
+                })
+        return result
+
+    def cluster_names(self, system_id, asset_owner=None):
+        """
+        系统的集群名称，前面加"所有集群"选项（与 asset_analyze.get_cluster_names 相同）；
+        系统不存在或没有YAML文件时返回空列表
+        """
+        system_no = self.find_system(system_id)
+        if system_no is None:
+            return []
+        system = self.systems[system_no]
+        if not system[7] & FLAG_HAS_YAML:
+            return []
+        owner_key = yaml_codec.normalize_key(asset_owner) if asset_owner else None
+        names = set()
+        for cluster in self._system_clusters(system):
+            if owner_key is not None and yaml_codec.normalize_key(self.string(cluster[2])) != owner_key:
+                continue
+            name = self.string(cluster[1])
+            if name:
+                names.add(name)
+        return [ALL_CLUSTERS] + sorted(names)
+
+    # ---- IP地址查询 ----
+
+    def lookup(self, query):
+        """
+        查询地址，支持三种格式：
+          10.20.3.17        精确匹配
+          10.20.3.17@o2ib1  按NID匹配（地址相同且LNet网络相同）
+          172.16.0.0/16     查询网段内的所有地址
+        返回匹配地址的字典（地址、类型、NID、所属系统/集群/设备/主机），按地址顺序排列
+        """
+        query = str(query).strip()
+        keys = _KeyView(self.ips, lambda record: (record[0], record[1]))
+        lnet = None
+        if '/' in query:
+            network = ipaddress.ip_network(query, strict=False)
+            low = (network.version, int(network.network_address).to_bytes(16, 'big'))
+            high = (network.version, int(network.broadcast_address).to_bytes(16, 'big'))
+        else:
+            address, lnet = fleet_index.parse_nid(query)
+            low = high = (address.version, int(address).to_bytes(16, 'big'))
+
+        start = bisect.bisect_left(keys, low)
+        end = bisect.bisect_right(keys, high, lo=start)
+        matches = []
+        for i in range(start, end):
+            record = self.ips[i]
+            entry = self._ip_entry(record)
+            if lnet and entry['lnet'] != lnet:
+                continue
+            matches.append(entry)
+        return matches
+
+    def _ip_entry(self, record):
+        version, packed, kind, field, lnet, system_no, cluster_no, device_no, host_no = record
+        address_class = ipaddress.IPv6Address if version == 6 else ipaddress.IPv4Address
+        address = address_class(int.from_bytes(packed, 'big'))
+        system = self.systems[system_no]
+        lnet = self.string(lnet)
+        return {
+            'address': str(address),
+            'kind': KINDS[kind],
+            'nid': f"{address}@{lnet}" if lnet else None,
+            'lnet': lnet,
+            'field': self.string(field),
+            'system_id': self.string(system[0]),
+            'system_name': self.string(system[1]),
+            'customer_name': self.string(system[3]),
+            'cluster_name': self.string(self.clusters[cluster_no][1]),
+            'device_name': self.string(self.devices[device_no][1]) if device_no != NONE else None,
+            'hostname': self.string(self.hosts[host_no][1]) if host_no != NONE else None
+        }
+
+    @property
+    def size(self):
+        return len(self._buffer)
+
+
+class _KeyView:
+    """把记录序列映射为比较键的只读序列，供 bisect 使用"""
+
+    def __init__(self, records, key):
+        self._records = records
+        self._key = key
+
+    def __len__(self):
+        return len(self._records)
+
+    def __getitem__(self, i):
+        return self._key(self._records[i])
+
+
+def open_snapshot(path):
+    """只读映射快照文件，文件不存在时返回None"""
+    try:
+        with open(path, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        # ValueError: 空文件无法映射
+        return None
+    return FleetSnapshot(buffer)
+
+
+def write_snapshot(path, data):
+    """写入临时文件后原子替换，正在映射旧文件的进程不受影响"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+_cache_lock = threading.Lock()
+_cached_snapshot = None
+
+
+def get_snapshot(path, version, load):
+    """
+    获取与数据版本 version 对应的快照：本进程已映射的快照版本一致时直接返回；
+    否则重新映射磁盘上的文件，仍不一致时加文件锁，调用 load() 取得 (系统, 客户) 重建
+    快照文件无法写入时在内存中建立（只对本进程有效）
+    """
+    global _cached_snapshot
+
+    digest = version_digest(version)
+    snapshot = _cached_snapshot
+    if snapshot is not None and snapshot.digest == digest:
+        return snapshot
+
+    with _cache_lock:
+        if _cached_snapshot is not None and _cached_snapshot.digest == digest:
+            return _cached_snapshot
+        try:
+            snapshot = _load_or_rebuild(path, digest, load)
+        except OSError as e:
+            print(f"[快照] 无法使用快照文件 {path}，在内存中建立: {str(e)}")
+            snapshot = FleetSnapshot(build(*load(), digest=digest))
+        _cached_snapshot = snapshot
+        return snapshot
+
+
+def _open_current(path, digest):
+    try:
+        snapshot = open_snapshot(path)
+    except SnapshotError:
+        return None
+    return snapshot if snapshot is not None and snapshot.digest == digest else None
+
+
+def _load_or_rebuild(path, digest, load):
+    snapshot = _open_current(path, digest)
+    if snapshot is not None:
+        return snapshot
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(f"{path}.lock", 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            # 等待锁期间其他进程可能已经重建
+            snapshot = _open_current(path, digest)
+            if snapshot is None:
+                write_snapshot(path, build(*load(), digest=digest))
+                snapshot = open_snapshot(path)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+    return snapshot
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="查看全体系统快照文件的内容统计")
+    parser.add_argument("path", help="快照文件，如 data/db/fleet_snapshot.bin")
+    args = parser.parse_args()
+
+    snapshot = open_snapshot(args.path)
+    if snapshot is None:
+        print(f"快照文件不存在: {args.path}")
+    else:
+        print(f"文件大小: {snapshot.size} 字节, 数据版本摘要: {snapshot.digest.hex()}")
+        for name in ('customers', 'systems', 'clusters', 'devices', 'hosts', 'ips'):
+            print(f"  {name:<10} {len(getattr(snapshot, name))}")
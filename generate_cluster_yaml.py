@@ -1,14 +1,66 @@
 import argparse
+import contextlib
 import toml
-import yaml
 import tarfile
 import json
 import os
 import glob
 import re
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 
-def calculate_bbu_expired_date(mfg_date_str):
+import metrics
+import yaml_codec
+from diagnostics import Diagnostics, DEBUG, INFO, WARNING, SILENT
+
+# sfainfo文件名中的控制器IP，用作设备标识
+DEVICE_IP_RE = re.compile(r'(\d+\.\d+\.\d+\.\d+)')
+
+def extract_device_ip(sfainfo_file):
+    """从sfainfo文件名中提取控制器IP地址，未找到时返回None"""
+    ip_match = DEVICE_IP_RE.search(os.path.basename(sfainfo_file))
+    return ip_match.group(1) if ip_match else None
+
+def device_key(sfainfo_file):
+    """导入统计中的设备标识：控制器IP，文件名中没有IP时使用文件名"""
+    return extract_device_ip(sfainfo_file) or os.path.basename(sfainfo_file)
+
+@contextlib.contextmanager
+def open_sfainfo(sfainfo_file, stats=None):
+    """打开sfainfo压缩包，关闭时记录解压的字节数；给出 stats 时同时记录到导入统计"""
+    device = device_key(sfainfo_file)
+    if stats is not None:
+        with stats.stage('decompress', device):
+            tar = tarfile.open(sfainfo_file, 'r:gz')
+        stats.set_device_info(device, file=os.path.basename(sfainfo_file),
+                              bundle_bytes=os.path.getsize(sfainfo_file))
+    else:
+        tar = tarfile.open(sfainfo_file, 'r:gz')
+    with tar:
+        try:
+            yield tar
+        finally:
+            decompressed = tar.fileobj.tell()
+            metrics.inc('dcam_tarball_decompressed_bytes_total', decompressed)
+            if stats is not None:
+                stats.add_bytes('decompress', decompressed, device)
+
+def read_sfainfo_json(tar, member, stats, device):
+    """
+    读取并解析压缩包中的JSON文件，解压（读取）和解析的耗时分别计入导入统计
+    文件不存在时与 tar.extractfile 一样抛出 KeyError，不是普通文件时返回 None
+    """
+    name = os.path.basename(member)
+    with stats.stage('decompress', device, name):
+        member_file = tar.extractfile(member)
+        if not member_file:
+            return None
+        content = member_file.read()
+    with stats.stage('json_decode', device, name) as stage:
+        stage['bytes'] = len(content)
+        return json.loads(content.decode('utf-8'))
+
+def calculate_bbu_expired_date(mfg_date_str, diagnostics=None):
     """
     计算BBU过期日期
     BBU过期日期 = 制造日期 + 1825天 (约5年)
@@ -27,61 +79,64 @@ def calculate_bbu_expired_date(mfg_date_str):
         return expired_date.strftime('%Y-%m-%d')
         
     except Exception as e:
-        print(f"    计算BBU过期日期失败: {mfg_date_str}, 错误: {e}")
+        if diagnostics is not None:
+            diagnostics.warning("    计算BBU过期日期失败: %s, 错误: %s", mfg_date_str, e)
         return None
 
-def extract_network_info_from_sfainfo_files(sfainfo_files):
+def extract_network_info_from_sfainfo_files(sfainfo_files, diagnostics=None):
     """
     从所有设备的SFAClientIOC.json文件中提取Mellanox网络信息
     只处理Description中包含Mellanox的数据网络部分
     返回网络描述和端口类型
     """
+    if diagnostics is None:
+        diagnostics = Diagnostics(SILENT)
     all_port_types = set()
     all_network_descriptions = set()
     
-    print("提取Mellanox网络信息:")
+    diagnostics.info("提取Mellanox网络信息:")
     
+    stats = diagnostics.stats
     for sfainfo_file in sfainfo_files:
-        print(f"  处理设备: {sfainfo_file}")
+        diagnostics.info("  处理设备: %s", sfainfo_file)
+        device = device_key(sfainfo_file)
         
         try:
-            with tarfile.open(sfainfo_file, 'r:gz') as tar:
-                client_ioc_file = tar.extractfile('sfa-logs/SFAClientIOC.json')
-                if client_ioc_file:
-                    content = client_ioc_file.read().decode('utf-8')
-                    client_ioc_data = json.loads(content)
-                    
-                    device_port_types = set()
-                    device_descriptions = set()
-                    mellanox_count = 0
-                    
-                    for item in client_ioc_data:
-                        if isinstance(item, dict):
-                            description = item.get('Description', '')
-                            
-                            # 只处理Mellanox设备（数据网络）
-                            if 'mellanox' in description.lower():
-                                mellanox_count += 1
-                                
-                                # 收集完整的Description
-                                device_descriptions.add(description)
-                                all_network_descriptions.add(description)
+            with open_sfainfo(sfainfo_file, stats) as tar:
+                client_ioc_data = read_sfainfo_json(tar, 'sfa-logs/SFAClientIOC.json', stats, device)
+                if client_ioc_data is not None:
+                    with stats.stage('network_extract', device):
+                        device_port_types = set()
+                        device_descriptions = set()
+                        mellanox_count = 0
+                        
+                        for item in client_ioc_data:
+                            if isinstance(item, dict):
+                                description = item.get('Description', '')
                                 
-                                # 收集IOCPortTypes
-                                ioc_port_types = item.get('IOCPortTypes', [])
-                                for port_type in ioc_port_types:
-                                    device_port_types.add(port_type)
-                                    all_port_types.add(port_type)
+                                # 只处理Mellanox设备（数据网络）
+                                if 'mellanox' in description.lower():
+                                    mellanox_count += 1
+                                    
+                                    # 收集完整的Description
+                                    device_descriptions.add(description)
+                                    all_network_descriptions.add(description)
+                                    
+                                    # 收集IOCPortTypes
+                                    ioc_port_types = item.get('IOCPortTypes', [])
+                                    for port_type in ioc_port_types:
+                                        device_port_types.add(port_type)
+                                        all_port_types.add(port_type)
                     
                     if mellanox_count > 0:
-                        print(f"    发现 {mellanox_count} 个Mellanox网口")
-                        print(f"    网络描述: {len(device_descriptions)} 种")
-                        print(f"    端口类型: {sorted(device_port_types)}")
+                        diagnostics.info("    发现 %d 个Mellanox网口", mellanox_count)
+                        diagnostics.info("    网络描述: %d 种", len(device_descriptions))
+                        diagnostics.info("    端口类型: %s", sorted(device_port_types))
                     else:
-                        print(f"    未发现Mellanox网口")
+                        diagnostics.info("    未发现Mellanox网口")
                         
         except Exception as e:
-            print(f"    读取SFAClientIOC失败: {e}")
+            diagnostics.warning("    读取SFAClientIOC失败: %s", e)
     
     # 处理网络描述 - 保持完整的描述信息
     network_description_result = None
@@ -107,14 +162,16 @@ def extract_network_info_from_sfainfo_files(sfainfo_files):
     
     port_type_result = ', '.join(friendly_port_types) if friendly_port_types else None
     
-    print(f"  网络描述汇总: {network_description_result}")
-    print(f"  网络端口类型汇总: {port_type_result}")
+    diagnostics.info("  网络描述汇总: %s", network_description_result)
+    diagnostics.info("  网络端口类型汇总: %s", port_type_result)
     
     return network_description_result, port_type_result
 
-def extract_device_info_from_sfainfo(sfainfo_file):
+def extract_device_info_from_sfainfo(sfainfo_file, diagnostics=None):
     """从sfainfo tar.gz文件中提取设备信息"""
-    print(f"处理sfainfo文件: {sfainfo_file}")
+    if diagnostics is None:
+        diagnostics = Diagnostics(SILENT)
+    diagnostics.info("处理sfainfo文件: %s", sfainfo_file)
     
     device_info = {
         'capacity': 0,
@@ -127,107 +184,114 @@ def extract_device_info_from_sfainfo(sfainfo_file):
         'bbu2_expired_date': None
     }
     
+    stats = diagnostics.stats
+    device = device_key(sfainfo_file)
     try:
-        with tarfile.open(sfainfo_file, 'r:gz') as tar:
+        with open_sfainfo(sfainfo_file, stats) as tar:
             # 1. 从BundleInfo.json提取基本信息
             try:
-                bundle_info_file = tar.extractfile('sfa-logs/BundleInfo.json')
-                if bundle_info_file:
-                    content = bundle_info_file.read().decode('utf-8')
-                    bundle_data = json.loads(content)
-                    if bundle_data and len(bundle_data) > 0:
-                        bundle = bundle_data[0]
-                        device_info['type'] = bundle.get('Platform')
-                        device_info['controller_c0_serial'] = bundle.get('Controller0Serial')
-                        device_info['controller_c1_serial'] = bundle.get('Controller1Serial')
-                        print(f"  设备类型: {device_info['type']}")
-                        print(f"  控制器序列号: C0={device_info['controller_c0_serial']}, C1={device_info['controller_c1_serial']}")
+                bundle_data = read_sfainfo_json(tar, 'sfa-logs/BundleInfo.json', stats, device)
+                if bundle_data and len(bundle_data) > 0:
+                    bundle = bundle_data[0]
+                    device_info['type'] = bundle.get('Platform')
+                    device_info['controller_c0_serial'] = bundle.get('Controller0Serial')
+                    device_info['controller_c1_serial'] = bundle.get('Controller1Serial')
+                    diagnostics.info("  设备类型: %s", device_info['type'])
+                    diagnostics.info("  控制器序列号: C0=%s, C1=%s",
+                                     device_info['controller_c0_serial'], device_info['controller_c1_serial'])
             except Exception as e:
-                print(f"    读取BundleInfo失败: {e}")
+                diagnostics.warning("    读取BundleInfo失败: %s", e)
             
             # 2. 从SFAStorageSystem.json提取系统名称
             try:
-                storage_system_file = tar.extractfile('sfa-logs/SFAStorageSystem.json')
-                if storage_system_file:
-                    content = storage_system_file.read().decode('utf-8')
-                    storage_data = json.loads(content)
-                    if storage_data and len(storage_data) > 0:
-                        storage = storage_data[0]
-                        device_info['system_name'] = storage.get('Name')
-                        print(f"  系统名称: {device_info['system_name']}")
+                storage_data = read_sfainfo_json(tar, 'sfa-logs/SFAStorageSystem.json', stats, device)
+                if storage_data and len(storage_data) > 0:
+                    storage = storage_data[0]
+                    device_info['system_name'] = storage.get('Name')
+                    diagnostics.info("  系统名称: %s", device_info['system_name'])
             except Exception as e:
-                print(f"    读取SFAStorageSystem失败: {e}")
+                diagnostics.warning("    读取SFAStorageSystem失败: %s", e)
             
             # 3. 从SFAController.json提取SFA版本
             try:
-                controller_file = tar.extractfile('sfa-logs/SFAController.json')
-                if controller_file:
-                    content = controller_file.read().decode('utf-8')
-                    controller_data = json.loads(content)
-                    if controller_data and len(controller_data) > 0:
-                        # 使用第一个控制器的固件版本
-                        controller = controller_data[0]
-                        device_info['sfa_version'] = controller.get('FWRelease')
-                        print(f"  SFA版本: {device_info['sfa_version']}")
+                controller_data = read_sfainfo_json(tar, 'sfa-logs/SFAController.json', stats, device)
+                if controller_data and len(controller_data) > 0:
+                    # 使用第一个控制器的固件版本
+                    controller = controller_data[0]
+                    device_info['sfa_version'] = controller.get('FWRelease')
+                    diagnostics.info("  SFA版本: %s", device_info['sfa_version'])
             except Exception as e:
-                print(f"    读取SFAController失败: {e}")
+                diagnostics.warning("    读取SFAController失败: %s", e)
             
             # 4. 从SFAUPS.json提取BBU制造日期并计算过期日期
             try:
-                ups_file = tar.extractfile('sfa-logs/SFAUPS.json')
-                if ups_file:
-                    content = ups_file.read().decode('utf-8')
-                    ups_data = json.loads(content)
-                    if ups_data:
-                        # 通常有2个BBU
-                        for i, ups in enumerate(ups_data):
-                            mfg_date = ups.get('BatteryManufactureDate')
-                            if mfg_date:
-                                expired_date = calculate_bbu_expired_date(mfg_date)
-                                if i == 0:
-                                    device_info['bbu1_expired_date'] = expired_date
-                                elif i == 1:
-                                    device_info['bbu2_expired_date'] = expired_date
-                        print(f"  BBU过期日期: BBU1={device_info['bbu1_expired_date']}, BBU2={device_info['bbu2_expired_date']}")
+                ups_data = read_sfainfo_json(tar, 'sfa-logs/SFAUPS.json', stats, device)
+                if ups_data:
+                    # 通常有2个BBU
+                    for i, ups in enumerate(ups_data):
+                        mfg_date = ups.get('BatteryManufactureDate')
+                        if mfg_date:
+                            expired_date = calculate_bbu_expired_date(mfg_date, diagnostics)
+                            if i == 0:
+                                device_info['bbu1_expired_date'] = expired_date
+                            elif i == 1:
+                                device_info['bbu2_expired_date'] = expired_date
+                    diagnostics.info("  BBU过期日期: BBU1=%s, BBU2=%s",
+                                     device_info['bbu1_expired_date'], device_info['bbu2_expired_date'])
             except Exception as e:
-                print(f"    读取SFAUPS失败: {e}")
+                diagnostics.warning("    读取SFAUPS失败: %s", e)
             
             # 5. 计算OST容量
             try:
-                virtual_disk_file = tar.extractfile('sfa-logs/SFAVirtualDisk.json')
-                if virtual_disk_file:
-                    content = virtual_disk_file.read().decode('utf-8')
-                    virtual_disks = json.loads(content)
-                    
-                    total_capacity = 0
-                    # 遍历所有虚拟磁盘
-                    for disk in virtual_disks:
-                        disk_name = disk.get('Name', 'Unknown')
+                virtual_disks = read_sfainfo_json(tar, 'sfa-logs/SFAVirtualDisk.json', stats, device)
+                if virtual_disks is not None:
+                    with stats.stage('capacity_parse', device):
+                        total_capacity = 0
+                        unparsed = 0
+                        capacity_format = None
+                        # 逐卷输出代价较高，只在DEBUG级别时记录
+                        per_volume = diagnostics.enabled_for(DEBUG)
+                        # 遍历所有虚拟磁盘
+                        for disk in virtual_disks:
+                            disk_name = disk.get('Name', 'Unknown')
+                            
+                            # 检查是否是OST卷（通常名称包含'OST'）
+                            if 'OST' in disk_name.upper():
+                                # 从instance字段解析容量 (支持IDEA和AION格式)
+                                instance = disk.get('instance', '')
+                                capacity = parse_capacity_from_capacity_field(instance)
+                                if capacity > 0:
+                                    total_capacity += capacity
+                                    if capacity_format is None:
+                                        # 记录固件日志格式，便于按格式对比导入开销
+                                        capacity_format = 'AION' if 'Capacity=' in instance else 'IDEA'
+                                    if per_volume:
+                                        diagnostics.debug("    OST卷: %s, 容量: %d 字节 (%s)",
+                                                          disk_name, capacity, format_capacity(capacity))
+                                else:
+                                    unparsed += 1
+                                    if per_volume:
+                                        diagnostics.debug("    OST卷: %s, 无法解析容量", disk_name)
                         
-                        # 检查是否是OST卷（通常名称包含'OST'）
-                        if 'OST' in disk_name.upper():
-                            # 从instance字段解析容量 (支持IDEA和AION格式)
-                            capacity = parse_capacity_from_capacity_field(disk.get('instance', ''))
-                            if capacity > 0:
-                                total_capacity += capacity
-                                print(f"    OST卷: {disk_name}, 容量: {capacity} 字节 ({format_capacity(capacity)})")
-                            else:
-                                print(f"    OST卷: {disk_name}, 无法解析容量")
-                    
                     device_info['capacity'] = total_capacity
-                    print(f"  设备总容量: {total_capacity} 字节 ({format_capacity(total_capacity)})")
+                    stats.set_device_info(device, capacity_format=capacity_format)
+                    if unparsed:
+                        diagnostics.warning("  %s: %d 个OST卷无法解析容量", sfainfo_file, unparsed)
+                    if diagnostics.enabled_for(INFO):
+                        diagnostics.info("  设备总容量: %d 字节 (%s)", total_capacity, format_capacity(total_capacity))
                     
             except Exception as e:
-                print(f"    计算容量失败: {e}")
+                diagnostics.warning("    计算容量失败: %s", e)
                 
     except Exception as e:
-        print(f"处理sfainfo文件失败: {e}")
+        diagnostics.error("处理sfainfo文件失败: %s", e)
     
+    stats.set_device_info(device, platform=device_info['type'], sfa_version=device_info['sfa_version'])
     return device_info
 
-def extract_ost_capacity_from_sfainfo(sfainfo_file):
+def extract_ost_capacity_from_sfainfo(sfainfo_file, diagnostics=None):
     """从sfainfo tar.gz文件中提取OST容量信息（保留兼容性）"""
-    device_info = extract_device_info_from_sfainfo(sfainfo_file)
+    device_info = extract_device_info_from_sfainfo(sfainfo_file, diagnostics)
     return device_info['capacity']
 
 def format_capacity(bytes_value):
@@ -248,143 +312,309 @@ def format_capacity(bytes_value):
         # 使用 TiB
         return f"{tib_value:.2f} TiB"
 
+# 容量单位换算表（SFA使用二进制单位；无单位时为字节数）
+CAPACITY_UNITS = {
+    '': 1,
+    'B': 1,
+    'BYTES': 1,
+    'KIB': 1024,
+    'MIB': 1024**2,
+    'GIB': 1024**3,
+    'TIB': 1024**4,
+    'PIB': 1024**5
+}
+
+# 容量标记：字段名、分隔符、引号和单位都在正则中匹配，同时识别:
+#   IDEA:   Cap=15.4 TiB
+#   AION:   Capacity='11.26 TiB'
+#   字节数: Cap=16932479067750
+_CAPACITY_VALUE = r"""=[ '"]*(\d+)(?:\.(\d+))?[ \t]*([A-Za-z]*)"""
+CAPACITY_TOKEN_RE = re.compile(r"Cap(?:acity)?" + _CAPACITY_VALUE)
+# 只接受指定字段的容量标记
+CAPACITY_FIELD_RES = {
+    'Cap': re.compile(r"Cap" + _CAPACITY_VALUE),
+    'Capacity': re.compile(r"Capacity" + _CAPACITY_VALUE)
+}
+
+def _find_capacity(instance_str, pattern=CAPACITY_TOKEN_RE):
+    """
+    用一个正则扫描 instance 字符串，返回第一个有效的容量（字节数），没有时返回0
+    按十进制整数精确换算，避免浮点误差；未知单位或容量为0时继续查找下一个标记
+    """
+    if not isinstance(instance_str, str):
+        return 0
+    for match in pattern.finditer(instance_str):
+        whole, fraction, unit = match.groups()
+        factor = CAPACITY_UNITS.get(unit.upper(), 0)
+        if fraction:
+            capacity = int(whole + fraction) * factor // 10**len(fraction)
+        else:
+            capacity = int(whole) * factor
+        if capacity > 0:
+            return capacity
+    return 0
+
 def parse_capacity_from_instance(instance_str):
     """
     从 instance 字符串中解析 Cap 值并转换为字节
     例如: "Cap=15.4 TiB" -> 字节数
     """
-    if not instance_str or 'Cap=' not in instance_str:
-        return 0
-    
-    try:
-        # 提取 Cap= 后面的值
-        cap_part = instance_str.split('Cap=')[1].split(',')[0].strip()
-        
-        # 解析数值和单位
-        parts = cap_part.split()
-        if len(parts) >= 2:
-            value = float(parts[0])
-            unit = parts[1].upper()
-            
-            # 转换为字节
-            if unit == 'GIB':
-                return int(value * 1024**3)
-            elif unit == 'TIB':
-                return int(value * 1024**4)
-            elif unit == 'MIB':
-                return int(value * 1024**2)
-            elif unit == 'KIB':
-                return int(value * 1024)
-            elif unit == 'B':
-                return int(value)
-            else:
-                print(f"    警告: 未知单位 {unit}, 原始值: {cap_part}")
-                return 0
-        else:
-            print(f"    警告: 无法解析容量格式: {cap_part}")
-            return 0
-            
-    except Exception as e:
-        print(f"    警告: 解析容量时出错: {e}, 原始字符串: {instance_str}")
-        return 0
+    return _find_capacity(instance_str, CAPACITY_FIELD_RES['Cap'])
 
 def parse_capacity_from_instance_with_capacity_field(instance_str):
     """
     从 instance 字符串中解析 Capacity 值并转换为字节 (适用于 AION 系统)
     例如: "Capacity='11.26 TiB'" -> 字节数
     """
-    if not instance_str or 'Capacity=' not in instance_str:
-        return 0
-    
-    try:
-        # 提取 Capacity= 后面的值，处理可能的引号
-        capacity_part = instance_str.split('Capacity=')[1].split(',')[0].strip()
-        
-        # 移除引号（单引号或双引号）
-        if capacity_part.startswith("'") and capacity_part.endswith("'"):
-            capacity_part = capacity_part[1:-1]
-        elif capacity_part.startswith('"') and capacity_part.endswith('"'):
-            capacity_part = capacity_part[1:-1]
-        
-        # 解析数值和单位
-        parts = capacity_part.split()
-        if len(parts) >= 2:
-            value = float(parts[0])
-            unit = parts[1].upper()
-            
-            # 转换为字节
-            if unit == 'GIB':
-                return int(value * 1024**3)
-            elif unit == 'TIB':
-                return int(value * 1024**4)
-            elif unit == 'MIB':
-                return int(value * 1024**2)
-            elif unit == 'KIB':
-                return int(value * 1024)
-            elif unit == 'B':
-                return int(value)
-            else:
-                print(f"    警告: 未知单位 {unit}, 原始值: {capacity_part}")
-                return 0
-        else:
-            print(f"    警告: 无法解析容量格式: {capacity_part}")
-            return 0
-            
-    except Exception as e:
-        print(f"    警告: 解析AION容量时出错: {e}, 原始字符串: {instance_str}")
-        return 0
+    return _find_capacity(instance_str, CAPACITY_FIELD_RES['Capacity'])
 
 def parse_capacity_from_capacity_field(instance_str):
     """
-    通用容量解析函数，尝试多种格式
-    首先尝试 IDEA 格式 (Cap=)，然后尝试 AION 格式 (Capacity=)
+    通用容量解析函数，单次扫描同时识别 IDEA (Cap=)、AION (Capacity=) 和直接字节数格式
+    同一条记录中只会出现其中一种格式，返回第一个有效的容量值
     """
-    # 尝试 IDEA 格式
-    capacity = parse_capacity_from_instance(instance_str)
-    if capacity > 0:
-        return capacity
-    
-    # 尝试 AION 格式
-    capacity = parse_capacity_from_instance_with_capacity_field(instance_str)
-    return capacity
+    return _find_capacity(instance_str)
 
-def get_total_cluster_capacity(sfainfo_tar_list):
+def get_total_cluster_capacity(sfainfo_tar_list, diagnostics=None):
     """
     计算集群总容量（所有设备OST卷容量之和）
     """
+    if diagnostics is None:
+        diagnostics = Diagnostics(SILENT)
     total_capacity = 0
     
     if not sfainfo_tar_list:
-        print("警告: 未提供 sfainfo 压缩包，容量将设为 null")
+        diagnostics.warning("警告: 未提供 sfainfo 压缩包，容量将设为 null")
         return None
     
-    print("开始计算集群总容量...")
-    print("=" * 50)
+    diagnostics.info("开始计算集群总容量...")
+    diagnostics.info("=" * 50)
     
     for tar_path in sfainfo_tar_list:
         if os.path.exists(tar_path):
-            device_capacity = extract_ost_capacity_from_sfainfo(tar_path)
+            device_capacity = extract_ost_capacity_from_sfainfo(tar_path, diagnostics)
             total_capacity += device_capacity
         else:
-            print(f"警告: 文件不存在 {tar_path}")
-        print("-" * 30)
+            diagnostics.warning("警告: 文件不存在 %s", tar_path)
+        diagnostics.info("-" * 30)
     
-    print(f"集群总容量: {total_capacity} 字节 ({format_capacity(total_capacity)})")
-    print("=" * 50)
+    diagnostics.info("集群总容量: %d 字节 (%s)", total_capacity, format_capacity(total_capacity))
+    diagnostics.info("=" * 50)
     
     return total_capacity
 
-def generate_cluster_yaml(toml_path, cluster_name, sfainfo_paths=None, output_path="generated_clusters.yaml", customer_name=None):
-    # 读取TOML文件
-    with open(toml_path, 'r') as f:
-        toml_data = toml.load(f)
+AUTO_DETECT_FAILED = "自动获取失败"
+
+def _mlx_sort_key(nic_name):
+    """自定义排序：InfiniBand接口优先，然后按编号排序"""
+    if nic_name.startswith('mlxib'):
+        # InfiniBand接口优先级高，编号前加0前缀
+        interface_num = nic_name.replace('mlxib', '')
+        return (0, int(interface_num) if interface_num.isdigit() else 0)
+    elif nic_name.startswith('mlxen'):
+        # 以太网接口优先级低，编号前加1前缀
+        interface_num = nic_name.replace('mlxen', '')
+        return (1, int(interface_num) if interface_num.isdigit() else 0)
+    return (2, 0)  # 其他接口
+
+def extract_lnet_networks(nic_info):
+    """动态检测所有mlx*接口（mlxib*, mlxen*）并按规则排序生成lnet网络地址"""
+    mlx_interfaces = {}
+    for nic_name, nic_config in nic_info.items():
+        if nic_name.startswith(('mlxib', 'mlxen')) and nic_config.get('ip'):
+            mlx_interfaces[nic_name] = nic_config['ip']
     
-    # 收集空缺字段信息
-    missing_fields = {
-        "cluster_level": [],
-        "device_level": [],
-        "controller_level": []
-    }
+    lnet_networks = []
+    for nic_name in sorted(mlx_interfaces, key=_mlx_sort_key):
+        # 根据接口类型确定协议
+        if nic_name.startswith('mlxib'):
+            # InfiniBand接口: mlxib0 -> @o2ib0, mlxib1 -> @o2ib1
+            protocol = f"@o2ib{nic_name.replace('mlxib', '')}"
+        else:
+            # 以太网接口: mlxen0 -> @tcp0, mlxen1 -> @tcp1
+            protocol = f"@tcp{nic_name.replace('mlxen', '')}"
+        lnet_networks.append(f"{mlx_interfaces[nic_name]}{protocol}")
+    return lnet_networks
+
+@dataclass
+class HostRecord:
+    """主机记录"""
+    __slots__ = ('hostname', 'role', 'management', 'lnet_networks')
+    hostname: str
+    role: str
+    management: object
+    lnet_networks: list
+    
+    def to_dict(self):
+        lnet_networks = self.lnet_networks
+        # 构建IP配置，支持多个lnet网络
+        ip_config = {
+            "management": self.management,
+            "lnet1_network": lnet_networks[0] if len(lnet_networks) > 0 else None,
+            "lnet2_network": lnet_networks[1] if len(lnet_networks) > 1 else None
+        }
+        # 超过两个的lnet网络依次保存为 lnet3_network, lnet4_network ...
+        for i, lnet_addr in enumerate(lnet_networks[2:], start=3):
+            ip_config[f"lnet{i}_network"] = lnet_addr
+        
+        return {
+            "hostname": self.hostname,
+            "role": self.role,
+            "ip": ip_config
+        }
+
+@dataclass
+class DeviceRecord:
+    """SFA设备记录，info 为从sfainfo提取的设备信息（未匹配到时为None）"""
+    __slots__ = ('device_name', 'controller_c0_ip', 'controller_c1_ip', 'info', 'hosts')
+    device_name: str
+    controller_c0_ip: object
+    controller_c1_ip: object
+    info: object
+    hosts: list
+    
+    def _info_value(self, key):
+        if self.info and self.info[key]:
+            return self.info[key]
+        return AUTO_DETECT_FAILED
+    
+    def to_dict(self):
+        # 优先使用从sfainfo提取的信息
+        capacity = self.info['capacity'] if self.info else 0
+        return {
+            "Device_name": self.device_name,
+            "type": self._info_value('type'),
+            "SFA version": self._info_value('sfa_version'),
+            "Capacity": format_capacity(capacity) if capacity > 0 else AUTO_DETECT_FAILED,
+            "Controller_c0_ip": self.controller_c0_ip or AUTO_DETECT_FAILED,
+            "Controller_c1_ip": self.controller_c1_ip or AUTO_DETECT_FAILED,
+            "Controller_c0_serial_number": self._info_value('controller_c0_serial'),
+            "Controller_c1_serial_number": self._info_value('controller_c1_serial'),
+            "BBU1_Expired_Date": self._info_value('bbu1_expired_date'),
+            "BBU2_Expired_Date": self._info_value('bbu2_expired_date'),
+            "Hosts": [host.to_dict() for host in self.hosts]
+        }
+
+@dataclass
+class ClusterRecord:
+    """集群记录"""
+    __slots__ = ('cluster_name', 'exa_version', 'capacity', 'network_description',
+                 'network_port_type', 'emf_ip', 'asset_owner', 'devices')
+    cluster_name: str
+    exa_version: object
+    capacity: int
+    network_description: object
+    network_port_type: object
+    emf_ip: object
+    asset_owner: object
+    devices: list
+    
+    def to_dict(self):
+        return {
+            "Cluster_name": self.cluster_name,  # 由参数传入
+            "EXA version": self.exa_version or AUTO_DETECT_FAILED,
+            "Capacity": format_capacity(self.capacity) if self.capacity > 0 else AUTO_DETECT_FAILED,  # 从 sfainfo 压缩包计算得出
+            "Network_Description": self.network_description or AUTO_DETECT_FAILED,  # 从sfainfo文件提取的Mellanox网络描述
+            "Network_port_type": self.network_port_type or AUTO_DETECT_FAILED,  # 从sfainfo文件提取
+            "EMF_IP": self.emf_ip or AUTO_DETECT_FAILED,
+            "Support_status": "待填入",
+            "Asset_owner": self.asset_owner if self.asset_owner else "待选择Customer",
+            "devices": [device.to_dict() for device in self.devices]
+        }
+
+class ClusterIndex:
+    """
+    TOML配置的索引：一次性建立 按sfa分组的主机 和 按控制器IP索引的设备信息，
+    避免每个SFA设备都遍历全部主机和设备信息
+    """
+    
+    def __init__(self, toml_data, device_info_map):
+        self.toml_data = toml_data
+        self.device_info_by_ip = device_info_map
+        self.hosts_by_sfa = {}
+        for host_name, host_info in toml_data.get("host", {}).items():
+            self.hosts_by_sfa.setdefault(host_info.get("sfa"), []).append((host_name, host_info))
+    
+    def device_info_for(self, controller_c0_ip, controller_c1_ip):
+        """通过控制器IP查找对应的设备信息"""
+        info = self.device_info_by_ip.get(controller_c0_ip)
+        if info is None:
+            info = self.device_info_by_ip.get(controller_c1_ip)
+        return info
+    
+    def hosts_for(self, sfa_name):
+        return self.hosts_by_sfa.get(sfa_name, [])
+
+def build_cluster_record(index, cluster_name, total_capacity, network_description=None,
+                         network_port_types=None, customer_name=None):
+    """从索引构建集群、设备和主机记录"""
+    toml_data = index.toml_data
+    devices = []
+    
+    for sfa_name, sfa_info in toml_data.get("sfa", {}).items():
+        # 获取设备控制器IP地址
+        controllers = sfa_info.get("controllers") or []
+        controller_c0_ip = controllers[0] if len(controllers) > 0 else None
+        controller_c1_ip = controllers[1] if len(controllers) > 1 else None
+        
+        # 收集属于当前设备的主机
+        hosts = []
+        for host_name, host_info in index.hosts_for(sfa_name):
+            nic_info = host_info.get("nic", {})
+            hosts.append(HostRecord(
+                host_name,
+                "MDS/OSS",
+                nic_info.get("mgmt0", {}).get("ip"),
+                extract_lnet_networks(nic_info)
+            ))
+        
+        devices.append(DeviceRecord(
+            sfa_name,
+            controller_c0_ip,
+            controller_c1_ip,
+            index.device_info_for(controller_c0_ip, controller_c1_ip),
+            hosts
+        ))
+    
+    return ClusterRecord(
+        cluster_name,
+        toml_data.get("version"),
+        total_capacity,
+        network_description,
+        network_port_types,
+        toml_data.get("EMF", {}).get("ip"),
+        customer_name,
+        devices
+    )
+
+def load_toml_config(toml_source):
+    """
+    加载EXAScaler配置
+    toml_source 可以是TOML文件路径，也可以是已解析的配置字典（如由exascaler.conf在内存中转换得到）
+    """
+    if isinstance(toml_source, dict):
+        return toml_source
+    with open(toml_source, 'r') as f:
+        return toml.load(f)
+
+def _is_missing(value):
+    return value is None or value == AUTO_DETECT_FAILED
+
+def generate_cluster_yaml(toml_path, cluster_name, sfainfo_paths=None, output_path="generated_clusters.yaml",
+                          customer_name=None, diagnostics=None):
+    """
+    生成集群YAML文件，返回记录了生成过程信息、空缺字段和各阶段耗时（stats）的 Diagnostics
+    diagnostics 为空时只收集警告及以上级别的信息，不输出
+    """
+    if diagnostics is None:
+        diagnostics = Diagnostics()
+    stats = diagnostics.stats
+    
+    # 读取TOML配置（文件路径或已解析的配置字典）
+    with stats.stage('toml_load') as stage:
+        if not isinstance(toml_path, dict):
+            stage['bytes'] = os.path.getsize(toml_path)
+        toml_data = load_toml_config(toml_path)
     
     # 从所有sfainfo文件提取设备信息
     device_info_map = {}
@@ -393,196 +623,103 @@ def generate_cluster_yaml(toml_path, cluster_name, sfainfo_paths=None, output_pa
     network_port_types = None
     
     if sfainfo_paths:
-        print("\n提取设备信息:")
+        diagnostics.info("\n提取设备信息:")
         for sfainfo_file in sfainfo_paths:
-            device_info = extract_device_info_from_sfainfo(sfainfo_file)
+            device_info = extract_device_info_from_sfainfo(sfainfo_file, diagnostics)
             
             # 从文件名提取IP地址作为设备标识
-            ip_match = re.search(r'(\d+\.\d+\.\d+\.\d+)', os.path.basename(sfainfo_file))
-            if ip_match:
-                device_ip = ip_match.group(1)
+            device_ip = extract_device_ip(sfainfo_file)
+            if device_ip:
                 device_info_map[device_ip] = device_info
                 total_cluster_capacity += device_info['capacity']
+            else:
+                diagnostics.warning("文件名中未找到控制器IP，已忽略: %s", sfainfo_file)
         
         # 提取网络信息
-        print()
-        network_description, network_port_types = extract_network_info_from_sfainfo_files(sfainfo_paths)
-    
-    print(f"\n集群总容量: {total_cluster_capacity} 字节 ({format_capacity(total_cluster_capacity)})")
-    
-    # 构建集群基础信息
-    cluster = {
-        "Cluster_name": cluster_name,  # 由参数传入
-        "EXA version": toml_data.get("version") or "自动获取失败",
-        "Capacity": format_capacity(total_cluster_capacity) if total_cluster_capacity > 0 else "自动获取失败",  # 从 sfainfo 压缩包计算得出
-        "Network_Description": network_description or "自动获取失败",  # 从sfainfo文件提取的Mellanox网络描述
-        "Network_port_type": network_port_types or "自动获取失败",  # 从sfainfo文件提取
-        "EMF_IP": toml_data.get("EMF", {}).get("ip") or "自动获取失败",
-        "Support_status": "待填入",
-        "Asset_owner": customer_name if customer_name else "待选择Customer",
-        "devices": []
-    }
+        diagnostics.info("")
+        network_description, network_port_types = extract_network_info_from_sfainfo_files(sfainfo_paths, diagnostics)
+    
+    if diagnostics.enabled_for(INFO):
+        diagnostics.info("\n集群总容量: %d 字节 (%s)", total_cluster_capacity, format_capacity(total_cluster_capacity))
+    
+    # 基于预先建立的索引构建集群模型，再由模型生成YAML数据
+    with stats.stage('host_assembly'):
+        index = ClusterIndex(toml_data, device_info_map)
+        cluster_record = build_cluster_record(
+            index, cluster_name, total_cluster_capacity,
+            network_description, network_port_types, customer_name
+        )
+        cluster = cluster_record.to_dict()
     
-    # 记录集群级空缺字段
+    # 记录集群级空缺字段（值为None或"自动获取失败"）
     for key, value in cluster.items():
-        if value is None and key != "devices":
-            missing_fields["cluster_level"].append(key)
+        if key != "devices" and _is_missing(value):
+            diagnostics.missing("cluster_level", key)
     
-    # 处理每个SFA设备
-    for sfa_name, sfa_info in toml_data.get("sfa", {}).items():        
-        # 获取设备控制器IP地址
-        controller_c0_ip = sfa_info.get("controllers", [None])[0]
-        controller_c1_ip = sfa_info.get("controllers", [None, None])[1]
-        
-        # 查找对应的设备信息（通过IP地址匹配）
-        device_info = None
-        for ip, info in device_info_map.items():
-            if ip == controller_c0_ip or ip == controller_c1_ip:
-                device_info = info
-                break
-        
-        # 构建设备信息，优先使用从sfainfo提取的信息
-        device = {
-            "Device_name": sfa_name,
-            "type": device_info['type'] if device_info and device_info['type'] else "自动获取失败",
-            "SFA version": device_info['sfa_version'] if device_info and device_info['sfa_version'] else "自动获取失败",
-            "Capacity": format_capacity(device_info['capacity']) if device_info and device_info['capacity'] > 0 else "自动获取失败",
-            "Controller_c0_ip": controller_c0_ip or "自动获取失败",
-            "Controller_c1_ip": controller_c1_ip or "自动获取失败",
-            "Controller_c0_serial_number": device_info['controller_c0_serial'] if device_info and device_info['controller_c0_serial'] else "自动获取失败",
-            "Controller_c1_serial_number": device_info['controller_c1_serial'] if device_info and device_info['controller_c1_serial'] else "自动获取失败",
-            "BBU1_Expired_Date": device_info['bbu1_expired_date'] if device_info and device_info['bbu1_expired_date'] else "自动获取失败",
-            "BBU2_Expired_Date": device_info['bbu2_expired_date'] if device_info and device_info['bbu2_expired_date'] else "自动获取失败",
-            "Hosts": []
-        }
+    controller_fields = (
+        ("Controller_c0_ip", "Controller_c0_serial_number"),
+        ("Controller_c1_ip", "Controller_c1_serial_number"),
+    )
+    for device in cluster["devices"]:
+        sfa_name = device["Device_name"]
         
-        # 记录设备级空缺字段
+        # 记录设备级空缺字段（控制器字段单独统计）
         for key, value in device.items():
-            if value is None and key not in ["Hosts", "Controller_c0_ip", "Controller_c1_ip"]:
-                missing_fields["device_level"].append(f"{sfa_name}:{key}")
+            if key in ("Hosts", "Controller_c0_ip", "Controller_c1_ip",
+                       "Controller_c0_serial_number", "Controller_c1_serial_number"):
+                continue
+            if _is_missing(value):
+                diagnostics.missing("device_level", f"{sfa_name}:{key}")
         
         # 记录控制器级空缺字段
-        if device["Controller_c0_ip"] is not None:
-            missing_fields["controller_level"].append(f"{sfa_name}:Controller_c0_serial_number")
-        if device["Controller_c1_ip"] is not None:
-            missing_fields["controller_level"].append(f"{sfa_name}:Controller_c1_serial_number")
-        
-        # 收集属于当前设备的主机
-        for host_name, host_info in toml_data.get("host", {}).items():
-            if host_info.get("sfa") == sfa_name:
-                nic_info = host_info.get("nic", {})
-                
-                # 动态检测所有mlx*接口并生成lnet网络地址
-                lnet_networks = []
-                
-                # 收集所有mlx接口（mlxib*, mlxen*）
-                mlx_interfaces = {}
-                for nic_name, nic_config in nic_info.items():
-                    if nic_name.startswith(('mlxib', 'mlxen')) and nic_config.get('ip'):
-                        mlx_interfaces[nic_name] = nic_config['ip']
-                
-                # 自定义排序：InfiniBand接口优先，然后按编号排序
-                def sort_mlx_interfaces(nic_name):
-                    if nic_name.startswith('mlxib'):
-                        # InfiniBand接口优先级高，编号前加0前缀
-                        interface_num = nic_name.replace('mlxib', '')
-                        return (0, int(interface_num) if interface_num.isdigit() else 0)
-                    elif nic_name.startswith('mlxen'):
-                        # 以太网接口优先级低，编号前加1前缀
-                        interface_num = nic_name.replace('mlxen', '')
-                        return (1, int(interface_num) if interface_num.isdigit() else 0)
-                    return (2, 0)  # 其他接口
-                
-                # 按自定义规则排序
-                for nic_name in sorted(mlx_interfaces.keys(), key=sort_mlx_interfaces):
-                    ip_addr = mlx_interfaces[nic_name]
-                    
-                    # 根据接口类型确定协议
-                    if nic_name.startswith('mlxib'):
-                        # InfiniBand接口: mlxib0 -> @o2ib0, mlxib1 -> @o2ib1
-                        interface_num = nic_name.replace('mlxib', '')
-                        protocol = f"@o2ib{interface_num}"
-                    elif nic_name.startswith('mlxen'):
-                        # 以太网接口: mlxen0 -> @tcp0, mlxen1 -> @tcp1
-                        interface_num = nic_name.replace('mlxen', '')
-                        protocol = f"@tcp{interface_num}"
-                    
-                    lnet_networks.append(f"{ip_addr}{protocol}")
-                
-                # 构建IP配置，支持多个lnet网络
-                ip_config = {
-                    "management": nic_info.get("mgmt0", {}).get("ip"),
-                    "lnet1_network": lnet_networks[0] if len(lnet_networks) > 0 else None,
-                    "lnet2_network": lnet_networks[1] if len(lnet_networks) > 1 else None
-                }
-                
-                # 如果有更多lnet网络，可以扩展（未来可能需要）
-                # for i, lnet_addr in enumerate(lnet_networks[2:], start=3):
-                #     ip_config[f"lnet{i}_network"] = lnet_addr
-                
-                host = {
-                    "hostname": host_name,
-                    "role": "MDS/OSS",
-                    "ip": ip_config
-                }
-                device["Hosts"].append(host)
-        
-        cluster["devices"].append(device)
+        for ip_key, serial_key in controller_fields:
+            if _is_missing(device[ip_key]):
+                diagnostics.missing("controller_level", f"{sfa_name}:{ip_key}")
+            elif _is_missing(device[serial_key]):
+                diagnostics.missing("controller_level", f"{sfa_name}:{serial_key}")
     
 
-    # 生成YAML文件，确保正确缩进
-    with open(output_path, 'w', encoding='utf-8') as f:
-        # 创建自定义Dumper以确保正确的缩进
-        class IndentedDumper(yaml.Dumper):
-            def increase_indent(self, flow=False, indentless=False):
-                return super(IndentedDumper, self).increase_indent(flow, False)
-        
-        # 构建顶层数据结构
-        output_data = {"clusters": [cluster]}
-        
-        # 处理客户名信息
-        if customer_name:
-            # 优先使用传入的客户名
-            output_data["customer"] = customer_name
-            print(f"使用传入的客户名: {customer_name}")
-        else:
-            # 如果没有传入客户名，尝试从原始文件读取
-            try:
-                # 读取之前我们需要检查文件是否存在，这样才能处理第一次生成的情况
-                if os.path.exists(output_path):
-                    with open(output_path, 'r', encoding='utf-8') as orig_file:
-                        orig_data = yaml.safe_load(orig_file)
-                        if orig_data and 'customer' in orig_data:
-                            output_data["customer"] = orig_data["customer"]
-                            print(f"从原始YAML文件中保留客户名: {orig_data['customer']}")
-            except Exception as e:
-                print(f"读取原始客户名失败: {str(e)}")
-        
-        # 检查最终是否有客户名
-        if "customer" not in output_data:
-            print("警告: 未能获取客户名，生成的YAML将不包含客户信息")
-        
-        # dump时使用自定义Dumper并设置缩进
-        yaml.dump(
+    # 构建顶层数据结构
+    output_data = {"clusters": [cluster]}
+    
+    # 处理客户名信息
+    if customer_name:
+        # 优先使用传入的客户名
+        output_data["customer"] = customer_name
+        diagnostics.info("使用传入的客户名: %s", customer_name)
+    else:
+        # 如果没有传入客户名，尝试从原始文件读取（须在写入前读取，写入会清空原文件）
+        try:
+            if os.path.exists(output_path):
+                orig_data = yaml_codec.load_file(output_path, sidecar=True)
+                if orig_data and 'customer' in orig_data:
+                    output_data["customer"] = orig_data["customer"]
+                    diagnostics.info("从原始YAML文件中保留客户名: %s", orig_data['customer'])
+        except Exception as e:
+            diagnostics.warning("读取原始客户名失败: %s", e)
+    
+    # 检查最终是否有客户名
+    if "customer" not in output_data:
+        diagnostics.warning("警告: 未能获取客户名，生成的YAML将不包含客户信息")
+    
+    # 生成YAML文件，列表相对父键缩进
+    with stats.stage('yaml_dump') as stage:
+        yaml_codec.dump_file(
             output_data,
-            f,
-            Dumper=IndentedDumper,
+            output_path,
+            indented=True,
+            sidecar=True,
             sort_keys=False,
             default_flow_style=False,
             allow_unicode=True,
             indent=2,
             width=1000  # 增加宽度限制避免不必要的换行
         )
+        stage['bytes'] = os.path.getsize(output_path)
+    stats.finish()
     
-    # 打印空缺值说明
-    print(f"\n已生成YAML文件: {output_path}")
-    print("\n以下字段未从TOML中获取到，需后续手工补充：")
-    if missing_fields["cluster_level"]:
-        print(f"1. 集群级字段: {', '.join(missing_fields['cluster_level'])}")
-    if missing_fields["device_level"]:
-        print(f"2. 设备级字段: {', '.join(missing_fields['device_level'])}")
-    if missing_fields["controller_level"]:
-        print(f"3. 控制器级字段: {', '.join(missing_fields['controller_level'])}")
+    diagnostics.info("\n已生成YAML文件: %s", output_path)
+    return diagnostics
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="从exascaler.toml生成集群YAML配置")
@@ -590,7 +727,19 @@ if __name__ == "__main__":
     parser.add_argument("--cluster-name", required=True, help="集群名称（System name）")
     parser.add_argument("--sfainfo", nargs="*", help="sfainfo.tar.gz文件路径（支持多个）")
     parser.add_argument("-o", "--output", help="输出YAML文件路径", default="generated_clusters.yaml")
+    parser.add_argument("-q", "--quiet", action="store_true", help="只输出警告和空缺字段说明")
+    parser.add_argument("--stats", action="store_true", help="输出各阶段的耗时和字节数")
     args = parser.parse_args()
     
-    generate_cluster_yaml(args.toml_file, args.cluster_name, args.sfainfo, args.output)
+    # 命令行默认逐条输出全部诊断信息
+    diagnostics = Diagnostics(level=WARNING if args.quiet else DEBUG, echo=True)
+    generate_cluster_yaml(args.toml_file, args.cluster_name, args.sfainfo, args.output,
+                          diagnostics=diagnostics)
+    
+    # 打印空缺值说明
+    print()
+    print(diagnostics.render_missing())
+    if args.stats:
+        print()
+        print(diagnostics.stats.render())
 
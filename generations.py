@@ -0,0 +1,204 @@
+"""
+跨进程的数据代数（generation）表
+
+各 gunicorn 工作进程的缓存以数据文件版本（修改时间和大小）为键，原来每个请求都要 stat 全部
+数据库文件和YAML文件才能得到版本。本模块在共享的内存映射文件中维护一组计数器，按文件路径的哈希
+分配槽（数据库文件、各系统的YAML文件各有一个；0号槽保留），哈希冲突只会导致多余的刷新。
+写入方（save_json_db、yaml_codec.dump_file 等）写完文件后调用 bump(路径)，只有这些文件的计数器加一，
+写访问日志等不影响其他文件的版本；
+读取方调用 files_version(路径列表)：各文件的代数都未变化且距上次 stat 未超过 max_age 秒时直接返回
+上次的版本，只需读内存中的计数器，不访问文件系统。max_age 用于发现绕过本应用的修改（如手工编辑YAML）。
+
+加一在进程内由线程锁、进程间由文件锁（flock）保护。flock 属于打开的文件描述，fork 出的子进程
+（如 gunicorn --preload 的工作进程）共享父进程的描述时互相不排斥，因此在子进程中重新打开文件。
+
+表文件默认为 data/db/generations.bin（DCAM_GENERATION_FILE 可修改），所有进程（应用、导入守护进程、
+批量重新处理脚本）使用同一文件；无法创建或映射时自动退化为每次 stat。
+"""
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+import query_cache
+
+MAGIC = b'DCAMGEN1'
+SLOTS = 4096
+_HEADER = struct.Struct('<8sI4x')
+_COUNTER = struct.Struct('<Q')
+FILE_SIZE = _HEADER.size + SLOTS * _COUNTER.size
+
+DEFAULT_PATH = os.environ.get('DCAM_GENERATION_FILE') or \
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'db', 'generations.bin')
+
+# 代数未变化时复用版本的最长时间（秒），设为0时每次都 stat
+DEFAULT_MAX_AGE = float(os.environ.get('DCAM_VERSION_MAX_AGE', 5))
+
+_slots = {}  # 路径 -> 槽号
+
+
+def _slot(path):
+    slot = _slots.get(path)
+    if slot is None:
+        slot = _slots[path] = 1 + zlib.crc32(os.path.abspath(path).encode('utf-8')) % (SLOTS - 1)
+    return slot
+
+
+class GenerationTable:
+    """内存映射的计数器表"""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size < FILE_SIZE:
+                os.ftruncate(self._fd, FILE_SIZE)
+                os.pwrite(self._fd, _HEADER.pack(MAGIC, SLOTS), 0)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._fd, FILE_SIZE, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        magic, slots = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or slots != SLOTS:
+            raise ValueError(f"代数表格式不匹配: {path}")
+
+    def reopen(self):
+        """fork 后在子进程中调用：换用自己的文件描述，flock 才能与父进程和其他子进程互斥（映射沿用）"""
+        os.close(self._fd)
+        self._fd = os.open(self.path, os.O_RDWR)
+        self._lock = threading.Lock()
+
+    def get(self, slot):
+        return _COUNTER.unpack_from(self._map, _HEADER.size + slot * _COUNTER.size)[0]
+
+    def bump(self, slots):
+        """各槽加一；线程锁和本进程自己的文件描述上的 flock 保证多线程、多进程的加一不丢失"""
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                for slot in set(slots):
+                    offset = _HEADER.size + slot * _COUNTER.size
+                    _COUNTER.pack_into(self._map, offset, _COUNTER.unpack_from(self._map, offset)[0] + 1)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+
+_table = None
+_table_failed = False
+_table_lock = threading.Lock()
+_versions = {}  # 路径元组 -> (代数, stat时间, 版本)
+
+
+def get_table():
+    """进程内共享的代数表（共享映射，fork出的子进程可以直接使用）；不可用时返回 None"""
+    global _table, _table_failed
+    if _table is None and not _table_failed:
+        with _table_lock:
+            if _table is None and not _table_failed:
+                try:
+                    _table = GenerationTable(DEFAULT_PATH)
+                except (OSError, ValueError) as e:
+                    _table_failed = True
+                    print(f"[代数表] 无法使用 {DEFAULT_PATH}，改为每次检查文件: {str(e)}")
+    return _table
+
+
+_listeners = []
+
+
+def add_listener(callback):
+    """注册写入回调，本进程每次 bump 后以路径元组调用（如写入后在请求结束前重建派生数据）"""
+    _listeners.append(callback)
+
+
+def bump(*paths):
+    """写入文件后调用，使所有进程中依赖这些文件的缓存失效"""
+    table = get_table()
+    if table is not None:
+        table.bump([_slot(path) for path in paths if path])
+    for callback in _listeners:
+        callback(paths)
+
+
+def current(paths):
+    """各文件的代数（只读共享内存，不访问文件系统）"""
+    table = get_table()
+    if table is None:
+        return None
+    return tuple(table.get(_slot(path)) if path else 0 for path in paths)
+
+
+def files_version(paths, max_age=None):
+    """
+    与 query_cache.files_version 相同的 ((路径, (修改时间, 大小)), ...) 版本，
+    代数未变化且距上次 stat 未超过 max_age 秒时直接返回上次的结果
+    """
+    paths = tuple(paths)
+    max_age = DEFAULT_MAX_AGE if max_age is None else max_age
+    generation = current(paths) if max_age > 0 else None
+    if generation is None:
+        return query_cache.files_version(paths)
+
+    now = time.monotonic()
+    cached = _versions.get(paths)
+    if cached is not None and cached[0] == generation and now - cached[1] < max_age:
+        return cached[2]
+    version = query_cache.files_version(paths)
+    # 限制缓存的路径组合数（键通常只有少数几种）
+    if len(_versions) > 1024:
+        _versions.clear()
+    _versions[paths] = (generation, now, version)
+    return version
+
+
+def _reopen_in_child():
+    if _table is not None:
+        _table.reopen()
+
+
+os.register_at_fork(after_in_child=_reopen_in_child)
+
+
+def check_forked_writers(writers=4, bumps=20000):
+    """
+    在本进程打开代数表后 fork 多个写入进程（与 gunicorn 预加载相同），各自对同一个槽加一 bumps 次，
+    返回 (期望值, 实际值)
+    """
+    table = get_table()
+    slot = _slot(DEFAULT_PATH)
+    expected = table.get(slot) + writers * bumps
+    pids = []
+    for _ in range(writers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                for _ in range(bumps):
+                    get_table().bump([slot])
+            finally:
+                os._exit(0)
+        pids.append(pid)
+    for pid in pids:
+        os.waitpid(pid, 0)
+    return expected, table.get(slot)
+
+
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="检查 fork 出的多个写入进程同时加一时计数是否丢失")
+    parser.add_argument("--writers", type=int, default=4, help="写入进程数")
+    parser.add_argument("--bumps", type=int, default=20000, help="每个进程加一的次数")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        DEFAULT_PATH = os.path.join(temp_dir, 'generations.bin')
+        expected, actual = check_forked_writers(args.writers, args.bumps)
+    print(f"期望: {expected}, 实际: {actual}, {'通过' if expected == actual else '有丢失的加一'}")
@@ -0,0 +1,27 @@
+"""
+gunicorn 配置：预加载应用，主进程在fork工作进程前预热缓存
+
+    DCAM_ENV=production gunicorn -c gunicorn.conf.py app:app
+
+主进程导入应用后，每次fork工作进程（启动、max_requests 回收或工作进程异常退出后重启）之前调用
+app.warm_caches()：数据未变化时只检查文件版本，变化时在主进程中重建，新工作进程继承的总是最新的缓存。
+预热后调用 gc.freeze()，把这些对象移出垃圾回收的扫描范围，避免回收时写入而破坏写时复制共享的内存页。
+"""
+import gc
+import os
+
+bind = os.environ.get('DCAM_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('DCAM_WORKERS', 4))
+# 工作进程处理一定数量的请求后重启（加随机抖动避免同时重启），限制内存增长
+max_requests = int(os.environ.get('DCAM_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('DCAM_MAX_REQUESTS_JITTER', 100))
+preload_app = os.environ.get('DCAM_PRELOAD', '1').lower() not in ('0', 'false', 'no', 'off')
+
+
+def pre_fork(server, worker):
+    if not server.cfg.preload_app:
+        return
+    import app
+    timings = app.warm_caches()
+    gc.freeze()
+    server.log.info("缓存预热完成: %s", ', '.join(f"{name} {seconds * 1000:.1f}ms" for name, seconds in timings.items()))
@@ -0,0 +1,338 @@
+import argparse
+import fnmatch
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from generate_cluster_yaml import generate_cluster_yaml, extract_device_ip
+from reprocess_uploads import find_latest_archive
+
+# 投递目录中的清单文件，格式:
+# {
+#   "files": {"sfainfo_site_a_*.tar.gz": "<system_id>", "site_a.toml": "<system_id>"},
+#   "ips": {"10.1.0.1": "<system_id>"}
+# }
+MANIFEST_NAME = 'manifest.json'
+BUNDLE_SUFFIXES = ('.tar.gz', '.tgz')
+CONFIG_SUFFIXES = ('.toml', '.conf')
+# 采集脚本写入过程中使用的临时文件名
+PARTIAL_SUFFIXES = ('.part', '.tmp', '.partial', '.filepart')
+
+DEFAULT_DROP_DIR = os.environ.get('DCAM_DROP_DIR') or os.path.join('data', 'dropbox')
+
+
+class DropFolderWatcher:
+    """轮询投递目录，识别已写完的文件并按系统分组"""
+
+    def __init__(self, drop_dir, settle_seconds=30, require_stable_poll=True):
+        self.drop_dir = drop_dir
+        self.settle_seconds = settle_seconds
+        self.require_stable_poll = require_stable_poll
+        # 文件路径 -> (大小, 修改时间)，用于判断两次轮询之间文件是否仍在写入
+        self._observed = {}
+        self._warned = set()
+
+    def scan_ready_files(self):
+        """
+        返回已写完的文件列表（防抖）：
+        修改时间距今超过 settle_seconds，且与上一轮轮询相比大小和修改时间均未变化
+        """
+        now = time.time()
+        seen = {}
+        ready = []
+
+        for entry in os.scandir(self.drop_dir):
+            if not entry.is_file() or entry.name.startswith('.'):
+                continue
+            name = entry.name.lower()
+            if name.endswith(PARTIAL_SUFFIXES) or name == MANIFEST_NAME:
+                continue
+            if not name.endswith(BUNDLE_SUFFIXES + CONFIG_SUFFIXES):
+                continue
+
+            stat = entry.stat()
+            state = (stat.st_size, stat.st_mtime_ns)
+            seen[entry.path] = state
+
+            if stat.st_size == 0 or now - stat.st_mtime < self.settle_seconds:
+                continue
+            if self.require_stable_poll and self._observed.get(entry.path) != state:
+                continue
+            ready.append(entry.path)
+
+        self._observed = seen
+        return ready
+
+    def forget(self, path):
+        self._observed.pop(path, None)
+        self._warned.discard(path)
+
+    def warn_once(self, path, message):
+        if path not in self._warned:
+            self._warned.add(path)
+            print(f"[警告] {message}")
+
+
+def load_manifest(drop_dir):
+    """加载投递目录中的清单文件，不存在或格式错误时返回空清单"""
+    manifest_path = os.path.join(drop_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return {'files': {}, 'ips': {}}
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        return {'files': manifest.get('files', {}), 'ips': manifest.get('ips', {})}
+    except Exception as e:
+        print(f"[警告] 读取清单文件失败: {manifest_path} - {str(e)}")
+        return {'files': {}, 'ips': {}}
+
+
+def build_controller_ip_map(systems):
+    """从各系统的YAML中建立 控制器IP -> 系统ID 的映射"""
+    import asset_analyze
+
+    ip_map = {}
+    for system_id, system in systems.items():
+        yaml_file = system.get('yaml_file')
+        if not yaml_file or not os.path.exists(yaml_file):
+            continue
+        try:
+            for cluster in asset_analyze.load_yaml_data(yaml_file):
+                for device in cluster.get('devices', []):
+                    for key in ('Controller_c0_ip', 'Controller_c1_ip'):
+                        ip = device.get(key)
+                        if ip:
+                            ip_map[str(ip)] = system_id
+        except Exception as e:
+            print(f"[警告] 读取系统 {system_id} 的YAML失败: {str(e)}")
+    return ip_map
+
+
+def resolve_system(path, manifest, ip_map):
+    """确定文件所属系统：优先使用清单中的文件名规则，其次按文件名中的控制器IP匹配"""
+    filename = os.path.basename(path)
+    for pattern, system_id in manifest['files'].items():
+        if fnmatch.fnmatch(filename, pattern):
+            return str(system_id)
+
+    device_ip = extract_device_ip(path)
+    if device_ip:
+        if device_ip in manifest['ips']:
+            return str(manifest['ips'][device_ip])
+        return ip_map.get(device_ip)
+    return None
+
+
+def ingest_system(batch):
+    """
+    将同一系统的所有新文件合并为一次 generate_cluster_yaml 运行（在工作进程中执行）
+    本次未投递的设备沿用最近一次归档中的sfainfo文件，保证YAML覆盖全部设备
+    """
+    result = {'system_id': batch['system_id'], 'files': batch['bundles'] + batch['configs']}
+
+    try:
+        uploads_dir = batch['uploads_dir']
+        archive = find_latest_archive(uploads_dir)
+
+        # 确定TOML配置：本次投递的配置优先，否则使用最近归档的TOML
+        # .conf 在内存中解析为配置字典，只在归档时写出一次TOML
+        config_data = None
+        if batch['configs']:
+            toml_path = sorted(batch['configs'])[-1]
+            if toml_path.lower().endswith('.conf'):
+                from app import parse_conf_to_dict
+                config_data = parse_conf_to_dict(toml_path)
+                if config_data is None:
+                    raise ValueError(f"配置文件转换失败: {toml_path}")
+        elif archive:
+            toml_path = archive[1]
+        else:
+            raise ValueError('没有投递TOML配置，且系统没有历史归档可用')
+
+        # 合并sfainfo文件：新投递的文件覆盖同一控制器IP的历史归档
+        bundles_by_ip = {}
+        unnamed_bundles = []
+        if archive:
+            for path in archive[2]:
+                device_ip = extract_device_ip(path)
+                if device_ip:
+                    bundles_by_ip[device_ip] = path
+        for path in sorted(batch['bundles']):
+            device_ip = extract_device_ip(path)
+            if device_ip:
+                bundles_by_ip[device_ip] = path
+            else:
+                unnamed_bundles.append(path)
+        sfa_paths = list(bundles_by_ip.values()) + unnamed_bundles
+
+        yaml_file = batch['yaml_file']
+        os.makedirs(os.path.dirname(yaml_file) or '.', exist_ok=True)
+        if os.path.exists(yaml_file):
+            backup_path = f"{yaml_file}.bak.{datetime.now().strftime('%Y%m%d%H%M%S')}"
+            shutil.copy2(yaml_file, backup_path)
+
+        toml_source = config_data if config_data is not None else toml_path
+        diagnostics = generate_cluster_yaml(toml_source, batch['cluster_name'], sfa_paths, yaml_file,
+                                            batch['customer_name'])
+
+        # 按 import_config 的命名规则归档本次使用的完整文件集
+        os.makedirs(uploads_dir, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        toml_filename = os.path.basename(toml_path)
+        if archive and toml_path == archive[1]:
+            toml_filename = toml_filename.split('_', 2)[-1]
+        # YAML已经生成，归档失败时仍按已导入处理，只在结果中说明
+        messages = []
+        try:
+            with diagnostics.stats.stage('archive_copy') as stage:
+                if config_data is not None:
+                    from app import write_toml_file
+                    toml_filename = toml_filename.rsplit('.', 1)[0] + '.toml'
+                    write_toml_file(config_data, os.path.join(uploads_dir, f"{timestamp}_{toml_filename}"))
+                else:
+                    shutil.copy2(toml_path, os.path.join(uploads_dir, f"{timestamp}_{toml_filename}"))
+                for i, sfa_path in enumerate(sfa_paths):
+                    sfa_filename = os.path.basename(sfa_path)
+                    # 历史归档文件去掉原有的时间戳和序号前缀
+                    if archive and sfa_path in archive[2]:
+                        sfa_filename = sfa_filename.split('_', 3)[-1]
+                    shutil.copy2(sfa_path, os.path.join(uploads_dir, f"{timestamp}_{i+1}_{sfa_filename}"))
+                stage['bytes'] = sum(os.path.getsize(path) for path in sfa_paths)
+        except Exception as e:
+            messages.append(f"归档失败: {str(e)}")
+
+        result['status'] = 'imported'
+        result['device_count'] = len(sfa_paths)
+        result['import_stats'] = diagnostics.stats.save(yaml_file)
+        if diagnostics.has_missing:
+            messages.append(f"未能自动获取: {diagnostics.missing_summary()}")
+        if messages:
+            result['message'] = '; '.join(messages)
+        return result
+    except Exception as e:
+        result['status'] = 'failed'
+        result['message'] = str(e)
+        return result
+
+
+def move_processed(paths, drop_dir, status):
+    """将处理完的投递文件移入 processed/ 或 failed/ 子目录"""
+    target_dir = os.path.join(drop_dir, 'processed' if status == 'imported' else 'failed')
+    os.makedirs(target_dir, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    for path in paths:
+        if os.path.exists(path):
+            shutil.move(path, os.path.join(target_dir, f"{timestamp}_{os.path.basename(path)}"))
+
+
+def run_cycle(watcher, max_workers=2):
+    """执行一轮扫描和导入，返回各系统的处理结果"""
+    from app import get_systems, get_system_uploads_dir, save_json_db, SYSTEMS_DB
+
+    ready = watcher.scan_ready_files()
+    if not ready:
+        return []
+
+    systems = get_systems()
+    manifest = load_manifest(watcher.drop_dir)
+    ip_map = build_controller_ip_map(systems)
+
+    # 按系统分组
+    batches = {}
+    for path in ready:
+        system_id = resolve_system(path, manifest, ip_map)
+        if not system_id or system_id not in systems:
+            watcher.warn_once(path, f"无法确定文件所属系统，请在 {MANIFEST_NAME} 中指定: {path}")
+            continue
+        system = systems[system_id]
+        if system.get('archived', False):
+            watcher.warn_once(path, f"系统 {system_id} 已归档，跳过文件: {path}")
+            continue
+
+        batch = batches.get(system_id)
+        if batch is None:
+            customer_name = system.get('customer_name')
+            batch = batches[system_id] = {
+                'system_id': system_id,
+                'bundles': [],
+                'configs': [],
+                'yaml_file': system.get('yaml_file') or
+                    f"data/customers/{customer_name}/{system['name']}/{system['name']}_clusters.yaml",
+                'uploads_dir': get_system_uploads_dir(customer_name, system['name']),
+                'cluster_name': system.get('cluster_name') or system['name'],
+                'customer_name': customer_name
+            }
+        if path.lower().endswith(CONFIG_SUFFIXES):
+            batch['configs'].append(path)
+        else:
+            batch['bundles'].append(path)
+
+    # 只有配置文件没有sfainfo的系统等待后续投递
+    batches = {sid: b for sid, b in batches.items() if b['bundles']}
+    if not batches:
+        return []
+
+    print(f"[{datetime.now().isoformat()}] 开始导入 {len(batches)} 个系统")
+    results = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(ingest_system, batch) for batch in batches.values()]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            message = f" - {result['message']}" if result.get('message') else ''
+            print(f"[{result['status']}] 系统 {result['system_id']}: {len(result['files'])} 个文件{message}")
+            move_processed(result['files'], watcher.drop_dir, result['status'])
+            for path in result['files']:
+                watcher.forget(path)
+
+    # 统一更新系统状态（只在主进程写数据库）
+    imported = [r for r in results if r['status'] == 'imported']
+    if imported:
+        systems = get_systems()
+        now = datetime.now().isoformat()
+        for result in imported:
+            system = systems.get(result['system_id'])
+            if system is None:
+                continue
+            batch = batches[result['system_id']]
+            system['status'] = 'imported'
+            system['yaml_file'] = batch['yaml_file']
+            system['cluster_name'] = batch['cluster_name']
+            system['imported_at'] = now
+            system['ingested_at'] = now
+            system['import_stats'] = result['import_stats']
+        save_json_db(SYSTEMS_DB, systems)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="监视投递目录，自动批量导入sfainfo日志")
+    parser.add_argument("--drop-dir", default=DEFAULT_DROP_DIR, help="投递目录（默认 $DCAM_DROP_DIR 或 data/dropbox）")
+    parser.add_argument("--interval", type=float, default=10, help="轮询间隔秒数")
+    parser.add_argument("--settle", type=float, default=30, help="文件大小保持不变多少秒后才视为写入完成")
+    parser.add_argument("--max-workers", type=int, default=2, help="同时导入的系统数上限")
+    parser.add_argument("--once", action="store_true", help="只执行一轮（适合cron调用）")
+    args = parser.parse_args()
+
+    os.makedirs(args.drop_dir, exist_ok=True)
+    # 单次模式没有上一轮轮询可比较，只按修改时间判断
+    watcher = DropFolderWatcher(args.drop_dir, args.settle, require_stable_poll=not args.once)
+    print(f"监视投递目录: {os.path.abspath(args.drop_dir)}")
+
+    if args.once:
+        run_cycle(watcher, args.max_workers)
+        return
+
+    while True:
+        try:
+            run_cycle(watcher, args.max_workers)
+        except Exception as e:
+            print(f"[错误] 导入轮次失败: {str(e)}")
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+客户/系统列表页的索引
+
+列表页按页渲染，排序和筛选在服务端完成：
+  - 每个数据版本只建立一次索引：各排序键的有序列表、小写的搜索文本、按客户分组的系统
+    以及每个客户的系统数和设备数
+  - 翻页时只需按筛选条件遍历预先排好序的列表并切片，不再读取YAML或扫描全部系统
+索引与查询缓存使用相同的数据版本（数据库文件和YAML文件的修改时间和大小），数据变化后自动重建。
+"""
+import math
+import threading
+
+# 各列表支持的排序键（页面参数 -> 说明）
+SYSTEM_SORT_KEYS = {
+    'name': '系统名称',
+    'created_at': '创建日期',
+    'status': '状态',
+    'devices': 'SFA设备数量'
+}
+CUSTOMER_SORT_KEYS = {
+    'name': '客户名称',
+    'created_at': '创建时间',
+    'systems': '系统数量',
+    'devices': 'SFA设备数量'
+}
+
+# 系统状态筛选
+SYSTEM_STATUS_FILTERS = {
+    'active': '活跃',
+    'archived': '已归档'
+}
+
+
+def _text_key(value):
+    return str(value).lower() if value is not None else ''
+
+
+def _search_text(record, fields):
+    return '\n'.join(_text_key(record.get(field)) for field in fields if record.get(field))
+
+
+class Page:
+    """一页列表数据，items 为 [(ID, 记录), ...]"""
+
+    def __init__(self, items, page, per_page, total):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+        self.pages = max(1, math.ceil(total / per_page))
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    @property
+    def has_next(self):
+        return self.page < self.pages
+
+    @property
+    def first_index(self):
+        """本页第一条记录的序号（从1开始），空页为0"""
+        return (self.page - 1) * self.per_page + 1 if self.items else 0
+
+
+def _paginate(ids, records, page, per_page):
+    total = len(ids)
+    pages = max(1, math.ceil(total / per_page))
+    page = min(max(1, page), pages)
+    start = (page - 1) * per_page
+    items = [(record_id, records[record_id]) for record_id in ids[start:start + per_page]]
+    return Page(items, page, per_page, total)
+
+
+class ListingIndex:
+    """某一数据版本下客户和系统列表的排序/筛选索引"""
+
+    def __init__(self, systems, customers):
+        self.systems = systems
+        self.customers = customers
+
+        self.systems_count = {}
+        self.devices_count = {}
+        self.customer_systems = {}
+        for system_id, system in systems.items():
+            customer_id = system.get('customer_id')
+            if customer_id:
+                self.systems_count[customer_id] = self.systems_count.get(customer_id, 0) + 1
+                self.devices_count[customer_id] = (self.devices_count.get(customer_id, 0)
+                                                   + system.get('sfa_device_count', 0))
+                self.customer_systems.setdefault(customer_id, set()).add(system_id)
+
+        self.system_search = {
+            system_id: _search_text(system, ('name', 'customer_name', 'description'))
+            for system_id, system in systems.items()
+        }
+        self.customer_search = {
+            customer_id: _search_text(customer, ('name', 'contact', 'email', 'description'))
+            for customer_id, customer in customers.items()
+        }
+
+        # 各排序键的升序ID列表，名称相同时按ID排序保证顺序稳定
+        self.system_orders = {
+            'name': sorted(systems, key=lambda i: (_text_key(systems[i].get('name')), i)),
+            'created_at': sorted(systems, key=lambda i: (str(systems[i].get('created_at') or ''), i)),
+            'status': sorted(systems, key=lambda i: (bool(systems[i].get('archived')),
+                                                     str(systems[i].get('status') or ''), i)),
+            'devices': sorted(systems, key=lambda i: (systems[i].get('sfa_device_count', 0), i))
+        }
+        self.customer_orders = {
+            'name': sorted(customers, key=lambda i: (_text_key(customers[i].get('name')), i)),
+            'created_at': sorted(customers, key=lambda i: (str(customers[i].get('created_at') or ''), i)),
+            'systems': sorted(customers, key=lambda i: (self.systems_count.get(i, 0), i)),
+            'devices': sorted(customers, key=lambda i: (self.devices_count.get(i, 0), i))
+        }
+
+    def system_page(self, page=1, per_page=50, sort='name', descending=False,
+                    query=None, customer_id=None, status=None):
+        """按条件筛选、排序后的一页系统"""
+        order = self.system_orders.get(sort) or self.system_orders['name']
+        if descending:
+            order = order[::-1]
+
+        query = _text_key(query).strip() if query else None
+        members = self.customer_systems.get(customer_id, set()) if customer_id else None
+        archived = {'active': False, 'archived': True}.get(status)
+
+        if query or members is not None or archived is not None:
+            order = [
+                system_id for system_id in order
+                if (members is None or system_id in members)
+                and (archived is None or bool(self.systems[system_id].get('archived')) == archived)
+                and (not query or query in self.system_search[system_id])
+            ]
+        return _paginate(order, self.systems, page, per_page)
+
+    def customer_page(self, page=1, per_page=50, sort='name', descending=False, query=None):
+        """按条件筛选、排序后的一页客户"""
+        order = self.customer_orders.get(sort) or self.customer_orders['name']
+        if descending:
+            order = order[::-1]
+
+        query = _text_key(query).strip() if query else None
+        if query:
+            order = [customer_id for customer_id in order if query in self.customer_search[customer_id]]
+        return _paginate(order, self.customers, page, per_page)
+
+
+_cache_lock = threading.Lock()
+_cached_index = None
+_cached_version = None
+
+
+def get_listing_index(version, load):
+    """
+    获取列表索引；version 为数据版本，变化时调用 load() 取得 (系统, 客户) 并重建索引
+    """
+    global _cached_index, _cached_version
+
+    with _cache_lock:
+        if _cached_index is None or version != _cached_version:
+            systems, customers = load()
+            _cached_index = ListingIndex(systems, customers)
+            _cached_version = version
+        return _cached_index
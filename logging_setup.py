@@ -0,0 +1,123 @@
+"""
+应用日志配置
+
+  - 根日志器只挂一个 QueueHandler：记录日志只是把记录放入内存队列，由 QueueListener 的后台线程
+    写入按大小轮转的日志文件（RotatingFileHandler），请求线程不再同步等待磁盘写入，日志文件也不会无限增长
+  - 日志级别按配置档选择：development 为 DEBUG 并同时输出到控制台（代替原来的 print），
+    production 为 INFO，只写文件
+  - 每个请求一条的高频日志（dcam.request 日志器和开发服务器的 werkzeug 访问日志）按比例抽样记录，
+    WARNING及以上总是记录
+
+fork出的子进程（如 gunicorn --preload 的工作进程）不会继承后台线程，在子进程中自动重新启动。
+多个进程写同一文件时各自轮转可能丢失少量日志，多进程部署时可为每个进程设置不同的日志文件，
+或设置 max_bytes=0 关闭轮转、交给 logrotate 处理。
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+
+# 各配置档的日志级别、是否输出到控制台、每请求日志的抽样比例
+PROFILES = {
+    'development': {'level': logging.DEBUG, 'console': True, 'request_sample': 1.0},
+    'production': {'level': logging.INFO, 'console': False, 'request_sample': 0.01},
+}
+
+# 每个请求一条的路径/参数日志
+REQUEST_LOGGER = 'dcam.request'
+
+# 按比例抽样的日志器
+SAMPLED_LOGGERS = (REQUEST_LOGGER, 'werkzeug')
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+class SampleFilter(logging.Filter):
+    """按比例随机放行的过滤器，WARNING及以上级别总是放行"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+_queue_handler = None
+_listener = None
+_handlers = []
+
+
+def _start_listener():
+    global _listener
+    log_queue = queue.SimpleQueue()
+    _queue_handler.queue = log_queue
+    _listener = logging.handlers.QueueListener(log_queue, *_handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def configure(filename, profile='development', level=None, max_bytes=10 * 1024 * 1024, backup_count=5,
+              request_sample=None):
+    """
+    配置根日志器；level 和 request_sample 为空时使用配置档的设置
+    返回实际使用的配置（级别、抽样比例等）
+    """
+    global _queue_handler
+
+    settings = dict(PROFILES.get(profile) or PROFILES['development'])
+    if level:
+        settings['level'] = logging.getLevelName(level.upper()) if isinstance(level, str) else level
+    if request_sample is not None:
+        settings['request_sample'] = request_sample
+
+    shutdown()
+    formatter = logging.Formatter(LOG_FORMAT)
+    if max_bytes > 0:
+        file_handler = logging.handlers.RotatingFileHandler(
+            filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+    else:
+        file_handler = logging.FileHandler(filename, encoding='utf-8')
+    _handlers[:] = [file_handler]
+    if settings['console']:
+        _handlers.append(logging.StreamHandler(sys.stdout))
+    for handler in _handlers:
+        handler.setFormatter(formatter)
+
+    _queue_handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+    _start_listener()
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(settings['level'])
+
+    for name in SAMPLED_LOGGERS:
+        logger = logging.getLogger(name)
+        for old_filter in [f for f in logger.filters if isinstance(f, SampleFilter)]:
+            logger.removeFilter(old_filter)
+        logger.addFilter(SampleFilter(settings['request_sample']))
+    return settings
+
+
+def shutdown():
+    """停止后台线程，写完队列中剩余的日志"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    for handler in _handlers:
+        handler.close()
+
+
+def _restart_in_child():
+    # 子进程中没有父进程的后台线程，换用新的队列和线程（文件句柄沿用）
+    if _listener is not None:
+        _start_listener()
+
+
+os.register_at_fork(after_in_child=_restart_in_child)
+atexit.register(shutdown)
@@ -0,0 +1,275 @@
+"""
+运行指标（Prometheus文本格式）
+
+各模块在关键位置调用 inc()/observe() 记录计数和耗时，记录只是在进程内存中累加，开销可以忽略：
+  - 计数器：JSON数据库读写次数和写入字节数、YAML解析次数、边车文件和查询缓存的命中情况、
+    sfainfo压缩包解压字节数等，自动带上当前请求的路由标签（非请求环境中为 "none"）
+  - 直方图：每个路由的请求耗时
+
+多个 gunicorn 工作进程各自计数，定期（及进程退出时）把本进程的快照原子写入共享目录中的
+{pid}-{启动时间}.json；/metrics 请求时合并目录中所有快照再输出。已退出进程（pid不存在）的快照在合并时
+并入 retired.json 后删除，计数仍然保留，目录中的文件数不随工作进程回收和命令行工具的运行而增长。
+未调用 configure() 设置目录时（如命令行工具）只在内存中计数。
+"""
+import atexit
+import contextvars
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+
+# 请求耗时直方图的分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# 指标说明，/metrics 输出时作为 HELP 行
+HELP = {
+    'dcam_http_requests_total': '按路由、方法和状态码统计的请求数',
+    'dcam_http_request_duration_seconds': '按路由统计的请求耗时',
+    'dcam_json_db_loads_total': 'JSON数据库文件读取次数',
+    'dcam_json_db_saves_total': 'JSON数据库文件写入次数',
+    'dcam_json_db_bytes_written_total': 'JSON数据库文件写入字节数',
+    'dcam_yaml_parses_total': 'YAML文本解析次数',
+    'dcam_yaml_sidecar_lookups_total': 'YAML边车文件查找次数（result=hit/miss）',
+    'dcam_query_cache_requests_total': '查询结果缓存的请求次数（result=hit/miss/coalesced）',
+    'dcam_tarball_decompressed_bytes_total': 'sfainfo压缩包解压的字节数',
+}
+
+# 已退出进程的计数合并后的快照文件
+RETIRED_FILE = 'retired.json'
+
+_route = contextvars.ContextVar('dcam_metrics_route', default='none')
+
+
+def set_route(route):
+    """设置当前请求的路由，之后记录的计数器都带上该路由标签"""
+    _route.set(route)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Registry:
+    """单个进程内的指标"""
+
+    def __init__(self):
+        self.directory = None
+        self.flush_interval = 5
+        self.reset()
+
+    def reset(self):
+        self.lock = threading.Lock()
+        self.counters = {}      # (名称, 标签) -> 值
+        self.histograms = {}    # (名称, 标签) -> [各分桶计数..., 总和, 次数]
+        self.token = f"{os.getpid()}-{time.time_ns()}"
+        self.last_flush = time.monotonic()
+
+    def inc(self, name, value=1, labels=()):
+        key = (name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=()):
+        key = (name, labels)
+        with self.lock:
+            entry = self.histograms.get(key)
+            if entry is None:
+                entry = self.histograms[key] = [0] * (len(DEFAULT_BUCKETS) + 2)
+            for i, bound in enumerate(DEFAULT_BUCKETS):
+                if value <= bound:
+                    entry[i] += 1
+                    break
+            entry[-2] += value
+            entry[-1] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), list(entry)] for (name, labels), entry in self.histograms.items()]
+            }
+
+    def flush(self, force=False):
+        """把本进程的快照写入共享目录；未到刷新间隔时跳过"""
+        if not self.directory:
+            return
+        now = time.monotonic()
+        if not force and now - self.last_flush < self.flush_interval:
+            return
+        self.last_flush = now
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            _write_snapshot(self.directory, f"{self.token}.json", self.snapshot())
+        except OSError as e:
+            print(f"[指标] 写入指标快照失败: {str(e)}")
+
+
+_registry = Registry()
+
+
+def configure(directory, flush_interval=5):
+    """设置多进程共享的快照目录和刷新间隔（秒）"""
+    _registry.directory = directory
+    _registry.flush_interval = flush_interval
+
+
+def inc(name, value=1, **labels):
+    """计数器加 value，自动带上当前请求的路由标签"""
+    labels['route'] = _route.get()
+    _registry.inc(name, value, tuple(sorted((key, str(label)) for key, label in labels.items())))
+
+
+def observe(name, value, **labels):
+    """记录一次直方图观测值（labels 由调用方给出，不自动加路由）"""
+    _registry.observe(name, value, tuple(sorted((key, str(label)) for key, label in labels.items())))
+
+
+def maybe_flush():
+    _registry.flush()
+
+
+def _merge(snapshots):
+    counters = {}
+    histograms = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot.get('counters', []):
+            key = (name, tuple(tuple(label) for label in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, entry in snapshot.get('histograms', []):
+            key = (name, tuple(tuple(label) for label in labels))
+            merged = histograms.get(key)
+            if merged is None:
+                histograms[key] = list(entry)
+            elif len(merged) == len(entry):
+                histograms[key] = [a + b for a, b in zip(merged, entry)]
+    return counters, histograms
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read_snapshot(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_snapshot(directory, filename, snapshot):
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f, ensure_ascii=False)
+    os.replace(temp_path, os.path.join(directory, filename))
+
+
+def _read_directory(directory):
+    """
+    读取目录中的所有快照；已退出进程的快照并入 retired.json 后删除
+    （文件锁保证同时处理 /metrics 请求的多个进程不会重复合并）
+    """
+    snapshots = []
+    with open(os.path.join(directory, '.lock'), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            retired = _read_snapshot(os.path.join(directory, RETIRED_FILE))
+            dead = []
+            for filename in os.listdir(directory):
+                if not filename.endswith('.json') or filename == RETIRED_FILE:
+                    continue
+                path = os.path.join(directory, filename)
+                snapshot = _read_snapshot(path)
+                if snapshot is None:
+                    continue
+                pid = filename.split('-', 1)[0]
+                if pid.isdigit() and not _pid_alive(int(pid)):
+                    dead.append((path, snapshot))
+                else:
+                    snapshots.append(snapshot)
+
+            if dead:
+                counters, histograms = _merge(([retired] if retired else []) + [item[1] for item in dead])
+                retired = {
+                    'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+                    'histograms': [[name, list(labels), entry] for (name, labels), entry in histograms.items()]
+                }
+                _write_snapshot(directory, RETIRED_FILE, retired)
+                for path, _ in dead:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+            if retired:
+                snapshots.append(retired)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+    return snapshots
+
+
+def collect():
+    """合并共享目录中所有进程的快照（包含本进程的最新数据）"""
+    _registry.flush(force=True)
+    snapshots = [_registry.snapshot()] if not _registry.directory else []
+    if _registry.directory and os.path.isdir(_registry.directory):
+        try:
+            snapshots = _read_directory(_registry.directory)
+        except OSError as e:
+            print(f"[指标] 读取指标快照失败: {str(e)}")
+            snapshots = [_registry.snapshot()]
+    return _merge(snapshots)
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """输出Prometheus文本格式"""
+    counters, histograms = collect()
+    lines = []
+
+    names = sorted({name for name, _ in counters})
+    for name in names:
+        lines.append(f"# HELP {name} {HELP.get(name, name)}")
+        lines.append(f"# TYPE {name} counter")
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    names = sorted({name for name, _ in histograms})
+    for name in names:
+        lines.append(f"# HELP {name} {HELP.get(name, name)}")
+        lines.append(f"# TYPE {name} histogram")
+        for (metric, labels), entry in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(DEFAULT_BUCKETS, entry):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', repr(bound))])} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {entry[-1]}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(entry[-2])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {entry[-1]}")
+
+    return '\n'.join(lines) + '\n'
+
+
+# fork出的子进程（如 gunicorn --preload 的工作进程）从零开始计数，使用自己的快照文件
+os.register_at_fork(after_in_child=_registry.reset)
+atexit.register(lambda: _registry.flush(force=True))
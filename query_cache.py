@@ -0,0 +1,117 @@
+"""
+查询结果缓存
+
+资产查询的结果只取决于查询参数和相关文件的内容，因此以
+(查询名称, 参数, 文件版本) 为键缓存计算结果：
+  - 文件版本为各文件的 (修改时间, 大小)，文件变化后键随之变化，旧结果不会再被命中
+  - 条目超过TTL后失效，总数超过上限时淘汰最久未使用的条目（LRU）
+  - 同一个键的并发请求只计算一次（single-flight），其余请求等待并共享结果
+
+缓存的结果会被多个请求共享，调用方不得修改返回值。
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+
+def file_version(path):
+    """文件版本：(修改时间ns, 大小)，文件不存在时为 None"""
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError, ValueError):
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def files_version(paths):
+    return tuple((path, file_version(path)) for path in paths)
+
+
+class _Flight:
+    """正在进行中的一次计算"""
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class QueryCache:
+    """带TTL和LRU淘汰、并发请求合并的结果缓存（线程安全）"""
+
+    def __init__(self, maxsize=256, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()   # key -> (过期时间, 结果)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get_or_compute(self, key, compute):
+        """返回键对应的结果；未命中时调用 compute() 计算，同一键的并发调用只计算一次"""
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return compute()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    metrics.inc('dcam_query_cache_requests_total', result='hit')
+                    return entry[1]
+                del self._entries[key]
+
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        metrics.inc('dcam_query_cache_requests_total', result='miss' if leader else 'coalesced')
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+        except BaseException as e:
+            # 失败的结果不缓存，等待中的请求得到同样的异常
+            flight.error = e
+            raise
+        else:
+            with self._lock:
+                self._entries[key] = (time.monotonic() + self.ttl, flight.value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+            return flight.value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced
+            }
@@ -0,0 +1,223 @@
+import argparse
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import generations
+import yaml_codec
+from diagnostics import Diagnostics, DEBUG
+from generate_cluster_yaml import generate_cluster_yaml
+
+# 归档文件名格式（见 app.import_config）:
+#   TOML: {timestamp}_{toml_filename}
+#   SFA:  {timestamp}_{序号}_{sfa_filename}
+ARCHIVE_NAME_RE = re.compile(r'^(\d{8}_\d{6})_(.+)$')
+SFA_ARCHIVE_RE = re.compile(r'^\d+_.+')
+
+CHECKPOINT_FILE = os.path.join('data', 'reprocess_checkpoint.json')
+
+
+def find_latest_archive(uploads_dir):
+    """
+    查找系统上传目录中最近一次归档的TOML和SFA文件
+    返回 (timestamp, toml_path, sfa_paths)，没有完整归档时返回 None
+    """
+    if not os.path.isdir(uploads_dir):
+        return None
+
+    archives = {}
+    for filename in os.listdir(uploads_dir):
+        match = ARCHIVE_NAME_RE.match(filename)
+        if not match:
+            continue
+        timestamp, rest = match.groups()
+        entry = archives.setdefault(timestamp, {'toml': None, 'sfa': []})
+        path = os.path.join(uploads_dir, filename)
+        if rest.lower().endswith('.toml'):
+            entry['toml'] = path
+        elif SFA_ARCHIVE_RE.match(rest):
+            entry['sfa'].append(path)
+
+    # 按时间戳倒序，取第一个同时包含TOML和SFA文件的归档
+    for timestamp in sorted(archives, reverse=True):
+        entry = archives[timestamp]
+        if entry['toml'] and entry['sfa']:
+            return timestamp, entry['toml'], sorted(entry['sfa'])
+    return None
+
+
+def reprocess_system(job):
+    """
+    使用当前解析器重新生成单个系统的YAML文件（在工作进程中执行）
+    先生成到临时文件，内容有变化时才替换原文件
+    """
+    yaml_file = job['yaml_file']
+    result = {'system_id': job['system_id'], 'archive': job['archive']}
+
+    output_dir = os.path.dirname(yaml_file) or '.'
+    os.makedirs(output_dir, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=output_dir, suffix='.yaml.tmp')
+    os.close(fd)
+
+    try:
+        # 非详细模式下只收集警告，不输出
+        diagnostics = Diagnostics(level=DEBUG, echo=True) if job['verbose'] else Diagnostics()
+        generate_cluster_yaml(job['toml_path'], job['cluster_name'], job['sfa_paths'],
+                              temp_path, job['customer_name'], diagnostics)
+
+        with open(temp_path, 'rb') as f:
+            new_content = f.read()
+
+        old_content = None
+        if os.path.exists(yaml_file):
+            with open(yaml_file, 'rb') as f:
+                old_content = f.read()
+
+        if new_content == old_content:
+            result['status'] = 'unchanged'
+            return result
+
+        if job['dry_run']:
+            result['status'] = 'changed'
+            result['message'] = '预演模式，未写入'
+            return result
+
+        # 与"更新配置"一致，替换前先备份原始文件
+        if old_content is not None:
+            backup_path = f"{yaml_file}.bak.{datetime.now().strftime('%Y%m%d%H%M%S')}"
+            shutil.copy2(yaml_file, backup_path)
+            result['backup'] = backup_path
+
+        os.replace(temp_path, yaml_file)
+        # 边车文件记录的是临时文件的大小和修改时间，重命名后仍然匹配
+        if os.path.exists(yaml_codec.sidecar_path(temp_path)):
+            os.replace(yaml_codec.sidecar_path(temp_path), yaml_codec.sidecar_path(yaml_file))
+        generations.bump(yaml_file)
+        result['status'] = 'changed'
+        return result
+    except Exception as e:
+        result['status'] = 'failed'
+        result['message'] = str(e)
+        return result
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        yaml_codec.remove_sidecar(temp_path)
+
+
+def collect_jobs(systems, system_ids=None, verbose=False, dry_run=False):
+    """根据系统记录和上传归档构建重新处理任务列表，返回 (jobs, skipped)"""
+    from app import get_system_uploads_dir
+
+    jobs = []
+    skipped = {}
+    for system_id, system in systems.items():
+        if system_ids and system_id not in system_ids:
+            continue
+        if not system.get('yaml_file'):
+            skipped[system_id] = '系统没有关联的YAML文件'
+            continue
+
+        uploads_dir = get_system_uploads_dir(system.get('customer_name'), system.get('name'))
+        archive = find_latest_archive(uploads_dir)
+        if not archive:
+            skipped[system_id] = f'未找到完整的上传归档: {uploads_dir}'
+            continue
+
+        timestamp, toml_path, sfa_paths = archive
+        jobs.append({
+            'system_id': system_id,
+            'archive': timestamp,
+            'toml_path': toml_path,
+            'sfa_paths': sfa_paths,
+            'yaml_file': system['yaml_file'],
+            'cluster_name': system.get('cluster_name') or system.get('name'),
+            'customer_name': system.get('customer_name'),
+            'verbose': verbose,
+            'dry_run': dry_run
+        })
+    return jobs, skipped
+
+
+def load_checkpoint(resume):
+    """加载检查点；不续跑时返回新的检查点结构"""
+    from app import load_json_db
+
+    if resume and os.path.exists(CHECKPOINT_FILE):
+        checkpoint = load_json_db(CHECKPOINT_FILE)
+        checkpoint.setdefault('done', {})
+        return checkpoint
+    return {'started_at': datetime.now().isoformat(), 'done': {}}
+
+
+def run(workers=None, resume=False, system_ids=None, verbose=False, dry_run=False):
+    """批量重新处理所有系统，返回各系统的处理结果"""
+    from app import get_systems, save_json_db, SYSTEMS_DB
+
+    systems = get_systems()
+    jobs, skipped = collect_jobs(systems, system_ids, verbose, dry_run)
+    for system_id, reason in skipped.items():
+        print(f"[跳过] 系统 {system_id}: {reason}")
+
+    checkpoint = load_checkpoint(resume)
+    done = checkpoint['done']
+
+    # 续跑时跳过已基于同一归档处理完成的系统
+    pending = []
+    for job in jobs:
+        previous = done.get(job['system_id'])
+        if previous and previous.get('archive') == job['archive'] and previous.get('status') != 'failed':
+            print(f"[已完成] 系统 {job['system_id']}: 归档 {job['archive']}")
+            continue
+        pending.append(job)
+
+    print(f"待处理系统: {len(pending)} 个, 并行进程数: {workers or os.cpu_count()}")
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(reprocess_system, job): job for job in pending}
+        for future in as_completed(futures):
+            result = future.result()
+            system_id = result['system_id']
+            results[system_id] = result
+
+            message = f" - {result['message']}" if result.get('message') else ''
+            print(f"[{result['status']}] 系统 {system_id}: 归档 {result['archive']}{message}")
+
+            done[system_id] = {
+                'archive': result['archive'],
+                'status': result['status'],
+                'finished_at': datetime.now().isoformat()
+            }
+            if not dry_run:
+                save_json_db(CHECKPOINT_FILE, checkpoint)
+
+    # 记录内容发生变化的系统
+    changed = [sid for sid, result in results.items() if result['status'] == 'changed']
+    if changed and not dry_run:
+        systems = get_systems()
+        for system_id in changed:
+            if system_id in systems:
+                systems[system_id]['reprocessed_at'] = datetime.now().isoformat()
+        save_json_db(SYSTEMS_DB, systems)
+
+    summary = {}
+    for result in results.values():
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+    print(f"\n处理完成: {summary or '无需处理'}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="使用当前解析器批量重新生成各系统的集群YAML")
+    parser.add_argument("--workers", type=int, default=None, help="并行进程数（默认CPU核数）")
+    parser.add_argument("--resume", action="store_true", help="从上次中断的检查点继续")
+    parser.add_argument("--system-id", nargs="*", help="只处理指定的系统ID")
+    parser.add_argument("--dry-run", action="store_true", help="只报告会变化的文件，不写入")
+    parser.add_argument("-v", "--verbose", action="store_true", help="输出生成过程的详细信息")
+    args = parser.parse_args()
+
+    run(args.workers, args.resume, args.system_id, args.verbose, args.dry_run)
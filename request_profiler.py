@@ -0,0 +1,178 @@
+"""
+请求级性能剖析
+
+  - 按需剖析：管理员在请求中带 X-DCAM-Profile: 1 头（或 _profile=1 参数）时，该请求在 cProfile 下执行，
+    结果保存为 .pstats（可用 python -m pstats 或 snakeviz 查看）和按累计耗时排序的 .txt 摘要
+  - 慢请求采样：后台线程定期采样运行时间超过阈值一半的请求的调用栈，请求最终超过阈值时
+    保存为折叠栈格式的 .collapsed（可直接交给 flamegraph.pl / speedscope）和 .txt 摘要；
+    没有长时间运行的请求时采样线程只检查一个字典，开销可以忽略
+
+所有文件写入同一目录，文件名为 {时间}-{进程号}-{端点}-{耗时}ms.*，超过保留数量时删除最早的文件。
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+
+class ProfileStore:
+    """剖析结果目录"""
+
+    def __init__(self, directory, keep=200):
+        self.directory = directory
+        self.keep = keep
+        self._lock = threading.Lock()
+
+    def base_path(self, endpoint, seconds):
+        name = (endpoint or 'unknown').replace('/', '_').replace('.', '_')
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        return os.path.join(self.directory, f"{stamp}-{os.getpid()}-{name}-{int(seconds * 1000)}ms")
+
+    def prune(self):
+        """只保留最近的 keep 组结果（同名不同后缀的文件算一组）"""
+        with self._lock:
+            try:
+                names = os.listdir(self.directory)
+            except OSError:
+                return
+            groups = sorted({os.path.splitext(name)[0] for name in names})
+            for group in groups[:max(0, len(groups) - self.keep)]:
+                for name in names:
+                    if os.path.splitext(name)[0] == group:
+                        try:
+                            os.remove(os.path.join(self.directory, name))
+                        except OSError:
+                            pass
+
+
+class RequestProfile:
+    """在当前线程上运行的一次 cProfile 剖析"""
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.started = time.perf_counter()
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+        return time.perf_counter() - self.started
+
+    def save(self, store, endpoint, description):
+        """保存剖析结果，返回不含后缀的文件路径"""
+        seconds = self.stop()
+        os.makedirs(store.directory, exist_ok=True)
+        base = store.base_path(endpoint, seconds)
+        self.profile.dump_stats(base + '.pstats')
+
+        summary = io.StringIO()
+        summary.write(f"{description}\n耗时: {seconds * 1000:.1f} ms\n\n")
+        stats = pstats.Stats(self.profile, stream=summary)
+        stats.sort_stats('cumulative').print_stats(40)
+        with open(base + '.txt', 'w', encoding='utf-8') as f:
+            f.write(summary.getvalue())
+        store.prune()
+        return base
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _InFlight:
+    __slots__ = ('thread_id', 'started', 'stacks')
+
+    def __init__(self, thread_id):
+        self.thread_id = thread_id
+        self.started = time.perf_counter()
+        self.stacks = Counter()
+
+
+class SlowRequestSampler:
+    """对长时间运行的请求采样调用栈，超过阈值的请求保存采样结果"""
+
+    def __init__(self, store, threshold, interval=0.01):
+        self.store = store
+        self.threshold = threshold
+        self.interval = interval
+        self._requests = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_thread(self):
+        # fork之后（如gunicorn工作进程）后台线程不会被继承，需要在本进程中重新启动
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='slow-request-sampler', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            start_after = self.threshold / 2
+            now = time.perf_counter()
+            with self._lock:
+                candidates = [item for item in self._requests.values() if now - item.started >= start_after]
+                if not candidates:
+                    continue
+                # 在锁内记录，保证 end() 取走请求后不会再被修改
+                frames = sys._current_frames()
+                for item in candidates:
+                    frame = frames.get(item.thread_id)
+                    if frame is None:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(_frame_label(frame))
+                        frame = frame.f_back
+                    item.stacks[';'.join(reversed(stack))] += 1
+                del frames
+
+    def begin(self):
+        """请求开始时调用，返回交给 end() 的标记"""
+        self._ensure_thread()
+        item = _InFlight(threading.get_ident())
+        with self._lock:
+            self._requests[id(item)] = item
+        return item
+
+    def end(self, item, endpoint, description):
+        """请求结束时调用；超过阈值且有采样结果时保存，返回不含后缀的文件路径"""
+        with self._lock:
+            self._requests.pop(id(item), None)
+        seconds = time.perf_counter() - item.started
+        if seconds < self.threshold or not item.stacks:
+            return None
+
+        try:
+            os.makedirs(self.store.directory, exist_ok=True)
+            base = self.store.base_path(endpoint, seconds)
+            with open(base + '.collapsed', 'w', encoding='utf-8') as f:
+                for stack, count in item.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+
+            total = sum(item.stacks.values())
+            leaf_counts = Counter()
+            for stack, count in item.stacks.items():
+                leaf_counts[stack.rsplit(';', 1)[-1]] += count
+            with open(base + '.txt', 'w', encoding='utf-8') as f:
+                f.write(f"{description}\n耗时: {seconds * 1000:.1f} ms (阈值 {self.threshold * 1000:.0f} ms)\n")
+                f.write(f"采样: {total} 次, 间隔 {self.interval * 1000:.0f} ms, 从运行 {self.threshold / 2 * 1000:.0f} ms 后开始\n\n")
+                f.write("采样最多的栈顶函数:\n")
+                for label, count in leaf_counts.most_common(20):
+                    f.write(f"  {count * 100 / total:5.1f}%  {label}\n")
+            self.store.prune()
+            return base
+        except OSError as e:
+            print(f"[慢请求] 保存采样结果失败: {str(e)}")
+            return None
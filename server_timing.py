@@ -0,0 +1,100 @@
+"""
+按请求统计各阶段耗时，输出为 Server-Timing 响应头
+
+请求开始时调用 start()，各层在关键位置用 phase(名称) 或 @timed(名称) 记录耗时，
+请求结束时用 header() 生成响应头，浏览器开发者工具的“时间”面板可直接查看，如：
+    Server-Timing: db;dur=1.8, yaml;dur=12.4, query;dur=20.3, render;dur=5.1, total;dur=41.0
+未调用 start()（功能关闭或非请求环境）时 phase() 只做一次上下文变量读取，不计时。
+同名阶段嵌套时（如 load_file 内部再调用 safe_load）只计最外层，避免重复累计。
+"""
+import contextlib
+import contextvars
+import functools
+import time
+
+# 阶段名称及说明（desc），输出顺序即此顺序，未列出的阶段排在后面
+# 响应头只能使用ASCII字符，说明不能用中文
+PHASES = {
+    'db': 'JSON DB load',
+    'save': 'JSON DB save',
+    'yaml': 'YAML load',
+    'query': 'asset query',
+    'render': 'template render',
+}
+
+_current = contextvars.ContextVar('dcam_server_timing', default=None)
+
+
+class Timings:
+    """一个请求内各阶段的累计耗时（秒）和次数"""
+    __slots__ = ('durations', 'counts', 'active')
+
+    def __init__(self):
+        self.durations = {}
+        self.counts = {}
+        self.active = set()
+
+    def add(self, name, seconds):
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+
+def start():
+    """开始记录当前请求"""
+    timings = Timings()
+    _current.set(timings)
+    return timings
+
+
+def stop():
+    """结束记录并返回本请求的 Timings（未开始时为 None）"""
+    timings = _current.get()
+    _current.set(None)
+    return timings
+
+
+def current():
+    return _current.get()
+
+
+@contextlib.contextmanager
+def phase(name):
+    """记录代码块的耗时"""
+    timings = _current.get()
+    if timings is None or name in timings.active:
+        yield
+        return
+    timings.active.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.active.discard(name)
+        timings.add(name, time.perf_counter() - started)
+
+
+def timed(name):
+    """记录函数耗时的装饰器"""
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def header(timings, total=None):
+    """生成 Server-Timing 响应头的值（毫秒）"""
+    names = [name for name in PHASES if name in timings.durations]
+    names += sorted(name for name in timings.durations if name not in PHASES)
+    parts = []
+    for name in names:
+        desc = PHASES.get(name, name)
+        count = timings.counts[name]
+        if count > 1:
+            desc = f"{desc} x{count}"
+        parts.append(f'{name};desc="{desc}";dur={timings.durations[name] * 1000:.1f}')
+    if total is not None:
+        parts.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(parts)
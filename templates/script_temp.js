@@ -63,8 +63,8 @@
         function updateClusterNames() {
             const assetOwner = document.getElementById('asset_owner').value;
             const url = assetOwner 
-                ? `/api/cluster_names/{{ system_id }}?asset_owner=${encodeURIComponent(assetOwner)}`
-                : `/api/cluster_names/{{ system_id }}`;
+                ? `/api/system_cluster_names/{{ system_id }}?asset_owner=${encodeURIComponent(assetOwner)}`
+                : `/api/system_cluster_names/{{ system_id }}`;
                 
             fetch(url)
                 .then(response => response.json())
@@ -0,0 +1,136 @@
+"""
+yaml_codec 的格式兼容与读写往返测试
+
+缩进格式的输出由C发射器生成后逐行补齐列表缩进（见 yaml_codec._indent_sequences），
+这里与纯Python的 IndentedDumper 逐字节比较，并确认读回的数据与写入的数据相同。
+
+用法: python -m pytest tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import yaml_codec
+from yaml_codec import IndentedDumper
+
+# generate_cluster_yaml 写集群文件时的参数
+GENERATOR_KWDS = dict(sort_keys=False, default_flow_style=False, allow_unicode=True, indent=2, width=1000)
+# app.py 中其他写YAML处的参数
+DEFAULT_KWDS = dict(default_flow_style=False, allow_unicode=True)
+
+
+def build_clusters(devices=3, hosts=4):
+    """与 generate_cluster_yaml 输出结构相同的集群数据"""
+    device_list = []
+    for d in range(devices):
+        host_list = []
+        for h in range(hosts):
+            ip_config = {
+                'management': f"10.2.{d}.{h}",
+                'lnet1_network': f"172.16.{d}.{h}@o2ib0",
+                'lnet2_network': f"172.17.{d}.{h}@o2ib1" if h % 2 else None,
+            }
+            host_list.append({'hostname': f"oss{d}{h:02d}", 'role': 'MDS/OSS', 'ip': ip_config})
+        device_list.append({
+            'Device_name': f"sfa{d}",
+            'type': 'ES400NVX2' if d else '自动获取失败',
+            'SFA version': '12.4.0',
+            'Capacity': '308.00 TiB',
+            'Controller_c0_ip': f"10.1.{d}.1",
+            'Controller_c1_ip': f"10.1.{d}.2",
+            'Controller_c0_serial_number': f"C0SN{d:05d}",
+            'Controller_c1_serial_number': f"C1SN{d:05d}",
+            'BBU1_Expired_Date': '2026-08-11',
+            'BBU2_Expired_Date': None,
+            'Hosts': host_list,
+        })
+    return {
+        'clusters': [{
+            'Cluster_name': 'C1',
+            'EXA version': '6.3.0',
+            'Capacity': '533.20 TiB',
+            'Network_Description': 'Mellanox ConnectX-6; Mellanox ConnectX-7',
+            'Network_port_type': 'InfiniBand, Ethernet',
+            'EMF_IP': '10.0.0.5',
+            'Support_status': '待填入',
+            'Asset_owner': '测试客户',
+            'devices': device_list,
+        }, {
+            'Cluster_name': 'C2',
+            'Asset_owner': "O'Neil: lab",
+            'devices': [],
+        }],
+        'customer': '测试客户',
+    }
+
+
+class IndentedDumpTest(unittest.TestCase):
+
+    def test_matches_indented_dumper_bytes(self):
+        data = build_clusters()
+        expected = yaml.dump(data, Dumper=IndentedDumper, **GENERATOR_KWDS)
+        self.assertEqual(yaml_codec.dump(data, indented=True, **GENERATOR_KWDS), expected)
+
+    def test_nested_sequences_match_indented_dumper_bytes(self):
+        data = {'a': [[1, [2, 3]], {'b': [{'c': [4]}, []]}, {}], 'd': {'e': [None, '- x', 'k:']}}
+        for kwds in (GENERATOR_KWDS, DEFAULT_KWDS):
+            expected = yaml.dump(data, Dumper=IndentedDumper, **kwds)
+            self.assertEqual(yaml_codec.dump(data, indented=True, **kwds), expected)
+
+    def test_without_libyaml_uses_indented_dumper(self):
+        data = build_clusters()
+        with mock.patch.object(yaml_codec, 'LIBYAML', False):
+            text = yaml_codec.dump(data, indented=True, **GENERATOR_KWDS)
+        self.assertEqual(text, yaml.dump(data, Dumper=IndentedDumper, **GENERATOR_KWDS))
+
+    def test_round_trip(self):
+        data = build_clusters()
+        for kwds in (GENERATOR_KWDS, DEFAULT_KWDS):
+            self.assertEqual(yaml_codec.safe_load(yaml_codec.dump(data, indented=True, **kwds)), data)
+
+    def test_round_trip_scalars_that_need_folding(self):
+        # 折行的标量与 IndentedDumper 的字节不同，读回的数据仍须相同
+        values = ['long ' * 300 + 'tail', 'multi\nline\n  - item', "it's \"quoted\" - x: y", 'emoji 😀', 'nel\x85x']
+        data = {'clusters': [{'name': value, 'items': [value, {'k': [value]}]} for value in values]}
+        for kwds in (GENERATOR_KWDS, DEFAULT_KWDS, dict(DEFAULT_KWDS, width=40)):
+            self.assertEqual(yaml_codec.safe_load(yaml_codec.dump(data, indented=True, **kwds)), data)
+
+
+class DefaultDumpTest(unittest.TestCase):
+
+    def test_matches_yaml_dump_bytes(self):
+        data = build_clusters()
+        self.assertEqual(yaml_codec.dump(data, **DEFAULT_KWDS), yaml.safe_dump(data, **DEFAULT_KWDS))
+
+    def test_round_trip(self):
+        data = build_clusters()
+        self.assertEqual(yaml_codec.safe_load(yaml_codec.dump(data, **DEFAULT_KWDS)), data)
+
+
+class SidecarTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'C1_clusters.yaml')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_round_trip(self):
+        data = build_clusters()
+        with open(self.path, 'w', encoding='utf-8') as f:
+            yaml_codec.dump(data, f, indented=True, **GENERATOR_KWDS)
+        self.assertTrue(yaml_codec.write_sidecar(self.path, data))
+        self.assertEqual(yaml_codec.read_sidecar(self.path), data)
+        self.assertEqual(yaml_codec.load_file(self.path, sidecar=True), data)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,353 @@
+"""
+统一的YAML读写入口
+
+所有YAML文件的读取和写入都经过本模块：
+  - 安装了libyaml时使用 CSafeLoader / CSafeDumper，否则自动回退到纯Python实现
+  - 接口与 yaml.safe_load / yaml.dump 保持一致，调用处只需替换模块名
+  - dump(..., indented=True) 输出与 generate_cluster_yaml 原先的 IndentedDumper 相同的格式
+    （列表相对父键缩进两格）
+
+libyaml的发射器不支持缩进列表（映射中的列表总是与父键对齐），因此缩进格式的输出
+先由C发射器生成，再逐行补齐列表缩进；没有libyaml时使用纯Python的 IndentedDumper。
+两者对超过行宽需要折行的标量、NEL/行分隔符和BMP以外的字符（如emoji）选择的引号和折行位置不同，
+这些情况下输出不逐字节一致，但读回的数据相同（见 tests/test_yaml_codec.py）。
+
+集群YAML文件写入时可同时生成JSON边车文件（{yaml}.cache.json），读取时优先使用：
+  第一行为头部：格式版本、源YAML的大小/修改时间/SHA-256，以及各数据段的位置和SHA-256
+  其后为紧凑JSON格式的数据段：先是去掉 clusters 列表的顶层数据，再是每个集群各占一段
+头部中的集群目录记录每个集群的名称、资产所有者（原值和小写形式）及字节偏移，
+按条件查询时只需读取匹配的集群数据段（见 open_sidecar）。
+源文件的大小和修改时间一致（或内容哈希一致）且校验和正确时直接加载JSON，否则回退到解析YAML
+并顺便重建边车文件。YAML仍是可手工编辑的原始数据，边车文件可随时删除。
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+import yaml
+
+import generations
+import metrics
+import server_timing
+
+try:
+    from yaml import CSafeLoader as Loader, CSafeDumper as Dumper
+    LIBYAML = True
+except ImportError:
+    from yaml import SafeLoader as Loader, SafeDumper as Dumper
+    LIBYAML = False
+
+
+class IndentedDumper(yaml.SafeDumper):
+    """纯Python的缩进列表格式，也是C加速路径的输出基准"""
+
+    def increase_indent(self, flow=False, indentless=False):
+        return super(IndentedDumper, self).increase_indent(flow, False)
+
+
+@server_timing.timed('yaml')
+def safe_load(stream):
+    """等同于 yaml.safe_load，优先使用C加载器"""
+    metrics.inc('dcam_yaml_parses_total')
+    return yaml.load(stream, Loader=Loader)
+
+
+SIDECAR_SUFFIX = '.cache.json'
+SIDECAR_FORMAT = 'dcam-yaml-sidecar'
+SIDECAR_VERSION = 2
+
+# 边车文件中逐项分段存储的顶层列表，及集群目录中记录的字段
+SEGMENTED_KEY = 'clusters'
+DIRECTORY_FIELDS = ('Cluster_name', 'Asset_owner')
+
+_JSON_SCALARS = (str, int, float, bool, type(None))
+
+
+def sidecar_path(path):
+    return path + SIDECAR_SUFFIX
+
+
+def _json_compatible(value):
+    """判断数据能否无损地保存为JSON（YAML中的日期、非字符串键等无法保存）"""
+    if isinstance(value, dict):
+        return all(isinstance(k, str) and _json_compatible(v) for k, v in value.items())
+    if isinstance(value, list):
+        return all(_json_compatible(v) for v in value)
+    return isinstance(value, _JSON_SCALARS)
+
+
+def normalize_key(value):
+    """目录中用于比较的键：转为小写字符串，空值为空字符串"""
+    return str(value).lower() if value is not None else ''
+
+
+def directory_entry(item):
+    """集群目录中的一条记录：原始字段值和预先转为小写的比较键"""
+    fields = {}
+    if isinstance(item, dict):
+        fields = {field: item.get(field) for field in DIRECTORY_FIELDS}
+    return {
+        'fields': fields,
+        'keys': {field: normalize_key(value) for field, value in fields.items()}
+    }
+
+
+def _write_sidecar(path, data, content, stat):
+    encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+    items = data.get(SEGMENTED_KEY) if isinstance(data, dict) else None
+    if not isinstance(items, list):
+        items = None
+
+    root = data
+    if items is not None:
+        # 保留键的顺序，读取时再把分段的列表填回原位置
+        root = dict(data)
+        root[SEGMENTED_KEY] = None
+
+    chunks = []
+    offset = 0
+
+    def add_chunk(value):
+        nonlocal offset
+        chunk = encode(value).encode('utf-8')
+        chunks.append(chunk)
+        chunks.append(b'\n')
+        location = {'offset': offset, 'length': len(chunk), 'sha256': hashlib.sha256(chunk).hexdigest()}
+        offset += len(chunk) + 1
+        return location
+
+    root_location = add_chunk(root)
+    segments = None
+    if items is not None:
+        segments = []
+        for item in items:
+            segment = add_chunk(item)
+            segment.update(directory_entry(item))
+            segments.append(segment)
+
+    header = {
+        'format': SIDECAR_FORMAT,
+        'version': SIDECAR_VERSION,
+        'source': {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': hashlib.sha256(content).hexdigest()
+        },
+        'root': root_location,
+        'segments': segments
+    }
+    target = sidecar_path(path)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(encode(header).encode('utf-8'))
+            f.write(b'\n')
+            f.writelines(chunks)
+        os.replace(temp_path, target)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def write_sidecar(path, data):
+    """
+    为刚写入的YAML文件生成边车文件，data 为写入的数据
+    数据无法用JSON无损表示时删除旧的边车文件；生成失败不影响YAML本身
+    """
+    try:
+        if not _json_compatible(data):
+            remove_sidecar(path)
+            return False
+        with open(path, 'rb') as f:
+            content = f.read()
+            stat = os.fstat(f.fileno())
+        _write_sidecar(path, data, content, stat)
+        return True
+    except Exception as e:
+        print(f"[YAML边车] 生成 {sidecar_path(path)} 失败: {str(e)}")
+        return False
+
+
+def remove_sidecar(path):
+    """删除YAML文件对应的边车文件（删除YAML文件时调用）"""
+    try:
+        os.remove(sidecar_path(path))
+    except FileNotFoundError:
+        pass
+
+
+class SidecarError(ValueError):
+    """边车文件数据段损坏或与目录不符"""
+
+
+class Sidecar:
+    """
+    已通过源文件校验的边车文件，按需读取数据段
+    segments 为集群目录（未分段存储时为 None），每项含 offset/length/sha256/fields/keys
+    """
+
+    def __init__(self, path, header, base):
+        self.path = path
+        self.header = header
+        self.base = base
+        self.segments = header['segments']
+
+    def _read(self, f, location):
+        f.seek(self.base + location['offset'])
+        chunk = f.read(location['length'])
+        if hashlib.sha256(chunk).hexdigest() != location['sha256']:
+            raise SidecarError(f"边车文件数据段校验失败: {self.path}")
+        return json.loads(chunk)
+
+    @server_timing.timed('yaml')
+    def load_segments(self, indexes):
+        """读取指定序号的集群数据段"""
+        with open(self.path, 'rb') as f:
+            return [self._read(f, self.segments[i]) for i in indexes]
+
+    def load(self):
+        """读取全部数据"""
+        with open(self.path, 'rb') as f:
+            data = self._read(f, self.header['root'])
+            if self.segments is not None:
+                data[SEGMENTED_KEY] = [self._read(f, segment) for segment in self.segments]
+        return data
+
+
+@server_timing.timed('yaml')
+def open_sidecar(path):
+    """
+    打开与YAML文件匹配的边车文件（只读取头部）
+    边车不存在、版本不符或源文件已变化时返回 None
+    """
+    sidecar = _open_sidecar(path)
+    metrics.inc('dcam_yaml_sidecar_lookups_total', result='miss' if sidecar is None else 'hit')
+    return sidecar
+
+
+def _open_sidecar(path):
+    try:
+        with open(sidecar_path(path), 'rb') as f:
+            header = json.loads(f.readline())
+            base = f.tell()
+        if header.get('format') != SIDECAR_FORMAT or header.get('version') != SIDECAR_VERSION:
+            return None
+
+        source = header['source']
+        stat = os.stat(path)
+        if stat.st_size != source['size']:
+            return None
+        if stat.st_mtime_ns != source['mtime_ns']:
+            # 修改时间不同但大小相同（如复制、touch）时再比较内容哈希
+            with open(path, 'rb') as src:
+                if hashlib.sha256(src.read()).hexdigest() != source['sha256']:
+                    return None
+        return Sidecar(sidecar_path(path), header, base)
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        return None
+
+
+def read_sidecar(path):
+    """
+    读取与YAML文件匹配的边车数据；边车不存在、版本不符、源文件已变化或校验失败时返回 None
+    """
+    sidecar = open_sidecar(path)
+    if sidecar is None:
+        return None
+    try:
+        return sidecar.load()
+    except (OSError, ValueError, KeyError, TypeError, IndexError):
+        return None
+
+
+@server_timing.timed('yaml')
+def load_file(path, sidecar=False):
+    """
+    读取YAML文件
+    sidecar=True 时优先使用匹配的边车文件，未命中时解析YAML并重建边车文件
+    """
+    if sidecar:
+        data = read_sidecar(path)
+        if data is not None:
+            return data
+
+    with open(path, 'rb') as f:
+        content = f.read()
+        stat = os.fstat(f.fileno())
+    data = safe_load(content.decode('utf-8'))
+
+    if sidecar and data is not None and _json_compatible(data):
+        try:
+            _write_sidecar(path, data, content, stat)
+        except OSError as e:
+            print(f"[YAML边车] 生成 {sidecar_path(path)} 失败: {str(e)}")
+    return data
+
+
+def _indent_sequences(text):
+    """
+    把libyaml输出的不缩进列表改为缩进列表：
+    映射值中的列表项（与父键同列的 "- "）及其全部内容右移两格，嵌套时逐层累加
+    """
+    lines = text.split('\n')
+    result = []
+    stack = []          # (列表项在原文中的列号, 该层累计的右移量)
+    prev_key_col = -1   # 上一行以 "key:" 结尾时该键所在的列，否则为 -1
+
+    for line in lines:
+        content = line.lstrip(' ')
+        if not content:
+            result.append(line)
+            prev_key_col = -1
+            continue
+        col = len(line) - len(content)
+        is_item = content.startswith('- ') or content == '-'
+
+        # 离开已经结束的列表
+        while stack and (col < stack[-1][0] or (col == stack[-1][0] and not is_item)):
+            stack.pop()
+        shift = stack[-1][1] if stack else 0
+
+        # 紧跟在 "key:" 之后、与键同列的列表项，开始一个新的缩进层
+        if is_item and col == prev_key_col and not (stack and stack[-1][0] == col):
+            shift += 2
+            stack.append((col, shift))
+
+        result.append(' ' * (col + shift) + content if shift else line)
+
+        # 计算本行中键的列号（跳过 "- " 前缀）
+        key_col = col
+        while content.startswith('- '):
+            content = content[2:]
+            key_col += 2
+        prev_key_col = key_col if content.endswith(':') else -1
+
+    return '\n'.join(result)
+
+
+def dump(data, stream=None, indented=False, **kwds):
+    """
+    等同于 yaml.dump（使用安全的Dumper），优先使用C发射器
+    indented=True 时输出缩进列表格式，与 IndentedDumper 的输出相同（不需要折行的标量逐字节一致）
+    """
+    if not indented:
+        return yaml.dump(data, stream, Dumper=Dumper, **kwds)
+
+    if LIBYAML:
+        text = _indent_sequences(yaml.dump(data, Dumper=Dumper, **kwds))
+    else:
+        text = yaml.dump(data, Dumper=IndentedDumper, **kwds)
+
+    if stream is None:
+        return text
+    stream.write(text)
+
+
+def dump_file(data, path, indented=False, sidecar=False, **kwds):
+    """写入YAML文件（UTF-8），sidecar=True 时同时生成边车文件；写完后更新该文件的代数"""
+    with open(path, 'w', encoding='utf-8') as f:
+        dump(data, f, indented=indented, **kwds)
+    if sidecar:
+        write_sidecar(path, data)
+    generations.bump(path)